@@ -1,12 +1,27 @@
-"""Database ingestion script."""
+"""Database ingestion script.
+
+Items are sent to the bulk items endpoint in chunks, by a bounded number of
+concurrent requests sharing one connection pool. Input files are read as a
+stream, so they can be larger than memory: FeatureCollection documents, or
+newline delimited GeoJSON for `.ndjson`, `.jsonl` and `.geojsonl` files.
+"""
+import asyncio
 import json
 import os
+import re
+import time
+from typing import IO, Iterator, List, Optional
 
 import click
-import requests
+import httpx
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), "setup_data/")
 STAC_API_BASE_URL = "http://localhost:8080"
+NDJSON_EXTENSIONS = (".ndjson", ".jsonl", ".geojsonl")
+READ_SIZE = 1 << 20
+# statuses worth retrying, other errors fail the chunk at once
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+BULK_MESSAGE = re.compile(r"Successfully added (\d+) Items\.(?: (\d+) Items failed)?")
 
 
 def load_data(filename):
@@ -15,42 +30,232 @@ def load_data(filename):
         return json.load(file)
 
 
-def load_collection(collection_id):
-    """Load stac collection into the database."""
-    collection = load_data("collection.json")
-    collection["id"] = collection_id
-    try:
-        resp = requests.post(f"{STAC_API_BASE_URL}/collections", json=collection)
-        if resp.status_code == 200:
-            print(f"Status code: {resp.status_code}")
-            print(f"Added collection: {collection['id']}")
-        elif resp.status_code == 409:
-            print(f"Status code: {resp.status_code}")
-            print(f"Collection: {collection['id']} already exists")
-    except requests.ConnectionError:
-        click.secho("failed to connect")
+def iter_ndjson(file: IO[str]) -> Iterator[dict]:
+    """Read the features of a newline delimited GeoJSON file."""
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
 
 
-def load_items():
-    """Load stac items into the database."""
-    feature_collection = load_data("sentinel-s2-l2a-cogs_0_100.json")
-    collection = "test-collection"
-    load_collection(collection)
+def iter_feature_collection(file: IO[str]) -> Iterator[dict]:
+    """Read the features of a FeatureCollection document, one at a time.
+
+    Only the `features` array is decoded, so the document is never held in
+    memory. It is found by its key, which must not appear in the members
+    written before it.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    eof = False
+
+    def fill() -> bool:
+        nonlocal buffer, eof
+        data = file.read(READ_SIZE)
+        eof = not data
+        buffer += data
+        return not eof
 
-    for feature in feature_collection["features"]:
+    match = None
+    while match is None:
+        match = re.search(r'"features"\s*:\s*\[', buffer)
+        if match is None and not fill():
+            raise ValueError(f"{file.name} has no features")
+    pos = match.end()
+
+    while True:
+        while True:
+            # skip the separators before the next feature
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buffer) or not fill():
+                break
+        if pos >= len(buffer):
+            raise ValueError(f"{file.name} ends inside the features")
+        if buffer[pos] == "]":
+            return
         try:
+            feature, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if not fill():
+                raise
+            continue
+        yield feature
+        buffer, pos = buffer[end:], 0
+
+
+def iter_features(path: str) -> Iterator[dict]:
+    """Read the features of an input file."""
+    with open(path) as file:
+        if path.endswith(NDJSON_EXTENSIONS):
+            yield from iter_ndjson(file)
+        else:
+            yield from iter_feature_collection(file)
+
+
+def iter_chunks(paths: List[str], collection: str, size: int) -> Iterator[List[dict]]:
+    """Read the features of the input files in chunks, for one collection."""
+    chunk = []
+    for path in paths:
+        for feature in iter_features(path):
             feature["collection"] = collection
-            resp = requests.post(
-                f"{STAC_API_BASE_URL}/collections/{collection}/items", json=feature
-            )
-            if resp.status_code == 200:
-                print(f"Status code: {resp.status_code}")
-                print(f"Added item: {feature['id']}")
-            elif resp.status_code == 409:
-                print(f"Status code: {resp.status_code}")
-                print(f"Item: {feature['id']} already exists")
-        except requests.ConnectionError:
-            click.secho("failed to connect")
-
-
-load_items()
+            chunk.append(feature)
+            if len(chunk) == size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+class Loader:
+    """Send chunks of items to the bulk items endpoint."""
+
+    def __init__(self, client: httpx.AsyncClient, collection: str, retries: int):
+        """Make a loader of the items of `collection`."""
+        self.client = client
+        self.collection = collection
+        self.retries = retries
+        self.items = 0
+        self.added = 0
+        self.failed = 0
+
+    async def post(self, url: str, body: dict) -> httpx.Response:
+        """Post a document, retrying with exponential backoff."""
+        for attempt in range(self.retries + 1):
+            try:
+                resp = await self.client.post(url, json=body)
+                if resp.status_code not in RETRY_STATUSES:
+                    return resp
+                error = f"status {resp.status_code}"
+            except httpx.TransportError as e:
+                error = repr(e)
+            if attempt < self.retries:
+                delay = min(0.1 * 2**attempt, 10)
+                click.secho(f"{url}: {error}, retrying in {delay:.1f}s", err=True)
+                await asyncio.sleep(delay)
+        raise click.ClickException(f"{url}: {error}")
+
+    async def load_collection(self, filename: str):
+        """Load stac collection into the database."""
+        collection = load_data(filename)
+        collection["id"] = self.collection
+        resp = await self.post("/collections", collection)
+        if resp.status_code == 409:
+            click.echo(f"Collection {self.collection} already exists")
+        else:
+            resp.raise_for_status()
+            click.echo(f"Added collection {self.collection}")
+
+    async def load_chunk(self, chunk: List[dict]):
+        """Load one chunk of items.
+
+        Items that already exist are counted as failed: the bulk endpoint
+        does not overwrite them, so chunks retried after a timeout are safe.
+        """
+        items = {item["id"]: item for item in chunk}
+        self.items += len(chunk)
+        if len(items) < len(chunk):
+            self.failed += len(chunk) - len(items)
+            click.secho(f"{len(chunk) - len(items)} duplicate ids in a chunk", err=True)
+        resp = await self.post(
+            f"/collections/{self.collection}/bulk_items", {"items": items}
+        )
+        match = BULK_MESSAGE.match(resp.json()) if resp.status_code == 200 else None
+        if match is None:
+            self.failed += len(items)
+            click.secho(f"Chunk failed: {resp.status_code} {resp.text}", err=True)
+            return
+        self.added += int(match.group(1))
+        self.failed += int(match.group(2) or 0)
+
+
+async def load_items(
+    paths: List[str],
+    base_url: str,
+    collection: str,
+    collection_file: Optional[str],
+    chunk_size: int,
+    concurrency: int,
+    retries: int,
+    timeout: float,
+):
+    """Load stac items into the database."""
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=timeout
+    ) as client:
+        loader = Loader(client, collection, retries)
+        if collection_file:
+            await loader.load_collection(collection_file)
+
+        # chunks are read as the workers take them, so at most `concurrency`
+        # chunks are held in memory beyond the one being read
+        queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+
+        async def worker():
+            while True:
+                chunk = await queue.get()
+                if chunk is None:
+                    return
+                await loader.load_chunk(chunk)
+
+        start = time.perf_counter()
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        try:
+            for chunk in iter_chunks(paths, collection, chunk_size):
+                await queue.put(chunk)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+        elapsed = time.perf_counter() - start
+
+    click.echo(
+        f"Loaded {loader.added} of {loader.items} items in {elapsed:.1f}s "
+        f"({loader.items / elapsed:.0f} items/s), {loader.failed} failed"
+    )
+
+
+@click.command()
+@click.argument("paths", nargs=-1, type=click.Path(exists=True, dir_okay=False))
+@click.option("--base-url", default=STAC_API_BASE_URL, show_default=True)
+@click.option("--collection", default="test-collection", show_default=True)
+@click.option(
+    "--collection-file",
+    default="collection.json",
+    show_default=True,
+    help="collection of the setup data to create first, empty to skip",
+)
+@click.option("--chunk-size", default=500, show_default=True)
+@click.option("--concurrency", default=4, show_default=True)
+@click.option("--retries", default=5, show_default=True)
+@click.option("--timeout", default=60.0, show_default=True, help="seconds")
+def main(
+    paths,
+    base_url,
+    collection,
+    collection_file,
+    chunk_size,
+    concurrency,
+    retries,
+    timeout,
+):
+    """Load items into the database, by default those of the setup data."""
+    paths = list(paths) or [os.path.join(DATA_DIR, "sentinel-s2-l2a-cogs_0_100.json")]
+    asyncio.run(
+        load_items(
+            paths,
+            base_url=base_url,
+            collection=collection,
+            collection_file=collection_file,
+            chunk_size=chunk_size,
+            concurrency=concurrency,
+            retries=retries,
+            timeout=timeout,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
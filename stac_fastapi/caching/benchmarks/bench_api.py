@@ -0,0 +1,274 @@
+"""Benchmarks of the API paths, against Tile38 or its in-process stand-in.
+
+Synthetic items are made from the Sentinel-2 fixture of the data loader,
+copied with new ids, dates and footprints shifted around the globe, and
+ingested in one collection. The ingest, get item, bbox search, item and
+collection listing paths are timed through the ASGI app, and the item
+serializer on its own.
+
+By default the app talks to `fake_tile38`, started in a thread of this
+process, so runs only compare the API side of the code; pass `--tile38` to
+measure against a real Tile38, which is left without the bench collection.
+
+The results are printed as JSON, or written to `--output`. Comparing with a
+previous result, `--compare`, prints the change of the median of each case.
+
+Run with `python benchmarks/bench_api.py [--items N] [--repeat R]
+[--tile38 HOST:PORT] [--output FILE] [--compare FILE]`.
+"""
+import argparse
+import asyncio
+import copy
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List
+
+from fake_tile38 import start_in_thread
+
+SETUP_DATA = os.path.join(
+    os.path.dirname(__file__), "..", "..", "..", "data_loader", "setup_data"
+)
+COLLECTION_ID = "bench-sentinel-s2-l2a-cogs"
+BASE_URL = "http://bench-server"
+PAGE_SIZE = 100
+
+
+def load_setup_data(filename: str) -> Dict:
+    """Load a fixture of the data loader."""
+    with open(os.path.join(SETUP_DATA, filename)) as f:
+        return json.load(f)
+
+
+def shift_coordinates(coordinates, dx: float):
+    """Shift nested GeoJSON coordinates by `dx` degrees of longitude."""
+    if isinstance(coordinates[0], (int, float)):
+        return [coordinates[0] + dx, *coordinates[1:]]
+    return [shift_coordinates(c, dx) for c in coordinates]
+
+
+def make_items(count: int) -> List[Dict]:
+    """Make `count` items from the fixture, each copy on a different footprint.
+
+    The n-th copy of a fixture item is shifted by n * 7 degrees of longitude,
+    wrapped so that footprints never cross the antimeridian, and by n days.
+    """
+    features = load_setup_data("sentinel-s2-l2a-cogs_0_100.json")["features"]
+    items = []
+    for i in range(count):
+        feature = features[i % len(features)]
+        n = i // len(features)
+        dx = (n * 7) % 360
+        if feature["bbox"][2] + dx > 180:
+            dx -= 360
+        item = copy.deepcopy(feature)
+        item["id"] = f"{feature['id']}-{n}"
+        item["collection"] = COLLECTION_ID
+        item["bbox"] = [
+            item["bbox"][0] + dx,
+            item["bbox"][1],
+            item["bbox"][2] + dx,
+            item["bbox"][3],
+        ]
+        item["geometry"]["coordinates"] = shift_coordinates(
+            item["geometry"]["coordinates"], dx
+        )
+        date = datetime.strptime(
+            item["properties"]["datetime"][:19], "%Y-%m-%dT%H:%M:%S"
+        ) + timedelta(days=n)
+        item["properties"]["datetime"] = date.strftime("%Y-%m-%dT%H:%M:%SZ")
+        items.append(item)
+    return items
+
+
+def summarize(samples: List[float], items_per_sample: int = 1) -> Dict:
+    """Summarize the durations of a case, in milliseconds."""
+    samples = sorted(samples)
+    return {
+        "samples": len(samples),
+        "items_per_sample": items_per_sample,
+        "min_ms": round(samples[0] * 1e3, 4),
+        "mean_ms": round(statistics.mean(samples) * 1e3, 4),
+        "p50_ms": round(samples[len(samples) // 2] * 1e3, 4),
+        "p95_ms": round(samples[int(len(samples) * 0.95)] * 1e3, 4),
+        "max_ms": round(samples[-1] * 1e3, 4),
+        "items_per_second": round(len(samples) * items_per_sample / sum(samples), 1),
+    }
+
+
+async def timed(case: Callable[[int], Awaitable], repeat: int) -> List[float]:
+    """Time `repeat` calls of a case, given the index of the call."""
+    samples = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        await case(i)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def check(response):
+    """Fail the benchmark on an error response."""
+    if response.status_code >= 400:
+        raise RuntimeError(
+            f"{response.request.method} {response.request.url}: "
+            f"{response.status_code} {response.text}"
+        )
+    return response
+
+
+async def run(items: List[Dict], repeat: int, batch: int) -> Dict:
+    """Load the items through the app and time its paths."""
+    from httpx import AsyncClient
+
+    from stac_fastapi.caching.app import app, session
+    from stac_fastapi.caching.serializers import ItemSerializer
+
+    rng = random.Random(0)
+    results = {}
+    async with AsyncClient(app=app, base_url=BASE_URL) as client:
+        await client.delete(f"/collections/{COLLECTION_ID}")
+        collection = load_setup_data("collection.json")
+        collection["id"] = COLLECTION_ID
+        check(await client.post("/collections", json=collection))
+
+        async def ingest(i):
+            features = items[i * batch : (i + 1) * batch]
+            check(
+                await client.post(
+                    f"/collections/{COLLECTION_ID}/items",
+                    json={"type": "FeatureCollection", "features": features},
+                )
+            )
+
+        batches = (len(items) + batch - 1) // batch
+        results["ingest"] = summarize(await timed(ingest, batches), batch)
+
+        async def get_item(i):
+            item = rng.choice(items)
+            check(await client.get(f"/collections/{COLLECTION_ID}/items/{item['id']}"))
+
+        results["get_item"] = summarize(await timed(get_item, repeat))
+
+        async def bbox_search(i):
+            west, south = rng.uniform(-180, 170), rng.uniform(-80, 70)
+            check(
+                await client.post(
+                    "/search",
+                    json={
+                        "collections": [COLLECTION_ID],
+                        "bbox": [west, south, west + 10, south + 10],
+                        "limit": PAGE_SIZE,
+                    },
+                )
+            )
+
+        results["bbox_search"] = summarize(await timed(bbox_search, repeat))
+
+        async def item_collection(i):
+            check(
+                await client.get(
+                    f"/collections/{COLLECTION_ID}/items",
+                    params={"limit": PAGE_SIZE},
+                )
+            )
+
+        results["item_collection"] = summarize(
+            await timed(item_collection, repeat), PAGE_SIZE
+        )
+
+        async def collections(i):
+            check(await client.get("/collections"))
+
+        results["collections"] = summarize(await timed(collections, repeat))
+
+        page = await session.pipeline_client.execute_command(
+            "SCAN", f"items:{COLLECTION_ID}", "LIMIT", PAGE_SIZE, "NOFIELDS"
+        )
+        stored = [obj["object"] for obj in json.loads(page)["objects"]]
+
+        async def serialize(i):
+            for item in stored:
+                ItemSerializer.db_to_stac(item, BASE_URL)
+
+        results["serialize"] = summarize(await timed(serialize, repeat), len(stored))
+
+        check(await client.delete(f"/collections/{COLLECTION_ID}"))
+    await session.close()
+    return results
+
+
+def git_commit() -> str:
+    """Get the commit of the working tree, if any."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(__file__),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(results: Dict, baseline: Dict):
+    """Print the change of the median of each case from a baseline."""
+    print(
+        f"{'case':16} {'baseline':>12} {'current':>12} {'change':>8}", file=sys.stderr
+    )
+    for name, result in results["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        change = result["p50_ms"] / before["p50_ms"] - 1
+        print(
+            f"{name:16} {before['p50_ms']:10.3f}ms {result['p50_ms']:10.3f}ms "
+            f"{change:+8.1%}",
+            file=sys.stderr,
+        )
+
+
+def main():
+    """Run the benchmarks from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--tile38", help="HOST:PORT of a Tile38 to use")
+    parser.add_argument("--output", help="file to write the results to")
+    parser.add_argument("--compare", help="results of a previous run")
+    args = parser.parse_args()
+
+    if args.tile38:
+        host, _, port = args.tile38.rpartition(":")
+    else:
+        host, port = start_in_thread()
+    # read by the app settings on import
+    os.environ["38_HOST"], os.environ["38_PORT"] = host, str(port)
+
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "tile38": args.tile38 or "fake",
+        "items": args.items,
+        "results": asyncio.run(run(make_items(args.items), args.repeat, args.batch)),
+    }
+    document = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(document + "\n")
+    else:
+        print(document)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Per-item cost of the links built by `ItemSerializer.db_to_stac`.
+
+Compares the `ItemLinks` and `resolve_links` helpers of stac_fastapi.types
+with the cached link templates, and times the whole `db_to_stac` call.
+
+Run with `python benchmarks/bench_item_links.py [--items N] [--repeat R]`.
+"""
+import argparse
+import copy
+import json
+import os
+import timeit
+from typing import Dict, List
+
+from stac_fastapi.caching.models.links import link_templates
+from stac_fastapi.caching.serializers import ItemSerializer
+from stac_fastapi.types.links import ItemLinks, resolve_links
+
+BASE_URL = "http://test-server/"
+DATA = os.path.join(os.path.dirname(__file__), "..", "tests", "data", "test_item.json")
+
+
+def item_links(item: dict, base_url: str) -> List[Dict]:
+    """Build the links of an item like `db_to_stac` did before link templates."""
+    links = ItemLinks(
+        collection_id=item["collection"], item_id=item["id"], base_url=base_url
+    ).create_links()
+    if item["links"]:
+        links += resolve_links(item["links"], base_url)
+    return links
+
+
+def item_links_from_templates(item: dict, base_url: str) -> List[Dict]:
+    """Build the links of an item like `db_to_stac` does."""
+    templates = link_templates(base_url)
+    links = templates.item_links(item["collection"], item["id"])
+    if item["links"]:
+        links += templates.resolve_links(item["links"])
+    return links
+
+
+def make_items(count: int):
+    """Make stored items with distinct ids."""
+    with open(DATA) as f:
+        item = json.load(f)
+    item = ItemSerializer.stac_to_db(item, BASE_URL)
+    items = []
+    for i in range(count):
+        item = copy.deepcopy(item)
+        item["id"] = f"item-{i}"
+        items.append(item)
+    return items
+
+
+def run(count: int, repeat: int):
+    """Time the links of a page of items, before and after."""
+    items = make_items(count)
+    cases = {
+        "links, ItemLinks": lambda: [item_links(item, BASE_URL) for item in items],
+        "links, link templates": lambda: [
+            item_links_from_templates(item, BASE_URL) for item in items
+        ],
+        "db_to_stac": lambda: [
+            ItemSerializer.db_to_stac(item, BASE_URL) for item in items
+        ],
+    }
+    for name, case in cases.items():
+        best = min(timeit.repeat(case, number=1, repeat=repeat))
+        print(f"{name:24} {best / count * 1e6:8.2f} us/item")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    run(args.items, args.repeat)
@@ -0,0 +1,89 @@
+"""Size and encode time of items with simplified and rounded geometries.
+
+The footprint of the test item is densified with jittered vertices, like
+the footprints of Sentinel-2 scenes, and a page of items serialized by
+`ItemSerializer.db_to_stac` and encoded with the codec, with the geometry
+options of the Simplify extension.
+
+Run with `python benchmarks/bench_simplify.py [--items N] [--vertices V]`.
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import timeit
+
+from stac_fastapi.caching import codec
+from stac_fastapi.caching.serializers import ItemSerializer
+from stac_fastapi.caching.simplify import SIMPLIFIED_KEY, simplified_geometries
+
+BASE_URL = "http://test-server/"
+DATA = os.path.join(os.path.dirname(__file__), "..", "tests", "data", "test_item.json")
+
+
+def dense_ring(ring, vertices: int):
+    """Split the edges of a ring in jittered segments, `vertices` in all."""
+    rng = random.Random(0)
+    steps = max(1, vertices // (len(ring) - 1))
+    dense = []
+    for a, b in zip(ring, ring[1:]):
+        for i in range(steps):
+            t = i / steps
+            dense.append(
+                [
+                    a[0] + (b[0] - a[0]) * t + rng.uniform(-1e-5, 1e-5),
+                    a[1] + (b[1] - a[1]) * t + rng.uniform(-1e-5, 1e-5),
+                ]
+            )
+    return dense + [dense[0]]
+
+
+def make_items(count: int, vertices: int):
+    """Make stored items with dense footprints and their simplified geometries."""
+    with open(DATA) as f:
+        item = json.load(f)
+    item = ItemSerializer.stac_to_db(item, BASE_URL)
+    ring = item["geometry"]["coordinates"][0]
+    item["geometry"]["coordinates"] = [dense_ring(ring, vertices)]
+    item[SIMPLIFIED_KEY] = simplified_geometries(item["geometry"])
+    items = []
+    for i in range(count):
+        item = copy.deepcopy(item)
+        item["id"] = f"item-{i}"
+        items.append(item)
+    return items
+
+
+def run(count: int, vertices: int, repeat: int):
+    """Time the serialization of a page of items with each geometry option."""
+    items = make_items(count, vertices)
+    cases = {
+        "full geometry": {},
+        "precision=6": {"precision": 6},
+        "simplify=0.0001": {"simplify": 0.0001},
+        "simplify=0.001": {"simplify": 0.001},
+        "simplify=0.001,precision=5": {"simplify": 0.001, "precision": 5},
+    }
+    for name, options in cases.items():
+
+        def page():
+            return codec.dumps(
+                [ItemSerializer.db_to_stac(item, BASE_URL, **options) for item in items]
+            )
+
+        size = len(page())
+        best = min(timeit.repeat(page, number=1, repeat=repeat))
+        print(
+            f"{name:28} {size / count / 1024:8.2f} KiB/item "
+            f"{best / count * 1e6:8.2f} us/item"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--vertices", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    run(args.items, args.vertices, args.repeat)
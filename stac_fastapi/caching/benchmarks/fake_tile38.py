@@ -0,0 +1,683 @@
+"""In-process stand-in for Tile38, for benchmarks and local runs.
+
+Speaks RESP over TCP with JSON output, like Tile38 after `OUTPUT json`, for
+the subset of commands used by stac-fastapi-caching: SET (FIELD, EX, NX, XX,
+OBJECT, STRING, POINT), FSET, GET, JSET, JGET, JDEL, DEL (ERRON404), PDEL,
+DROP, EXPIRE, KEYS, FLUSHDB, SCAN/INTERSECTS/WITHIN/NEARBY (CURSOR, LIMIT,
+MATCH, WHERE, WHEREIN, NOFIELDS, IDS/COUNT/OBJECTS/BOUNDS outputs,
+BOUNDS/OBJECT/POINT/TILE areas), SETCHAN/DELCHAN/CHANS and (P)SUBSCRIBE.
+
+Geometries are compared by their bounding boxes and searches walk every
+object of a key, so it is no substitute for Tile38 when measuring the
+database itself: it makes the API side of a benchmark reproducible.
+
+Run with `python benchmarks/fake_tile38.py [port]`.
+"""
+import asyncio
+import fnmatch
+import json
+import math
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class Tile38Error(Exception):
+    """Error returned as `{"ok": false, "err": ...}`."""
+
+
+def bbox(geometry: Dict) -> List[float]:
+    """Get the bounding box of a GeoJSON object."""
+    kind = geometry.get("type")
+    if kind == "Feature":
+        return bbox(geometry["geometry"])
+    if kind == "FeatureCollection":
+        boxes = [bbox(f) for f in geometry["features"]]
+    elif kind == "GeometryCollection":
+        boxes = [bbox(g) for g in geometry["geometries"]]
+    else:
+        points = []
+
+        def walk(coordinates):
+            if isinstance(coordinates[0], (int, float)):
+                points.append(coordinates)
+            else:
+                for c in coordinates:
+                    walk(c)
+
+        walk(geometry["coordinates"])
+        xs = [p[0] for p in points]
+        ys = [p[1] for p in points]
+        return [min(xs), min(ys), max(xs), max(ys)]
+    return [
+        min(b[0] for b in boxes),
+        min(b[1] for b in boxes),
+        max(b[2] for b in boxes),
+        max(b[3] for b in boxes),
+    ]
+
+
+def _overlap(a: List[float], b: List[float]) -> bool:
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def _haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    r = 6371e3
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * r * math.asin(math.sqrt(a))
+
+
+def _num(value: Any) -> float:
+    value = str(value)
+    if value in ("+inf", "inf"):
+        return math.inf
+    if value == "-inf":
+        return -math.inf
+    return float(value)
+
+
+def _format_num(value: float):
+    if float(value).is_integer() and abs(value) < 1e15:
+        return int(value)
+    return value
+
+
+def _split_path(path: str) -> List[str]:
+    # wildcards, modifiers and queries are not interpreted but rejected, so
+    # unescaped member names holding them fail rather than match by chance
+    parts, current, escaped = [], "", False
+    for ch in path:
+        if escaped:
+            current += ch
+            escaped = False
+        elif ch == "\\":
+            escaped = True
+        elif ch == ".":
+            parts.append(current)
+            current = ""
+        elif ch in "*?|#@":
+            raise Tile38Error("invalid path")
+        else:
+            current += ch
+    parts.append(current)
+    return parts
+
+
+class Object:
+    """A stored object, with its FIELDS and expiry time."""
+
+    def __init__(self, kind: str, value: Any, fields: Dict, expires: Optional[float]):
+        """Make an object of kind `object` (GeoJSON) or `string`."""
+        self.kind = kind
+        self.value = value
+        self.fields = fields
+        self.expires = expires
+
+    def bbox(self) -> Optional[List[float]]:
+        """Get the bounding box of a GeoJSON object, None for a string."""
+        if self.kind == "string":
+            return None
+        return bbox(self.value)
+
+
+class Store:
+    """Keys, channels and subscribers of a server."""
+
+    def __init__(self):
+        """Make an empty store."""
+        self.keys: Dict[str, Dict[str, Object]] = {}
+        self.chans: Dict[str, Dict] = {}
+        self.subs: List["Connection"] = []
+
+    def collection(self, key: str, create: bool = False) -> Dict[str, Object]:
+        """Get the objects of a key, without the expired ones."""
+        objects = self.keys.get(key)
+        if objects is None:
+            if create:
+                objects = self.keys[key] = {}
+            else:
+                raise Tile38Error("key not found")
+        now = time.time()
+        for id in [id for id, o in objects.items() if o.expires and o.expires < now]:
+            del objects[id]
+        return objects
+
+    def get(self, key: str, id: str) -> Object:
+        """Get one object."""
+        objects = self.collection(key)
+        if id not in objects:
+            raise Tile38Error("id not found")
+        return objects[id]
+
+    def notify(self, key: str, id: str, command: str, obj: Optional[Object]):
+        """Publish a write to the subscribers of the channels on its key."""
+        for name, chan in self.chans.items():
+            if chan["key"] != key:
+                continue
+            message = json.dumps(
+                {
+                    "command": command,
+                    "detect": "inside" if command == "set" else command,
+                    "hook": name,
+                    "key": key,
+                    "id": id,
+                    "time": "",
+                    "object": obj.value if obj is not None else None,
+                }
+            )
+            for sub in self.subs:
+                if sub.matches(name):
+                    sub.push(name, message)
+
+
+class Connection:
+    """A client connection, with the channel patterns it subscribed to."""
+
+    def __init__(self, store: Store, reader, writer):
+        """Make a connection of `store`."""
+        self.store = store
+        self.reader = reader
+        self.writer = writer
+        self.patterns: List[str] = []
+
+    def matches(self, name: str) -> bool:
+        """Check whether the connection subscribed to a channel."""
+        return any(fnmatch.fnmatchcase(name, p) for p in self.patterns)
+
+    def push(self, name: str, message: str):
+        """Send a message of a channel."""
+        self.writer.write(_encode_array([b"message", name.encode(), message.encode()]))
+
+
+def _encode_bulk(value) -> bytes:
+    if isinstance(value, str):
+        value = value.encode()
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def _encode_array(items) -> bytes:
+    return b"*%d\r\n" % len(items) + b"".join(_encode_bulk(i) for i in items)
+
+
+async def _read_command(reader) -> Optional[List[str]]:
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        return line.decode().split()
+    args = []
+    for _ in range(int(line[1:])):
+        size = int((await reader.readline())[1:])
+        data = await reader.readexactly(size + 2)
+        args.append(data[:-2].decode())
+    return args
+
+
+def ok(**kwargs) -> Dict:
+    """Make a successful reply."""
+    reply = {"ok": True}
+    reply.update(kwargs)
+    reply["elapsed"] = "1µs"
+    return reply
+
+
+def _where_match(fields: Dict, wheres: List) -> bool:
+    for where in wheres:
+        if where[0] == "WHERE":
+            _, field, low, high = where
+            value = fields.get(field, 0)
+            low_exclusive = str(low).startswith("(")
+            high_exclusive = str(high).startswith("(")
+            low = _num(str(low).lstrip("("))
+            high = _num(str(high).lstrip("("))
+            if value < low or low_exclusive and value == low:
+                return False
+            if value > high or high_exclusive and value == high:
+                return False
+        else:
+            _, field, values = where
+            if fields.get(field, 0) not in values:
+                return False
+    return True
+
+
+def _is_number(args: List[str]) -> bool:
+    """Check the first of `args` is a number."""
+    try:
+        float(args[0])
+    except (IndexError, ValueError):
+        return False
+    return True
+
+
+def _parse_search(args: List[str], i: int) -> Tuple[Dict, str, Optional[Tuple]]:
+    options = {"cursor": 0, "limit": 100, "where": [], "match": "*"}
+    output = "OBJECTS"
+    area = None
+    while i < len(args):
+        option = args[i].upper()
+        if option == "CURSOR":
+            options["cursor"] = int(args[i + 1])
+            i += 2
+        elif option == "LIMIT":
+            options["limit"] = int(args[i + 1])
+            i += 2
+        elif option == "MATCH":
+            options["match"] = args[i + 1]
+            i += 2
+        elif option == "WHERE":
+            options["where"].append(["WHERE", args[i + 1], args[i + 2], args[i + 3]])
+            i += 4
+        elif option == "WHEREIN":
+            count = int(args[i + 2])
+            values = [_num(v) for v in args[i + 3 : i + 3 + count]]
+            options["where"].append(["WHEREIN", args[i + 1], values])
+            i += 3 + count
+        elif option in ("NOFIELDS", "ASC", "DESC", "DISTANCE"):
+            options[option.lower()] = True
+            i += 1
+        elif option in ("IDS", "COUNT", "OBJECTS", "POINTS"):
+            output = option
+            i += 1
+        elif option == "SPARSE":
+            i += 2
+        elif option == "BOUNDS" and not _is_number(args[i + 1 : i + 2]):
+            output = option
+            i += 1
+        elif option == "BOUNDS":
+            south, west, north, east = (float(v) for v in args[i + 1 : i + 5])
+            area = ("bbox", [west, south, east, north])
+            i += 5
+        elif option == "OBJECT":
+            area = ("bbox", bbox(json.loads(args[i + 1])))
+            i += 2
+        elif option == "POINT":
+            lat, lon = float(args[i + 1]), float(args[i + 2])
+            radius = float(args[i + 3]) if i + 3 < len(args) else None
+            area = ("point", lat, lon, radius)
+            i += 3 + (1 if radius is not None else 0)
+        elif option == "TILE":
+            x, y, z = int(args[i + 1]), int(args[i + 2]), int(args[i + 3])
+            n = 2**z
+            west = x / n * 360 - 180
+            east = (x + 1) / n * 360 - 180
+            south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+            north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+            area = ("bbox", [west, south, east, north])
+            i += 4
+        else:
+            raise Tile38Error(f"unknown option {args[i]}")
+    return options, output, area
+
+
+def _set(store: Store, args: List[str]) -> Dict:
+    key, id = args[0], args[1]
+    i = 2
+    fields: Dict[str, float] = {}
+    expires = None
+    nx = xx = False
+    obj = None
+    while i < len(args):
+        option = args[i].upper()
+        if option == "FIELD":
+            fields[args[i + 1]] = float(args[i + 2])
+            i += 3
+        elif option == "EX":
+            expires = time.time() + float(args[i + 1])
+            i += 2
+        elif option == "NX":
+            nx = True
+            i += 1
+        elif option == "XX":
+            xx = True
+            i += 1
+        elif option == "OBJECT":
+            obj = Object("object", json.loads(args[i + 1]), fields, expires)
+            i += 2
+        elif option == "STRING":
+            obj = Object("string", args[i + 1], fields, expires)
+            i += 2
+        elif option == "POINT":
+            point = {
+                "type": "Point",
+                "coordinates": [float(args[i + 2]), float(args[i + 1])],
+            }
+            obj = Object("object", point, fields, expires)
+            i += 3
+        else:
+            raise Tile38Error(f"invalid argument '{args[i]}'")
+    exists = key in store.keys and id in store.collection(key)
+    if nx and exists:
+        raise Tile38Error("id already exists")
+    if xx and not exists:
+        raise Tile38Error("id not found")
+    if exists:
+        # like Tile38, the FIELDS a SET leaves out are kept
+        merged = dict(store.collection(key)[id].fields)
+        merged.update(fields)
+        obj.fields = merged
+    store.collection(key, create=True)[id] = obj
+    store.notify(key, id, "set", obj)
+    return ok()
+
+
+def _jset(store: Store, args: List[str]) -> Dict:
+    key, id, path, value = args[:4]
+    mode = args[4].upper() if len(args) > 4 else None
+    objects = store.collection(key, create=True)
+    obj = objects.get(id)
+    is_geojson = obj is not None and obj.kind == "object"
+    if obj is None:
+        document = {}
+    elif is_geojson:
+        document = obj.value
+    else:
+        document = json.loads(obj.value)
+    if mode == "RAW":
+        value = json.loads(value)
+    elif mode != "STR":
+        try:
+            parsed = json.loads(value)
+        except ValueError:
+            parsed = value
+        if not isinstance(parsed, (dict, list)):
+            value = parsed
+    current = document
+    parts = _split_path(path)
+    for part in parts[:-1]:
+        current = current.setdefault(part, {})
+    current[parts[-1]] = value
+    if is_geojson:
+        objects[id] = Object("object", document, obj.fields, None)
+    else:
+        fields = obj.fields if obj else {}
+        objects[id] = Object("string", json.dumps(document), fields, None)
+    return ok()
+
+
+def _jget(store: Store, args: List[str]) -> Dict:
+    obj = store.get(args[0], args[1])
+    value = obj.value if obj.kind == "object" else json.loads(obj.value)
+    if len(args) > 2 and args[2].upper() != "RAW":
+        for part in _split_path(args[2]):
+            if not isinstance(value, dict) or part not in value:
+                raise Tile38Error("path not found")
+            value = value[part]
+    return ok(value=value if isinstance(value, str) else json.dumps(value))
+
+
+def _jdel(store: Store, args: List[str]) -> Dict:
+    obj = store.get(args[0], args[1])
+    document = obj.value if obj.kind == "object" else json.loads(obj.value)
+    current = document
+    parts = _split_path(args[2])
+    for part in parts[:-1]:
+        current = current.get(part, {}) if isinstance(current, dict) else {}
+    if not isinstance(current, dict) or parts[-1] not in current:
+        raise Tile38Error("path not found")
+    del current[parts[-1]]
+    if obj.kind != "object":
+        store.collection(args[0])[args[1]] = Object(
+            "string", json.dumps(document), obj.fields, None
+        )
+    return ok()
+
+
+def _del(store: Store, args: List[str]) -> Dict:
+    erron404 = len(args) > 2 and args[2].upper() == "ERRON404"
+    try:
+        objects = store.collection(args[0])
+    except Tile38Error:
+        if erron404:
+            raise
+        return ok()
+    if args[1] not in objects:
+        if erron404:
+            raise Tile38Error("id not found")
+        return ok()
+    obj = objects.pop(args[1])
+    store.notify(args[0], args[1], "del", obj)
+    return ok()
+
+
+def _search(store: Store, command: str, args: List[str]) -> Dict:
+    key = args[0]
+    options, output, area = _parse_search(args, 1)
+    try:
+        objects = store.collection(key)
+    except Tile38Error:
+        objects = {}
+    ids = sorted(objects)
+    distances = {}
+    if command == "NEARBY":
+        _, lat, lon, radius = area
+        candidates = []
+        for id in ids:
+            box = objects[id].bbox()
+            if box is None:
+                continue
+            x = min(max(lon, box[0]), box[2])
+            y = min(max(lat, box[1]), box[3])
+            distance = _haversine(lat, lon, y, x)
+            if radius is None or distance <= radius:
+                candidates.append((distance, id))
+        candidates.sort()
+        ids = [id for _, id in candidates]
+        distances = {id: distance for distance, id in candidates}
+
+    matched = []
+    position = 0
+    for index in range(options["cursor"], len(ids)):
+        id = ids[index]
+        position = index + 1
+        obj = objects[id]
+        if not fnmatch.fnmatchcase(id, options["match"]):
+            continue
+        if not _where_match(obj.fields, options["where"]):
+            continue
+        if command in ("INTERSECTS", "WITHIN"):
+            box = obj.bbox()
+            if box is None:
+                continue
+            if area[0] == "bbox" and not _overlap(box, area[1]):
+                continue
+            if area[0] == "point" and not _overlap(box, [area[2], area[1]] * 2):
+                continue
+        matched.append(id)
+        if len(matched) >= options["limit"]:
+            break
+    cursor = position if len(matched) >= options["limit"] else 0
+
+    if output == "COUNT":
+        return ok(count=len(matched), cursor=cursor)
+    if output == "IDS":
+        return ok(ids=matched, count=len(matched), cursor=cursor)
+    if output == "BOUNDS":
+        bounds = []
+        for id in matched:
+            west, south, east, north = objects[id].bbox()
+            bounds.append(
+                {
+                    "id": id,
+                    "bounds": {
+                        "sw": {"lat": south, "lon": west},
+                        "ne": {"lat": north, "lon": east},
+                    },
+                }
+            )
+        return ok(bounds=bounds, count=len(matched), cursor=cursor)
+    with_fields = not options.get("nofields")
+    field_names = sorted({f for id in matched for f in objects[id].fields})
+    results = []
+    for id in matched:
+        result = {"id": id, "object": objects[id].value}
+        if field_names and with_fields:
+            result["fields"] = [
+                _format_num(objects[id].fields.get(f, 0)) for f in field_names
+            ]
+        if options.get("distance") and id in distances:
+            result["distance"] = distances[id]
+        results.append(result)
+    reply = ok(objects=results, count=len(matched), cursor=cursor)
+    if field_names and with_fields:
+        reply["fields"] = field_names
+    return reply
+
+
+def execute(store: Store, args: List[str]) -> Dict:
+    """Execute one command and make its reply."""
+    command = args[0].upper()
+    args = args[1:]
+    if command == "PING":
+        return ok(ping="pong")
+    if command in ("OUTPUT", "HEALTHZ", "READONLY", "AUTH", "GC", "CLIENT"):
+        return ok()
+    if command == "FLUSHDB":
+        store.keys.clear()
+        return ok()
+    if command == "SERVER":
+        return ok(stats={"num_objects": sum(len(o) for o in store.keys.values())})
+    if command == "KEYS":
+        return ok(
+            keys=sorted(
+                key
+                for key, objects in store.keys.items()
+                if objects and fnmatch.fnmatchcase(key, args[0])
+            )
+        )
+    if command == "SET":
+        return _set(store, args)
+    if command == "FSET":
+        obj = store.get(args[0], args[1])
+        i = 3 if args[2].upper() == "XX" else 2
+        for name, value in zip(args[i::2], args[i + 1 :: 2]):
+            obj.fields[name] = float(value)
+        return ok()
+    if command == "GET":
+        obj = store.get(args[0], args[1])
+        reply = ok(object=obj.value)
+        if "WITHFIELDS" in (a.upper() for a in args[2:]) and obj.fields:
+            reply["fields"] = {k: _format_num(v) for k, v in obj.fields.items()}
+        return reply
+    if command == "JSET":
+        return _jset(store, args)
+    if command == "JGET":
+        return _jget(store, args)
+    if command == "JDEL":
+        return _jdel(store, args)
+    if command == "DEL":
+        return _del(store, args)
+    if command == "PDEL":
+        objects = store.collection(args[0])
+        for id in [id for id in objects if fnmatch.fnmatchcase(id, args[1])]:
+            del objects[id]
+        return ok()
+    if command == "DROP":
+        store.keys.pop(args[0], None)
+        return ok()
+    if command == "EXPIRE":
+        store.get(args[0], args[1]).expires = time.time() + float(args[2])
+        return ok()
+    if command == "SETCHAN":
+        rest = args[1:]
+        while rest and rest[0].upper() in ("META", "EX"):
+            rest = rest[3:] if rest[0].upper() == "META" else rest[2:]
+        store.chans[args[0]] = {"key": rest[1], "command": rest}
+        return ok()
+    if command == "DELCHAN":
+        store.chans.pop(args[0], None)
+        return ok()
+    if command == "CHANS":
+        return ok(
+            chans=[
+                {"name": name}
+                for name in store.chans
+                if fnmatch.fnmatchcase(name, args[0])
+            ]
+        )
+    if command in ("SCAN", "INTERSECTS", "WITHIN", "NEARBY"):
+        return _search(store, command, args)
+    raise Tile38Error(f"unknown command '{command.lower()}'")
+
+
+async def handle(store: Store, reader, writer):
+    """Serve the commands of one connection."""
+    connection = Connection(store, reader, writer)
+    try:
+        while True:
+            args = await _read_command(reader)
+            if args is None:
+                break
+            if not args:
+                continue
+            command = args[0].upper()
+            if command in ("SUBSCRIBE", "PSUBSCRIBE"):
+                for i, pattern in enumerate(args[1:]):
+                    connection.patterns.append(pattern)
+                    store.subs.append(connection)
+                    writer.write(
+                        b"*3\r\n"
+                        + _encode_bulk(command.lower())
+                        + _encode_bulk(pattern)
+                        + b":%d\r\n" % (i + 1)
+                    )
+                await writer.drain()
+                continue
+            if command == "QUIT":
+                writer.write(b"+OK\r\n")
+                break
+            try:
+                reply = execute(store, args)
+            except Tile38Error as e:
+                reply = {"ok": False, "err": str(e), "elapsed": "1µs"}
+            except Exception as e:
+                reply = {"ok": False, "err": f"{type(e).__name__}: {e}"}
+            writer.write(_encode_bulk(json.dumps(reply)))
+            await writer.drain()
+    except (ConnectionResetError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        while connection in store.subs:
+            store.subs.remove(connection)
+        writer.close()
+
+
+async def serve(host: str = "127.0.0.1", port: int = 9851):
+    """Serve an empty store until cancelled."""
+    store = Store()
+    server = await asyncio.start_server(
+        lambda reader, writer: handle(store, reader, writer), host, port
+    )
+    async with server:
+        await server.serve_forever()
+
+
+def start_in_thread(host: str = "127.0.0.1", port: int = 0) -> Tuple[str, int]:
+    """Serve an empty store from a daemon thread, on a free port by default.
+
+    Returns the address the server listens on.
+    """
+    started = threading.Event()
+    address: List[Tuple[str, int]] = []
+
+    async def run():
+        store = Store()
+        server = await asyncio.start_server(
+            lambda reader, writer: handle(store, reader, writer), host, port
+        )
+        address.append(server.sockets[0].getsockname()[:2])
+        started.set()
+        async with server:
+            await server.serve_forever()
+
+    threading.Thread(target=asyncio.run, args=(run(),), daemon=True).start()
+    started.wait()
+    return address[0]
+
+
+if __name__ == "__main__":
+    asyncio.run(serve(port=int(sys.argv[1]) if len(sys.argv) > 1 else 9851))
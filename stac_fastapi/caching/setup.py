@@ -19,6 +19,7 @@ install_requires = [
     "overrides",
     "starlette",
     "pyle38",
+    "redis>=4.2.0",
 ]
 
 extra_reqs = {
@@ -30,9 +31,12 @@ extra_reqs = {
         "requests",
         "ciso8601",
         "httpx",
+        "prometheus-client",
     ],
     "docs": ["mkdocs", "mkdocs-material", "pdocs"],
     "server": ["uvicorn[standard]>=0.12.0,<0.14.0"],
+    "orjson": ["orjson"],
+    "metrics": ["prometheus-client"],
 }
 
 setup(
@@ -56,6 +60,9 @@ setup(
     tests_require=extra_reqs["dev"],
     extras_require=extra_reqs,
     entry_points={
-        "console_scripts": ["stac-fastapi-caching=stac_fastapi.caching.app:run"]
+        "console_scripts": [
+            "stac-fastapi-caching=stac_fastapi.caching.app:run",
+            "stac-fastapi-caching-migrate=stac_fastapi.caching.migrate:run",
+        ]
     },
 )
@@ -1,16 +1,30 @@
 """FastAPI application."""
+
 from stac_fastapi.api.app import StacApi
 from stac_fastapi.api.models import create_get_request_model, create_post_request_model
+from stac_fastapi.caching.codec import JSONResponse
 from stac_fastapi.caching.config import Tile38Settings
 from stac_fastapi.caching.core import (
     BulkTransactionsClient,
     CoreClient,
+    ExportClient,
     TransactionsClient,
 )
-from stac_fastapi.caching.extensions import QueryExtension
+from stac_fastapi.caching.database_logic import DatabaseLogic
+from stac_fastapi.caching.extensions import (
+    CompressionMiddleware,
+    ExportExtension,
+    MetricsExtension,
+    NearbyExtension,
+    QueryExtension,
+    SimplifyExtension,
+)
 
 # from stac_fastapi.caching.indexes import IndexesClient
+from stac_fastapi.caching.invalidation import InvalidationBus
+from stac_fastapi.caching.response_cache import ResponseCache, ResponseCacheMiddleware
 from stac_fastapi.caching.session import Session
+from stac_fastapi.caching.tile_cache import TileCache
 from stac_fastapi.extensions.core import (  # FieldsExtension,
     ContextExtension,
     SortExtension,
@@ -21,10 +35,20 @@ from stac_fastapi.extensions.third_party import BulkTransactionExtension
 
 settings = Tile38Settings()
 session = Session.create_from_settings(settings)
+response_cache = ResponseCache.create_from_env(session)
+tile_cache = TileCache.create_from_env()
+invalidation_bus = InvalidationBus.create_from_env(session)
+invalidation_bus.add_handler(response_cache.evict)
+invalidation_bus.add_handler(DatabaseLogic.evict_collections)
+invalidation_bus.add_handler(tile_cache.evict)
 
 extensions = [
     TransactionExtension(client=TransactionsClient(session=session), settings=settings),
     BulkTransactionExtension(client=BulkTransactionsClient(session=session)),
+    ExportExtension(client=ExportClient(session=session)),
+    MetricsExtension(),
+    NearbyExtension(),
+    SimplifyExtension(),
     # FieldsExtension(),
     QueryExtension(),
     SortExtension(),
@@ -40,16 +64,26 @@ api = StacApi(
     client=CoreClient(session=session, post_request_model=post_request_model),
     search_get_request_model=create_get_request_model(extensions),
     search_post_request_model=post_request_model,
+    response_class=JSONResponse,
+    # the cache is wrapped by the compression, so it holds plain bodies
+    middlewares=[ResponseCacheMiddleware, CompressionMiddleware],
 )
 app = api.app
 
 
 @app.on_event("startup")
 async def _startup_event():
-    pass
+    await session.connect()
+    await invalidation_bus.start()
     # await IndexesClient().create_indexes()
 
 
+@app.on_event("shutdown")
+async def _shutdown_event():
+    await invalidation_bus.stop()
+    await session.close()
+
+
 def run():
     """Run app from command line using uvicorn if available."""
     try:
@@ -0,0 +1,65 @@
+"""In-process caches."""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+import attr
+
+_MISSING = object()
+
+
+@attr.s
+class TTLCache:
+    """Bounded LRU cache whose entries expire after a time to live.
+
+    The cache is local to one process: entries written by other workers are
+    only seen once the local ones have expired or been invalidated. It is
+    shared by the event loop and the threads running sync endpoints.
+    """
+
+    maxsize: int = attr.ib(default=1024)
+    ttl: float = attr.ib(default=60.0)
+    timer: Callable[[], float] = attr.ib(default=time.monotonic)
+    _entries: "OrderedDict[Hashable, Any]" = attr.ib(factory=OrderedDict, init=False)
+    _lock: threading.Lock = attr.ib(factory=threading.Lock, init=False)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the value of a live entry, or `default`."""
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires, value = entry
+            if expires <= self.timer():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Add an entry, evicting the least recently used one when full."""
+        if self.maxsize <= 0:
+            return
+        expires = self.timer() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *keys: Hashable) -> None:
+        """Drop some entries, or every entry when no key is given."""
+        with self._lock:
+            if not keys:
+                self._entries.clear()
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Test if a live entry exists."""
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        """Return the number of entries, including expired ones not yet evicted."""
+        return len(self._entries)
@@ -0,0 +1,52 @@
+"""JSON codec of Tile38 payloads and API responses.
+
+orjson is used when it is installed, the standard library otherwise.
+"""
+import json
+from typing import Any, Callable, Optional, Union
+
+from stac_fastapi.caching import metrics
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+if orjson is not None:
+    from fastapi.responses import ORJSONResponse as _JSONResponse
+else:  # pragma: no cover
+    from fastapi.responses import JSONResponse as _JSONResponse
+
+__all__ = ["JSONResponse", "dumps", "loads"]
+
+
+class JSONResponse(_JSONResponse):
+    """JSON response encoded with the codec library."""
+
+    def render(self, content: Any) -> bytes:
+        """Encode the response body."""
+        with metrics.timer(metrics.SERIALIZER_SECONDS, "response"):
+            return super().render(content)
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """Decode a JSON document."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(
+    obj: Any, sort_keys: bool = False, default: Optional[Callable[[Any], Any]] = None
+) -> str:
+    """Encode a JSON document as a string."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(
+                obj, default=default, option=orjson.OPT_SORT_KEYS if sort_keys else 0
+            ).decode()
+        except TypeError:
+            # orjson rejects some documents the standard library accepts, like
+            # integers over 64 bits or non string keys
+            pass
+    return json.dumps(obj, sort_keys=sort_keys, default=default)
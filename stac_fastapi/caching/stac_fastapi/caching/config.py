@@ -9,6 +9,83 @@ from stac_fastapi.types.config import ApiSettings
 DOMAIN = os.getenv("38_HOST")
 PORT = os.getenv("38_PORT")
 
+# connections of a worker to tile38, seconds to wait for a free one, and retries
+# with exponential backoff of the commands sent on a failed connection
+TILE38_MAX_CONNECTIONS = int(os.getenv("TILE38_MAX_CONNECTIONS", 32))
+TILE38_POOL_TIMEOUT = float(os.getenv("TILE38_POOL_TIMEOUT", 10))
+TILE38_RETRIES = int(os.getenv("TILE38_RETRIES", 5))
+
+# comma separated host:port of the tile38 followers taking reads
+TILE38_FOLLOWERS = [
+    follower.strip()
+    for follower in os.getenv("TILE38_FOLLOWERS", "").split(",")
+    if follower.strip()
+]
+# seconds a follower that failed or lags behind is left out of the rotation
+TILE38_FOLLOWER_COOLDOWN = float(os.getenv("TILE38_FOLLOWER_COOLDOWN", 5))
+# seconds between the checks that each follower is caught up with the leader
+TILE38_FOLLOWER_CHECK_INTERVAL = float(os.getenv("TILE38_FOLLOWER_CHECK_INTERVAL", 1))
+# seconds the reads of a worker go to the leader after it wrote, so it reads
+# its own writes
+TILE38_LEADER_READS_AFTER_WRITE = float(os.getenv("TILE38_LEADER_READS_AFTER_WRITE", 1))
+
+# in-process cache of collection documents
+COLLECTION_CACHE_SIZE = int(os.getenv("COLLECTION_CACHE_SIZE", 1024))
+COLLECTION_CACHE_TTL = float(os.getenv("COLLECTION_CACHE_TTL", 60))
+
+# cache of the responses of the read endpoints, 0 disables it; responses are
+# shared by the workers through tile38 when RESPONSE_CACHE_SHARED is set
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 1024))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 10))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 1 << 20))
+RESPONSE_CACHE_SHARED = os.getenv("RESPONSE_CACHE_SHARED", "").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+# cache of the items of web mercator tiles, read by bbox searches: a search is
+# split in at most TILE_CACHE_MAX_TILES tiles of the deepest zoom level between
+# TILE_CACHE_MIN_ZOOM and TILE_CACHE_MAX_ZOOM, and tiles holding more than
+# TILE_CACHE_MAX_ITEMS items are searched in tile38 instead; 0 disables it
+TILE_CACHE_SIZE = int(os.getenv("TILE_CACHE_SIZE", 1024))
+TILE_CACHE_TTL = float(os.getenv("TILE_CACHE_TTL", 300))
+TILE_CACHE_MAX_ITEMS = int(os.getenv("TILE_CACHE_MAX_ITEMS", 2000))
+TILE_CACHE_MIN_ZOOM = int(os.getenv("TILE_CACHE_MIN_ZOOM", 6))
+TILE_CACHE_MAX_ZOOM = int(os.getenv("TILE_CACHE_MAX_ZOOM", 14))
+TILE_CACHE_MAX_TILES = int(os.getenv("TILE_CACHE_MAX_TILES", 16))
+
+# writes are announced to the other workers through a tile38 channel, so they
+# drop the cached collections and responses they changed
+CACHE_INVALIDATION_BUS = os.getenv("CACHE_INVALIDATION_BUS", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+# seconds the startup waits for the subscription to the channel, before the
+# app comes up with the caches of each worker invalidated by its own writes
+CACHE_INVALIDATION_START_TIMEOUT = float(
+    os.getenv("CACHE_INVALIDATION_START_TIMEOUT", 5)
+)
+
+# tolerances in degrees of the simplified geometries stored with the items,
+# which searches and item listings can return instead of the full geometries
+SIMPLIFY_TOLERANCES = sorted(
+    float(tolerance)
+    for tolerance in os.getenv("SIMPLIFY_TOLERANCES", "0.0001,0.001,0.01").split(",")
+    if tolerance.strip()
+)
+
+# items sent to tile38 per pipeline in a bulk insert
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", 1000))
+
+# pages of at least this many items are streamed, read STREAM_CHUNK_SIZE at a time
+STREAM_MIN_LIMIT = int(os.getenv("STREAM_MIN_LIMIT", 500))
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", 100))
+
+# items read per Tile38 SCAN by collection exports
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 1000))
+
 # def _tile38_config() -> Dict[str, Any]:
 #     config = {
 #         "domain": os.getenv("38_HOST"),
@@ -1,10 +1,9 @@
 """Item crud client."""
-import json
 import logging
-import time
+import zlib
 from datetime import datetime as datetime_type
 from datetime import timezone
-from typing import List, Optional, Type, Union
+from typing import Any, AsyncIterator, Dict, List, Optional, Type, Union
 from urllib.parse import urljoin
 
 import attr
@@ -15,11 +14,19 @@ from pydantic import ValidationError
 from stac_pydantic.links import Relations
 from stac_pydantic.shared import MimeTypes
 from starlette.requests import Request
+from starlette.responses import StreamingResponse
 
-from stac_fastapi.caching import serializers
-from stac_fastapi.caching.config import Tile38Settings
-from stac_fastapi.caching.database_logic import DatabaseLogic
-from stac_fastapi.caching.models.links import PagingLinks
+from stac_fastapi.caching import codec, metrics, serializers
+from stac_fastapi.caching.config import (
+    EXPORT_CHUNK_SIZE,
+    STREAM_CHUNK_SIZE,
+    STREAM_MIN_LIMIT,
+)
+from stac_fastapi.caching.database_logic import DatabaseLogic, PageStream
+from stac_fastapi.caching.datetime_utils import rfc3339_str_to_epoch
+from stac_fastapi.caching.extensions.simplify import SimplifyExtensionPostRequest
+from stac_fastapi.caching.models.links import PagingLinks, link_templates
+from stac_fastapi.caching.search_plan import SearchPlan
 from stac_fastapi.caching.serializers import CollectionSerializer, ItemSerializer
 from stac_fastapi.caching.session import Session
 from stac_fastapi.extensions.third_party.bulk_transactions import (
@@ -28,7 +35,6 @@ from stac_fastapi.extensions.third_party.bulk_transactions import (
 )
 from stac_fastapi.types import stac as stac_types
 from stac_fastapi.types.core import AsyncBaseCoreClient, AsyncBaseTransactionsClient
-from stac_fastapi.types.links import CollectionLinks
 from stac_fastapi.types.stac import Collection, Collections, Item, ItemCollection
 
 logger = logging.getLogger(__name__)
@@ -36,6 +42,11 @@ logger = logging.getLogger(__name__)
 NumType = Union[float, int]
 
 
+def _database(client) -> DatabaseLogic:
+    """Make the database logic of a client, on the connections of its session."""
+    return DatabaseLogic(session=client.session or Session.create_from_env())
+
+
 @attr.s
 class CoreClient(AsyncBaseCoreClient):
     """Client for core endpoints defined by stac."""
@@ -47,17 +58,23 @@ class CoreClient(AsyncBaseCoreClient):
     collection_serializer: Type[serializers.CollectionSerializer] = attr.ib(
         default=serializers.CollectionSerializer
     )
-    database = DatabaseLogic()
+    database: DatabaseLogic = attr.ib(
+        init=False, default=attr.Factory(_database, takes_self=True)
+    )
+    # pages of at least this many items are streamed
+    stream_min_limit: int = attr.ib(default=STREAM_MIN_LIMIT)
+    stream_chunk_size: int = attr.ib(default=STREAM_CHUNK_SIZE)
 
     @overrides
     async def all_collections(self, **kwargs) -> Collections:
         """Read all collections from the database."""
         base_url = str(kwargs["request"].base_url)
         collection_list = await self.database.get_all_collections()
-        collection_list = [
-            self.collection_serializer.db_to_stac(c, base_url=base_url)
-            for c in collection_list
-        ]
+        with metrics.timer(metrics.SERIALIZER_SECONDS, "collection"):
+            collection_list = [
+                self.collection_serializer.db_to_stac(c, base_url=base_url)
+                for c in collection_list
+            ]
 
         links = [
             {
@@ -84,7 +101,8 @@ class CoreClient(AsyncBaseCoreClient):
         """Get collection by id."""
         base_url = str(kwargs["request"].base_url)
         collection = await self.database.find_collection(collection_id=collection_id)
-        return self.collection_serializer.db_to_stac(collection, base_url)
+        with metrics.timer(metrics.SERIALIZER_SECONDS, "collection"):
+            return self.collection_serializer.db_to_stac(collection, base_url)
 
     @overrides
     async def item_collection(
@@ -93,14 +111,24 @@ class CoreClient(AsyncBaseCoreClient):
         """Read an item collection from the database."""
         request: Request = kwargs["request"]
         base_url = str(kwargs["request"].base_url)
+        geometry = self.geometry_options(request)
+
+        if limit >= self.stream_min_limit:
+            stream = await self.database.stream_item_collection(
+                collection_id=collection_id,
+                limit=limit,
+                token=token,
+                chunk_size=self.stream_chunk_size,
+            )
+            return await self.stream_response(
+                stream, request=request, limit=limit, **geometry
+            )
 
         items, maybe_count, next_token = await self.database.get_item_collection(
-            collection_id=collection_id
+            collection_id=collection_id, limit=limit, token=token
         )
 
-        items = [
-            self.item_serializer.db_to_stac(item, base_url=base_url) for item in items
-        ]
+        items = self.items_to_stac(items, base_url, **geometry)
 
         context_obj = None
         if self.extension_is_enabled("ContextExtension"):
@@ -122,6 +150,85 @@ class CoreClient(AsyncBaseCoreClient):
             context=context_obj,
         )
 
+    def geometry_options(self, request: Request) -> Dict[str, Any]:
+        """Get the `simplify` and `precision` query parameters of an item listing."""
+        if not self.extension_is_enabled("SimplifyExtension"):
+            return {}
+        params = {
+            name: request.query_params[name]
+            for name in ("simplify", "precision")
+            if name in request.query_params
+        }
+        try:
+            return SimplifyExtensionPostRequest(**params).dict(exclude_none=True)
+        except ValidationError:
+            raise HTTPException(status_code=400, detail="Invalid parameters provided")
+
+    def items_to_stac(
+        self,
+        items: List[Item],
+        base_url: str,
+        simplify: Optional[float] = None,
+        precision: Optional[int] = None,
+    ) -> List[Item]:
+        """Serialize a page of stored items."""
+        with metrics.timer(metrics.SERIALIZER_SECONDS, "item"):
+            return [
+                self.item_serializer.db_to_stac(
+                    item, base_url=base_url, simplify=simplify, precision=precision
+                )
+                for item in items
+            ]
+
+    async def stream_response(
+        self,
+        stream: PageStream,
+        request: Request,
+        limit: int,
+        simplify: Optional[float] = None,
+        precision: Optional[int] = None,
+    ) -> StreamingResponse:
+        """Stream a page of items as a FeatureCollection.
+
+        Features are encoded and sent one chunk at a time, followed by the
+        links and context, which are only known once the last chunk is read.
+        The first chunk is read beforehand so that errors like an invalid
+        token are still returned as error responses.
+        """
+        base_url = str(request.base_url)
+        chunks = stream.__aiter__()
+        try:
+            first_chunk = await chunks.__anext__()
+        except StopAsyncIteration:
+            first_chunk = None
+
+        async def body():
+            yield '{"type":"FeatureCollection","features":['
+            returned = 0
+            chunk = first_chunk
+            while chunk is not None:
+                features = self.items_to_stac(chunk, base_url, simplify, precision)
+                with metrics.timer(metrics.SERIALIZER_SECONDS, "response"):
+                    features = ",".join(codec.dumps(item) for item in features)
+                yield f",{features}" if returned else features
+                returned += len(chunk)
+                try:
+                    chunk = await chunks.__anext__()
+                except StopAsyncIteration:
+                    chunk = None
+
+            links = []
+            if stream.next_token:
+                links = await PagingLinks(
+                    request=request, next=stream.next_token
+                ).get_links()
+            context_obj = None
+            if self.extension_is_enabled("ContextExtension"):
+                context_obj = {"returned": returned, "limit": limit}
+            yield f"],{codec.dumps({'links': links, 'context': context_obj})[1:]}"
+
+        return StreamingResponse(body(), media_type=MimeTypes.geojson.value)
+
     @overrides
     async def get_item(self, item_id: str, collection_id: str, **kwargs) -> Item:
         """Get item by item id, collection id."""
@@ -129,31 +236,24 @@ class CoreClient(AsyncBaseCoreClient):
         item = await self.database.get_one_item(
             item_id=item_id, collection_id=collection_id
         )
-        return self.item_serializer.db_to_stac(item, base_url)
+        return self.items_to_stac([item], base_url)[0]
 
     @staticmethod
     def _return_date(interval_str):
+        """Convert a datetime or interval into epoch bounds, None if open-ended."""
         intervals = interval_str.split("/")
         if len(intervals) == 1:
-            datetime = intervals[0][0:19] + "Z"
-            return {"eq": datetime}
+            return {"eq": rfc3339_str_to_epoch(intervals[0])}
         else:
-            start_date = intervals[0]
-            end_date = intervals[1]
-            if ".." not in intervals:
-                start_date = start_date[0:19] + "Z"
-                end_date = end_date[0:19] + "Z"
-            elif start_date != "..":
-                start_date = start_date[0:19] + "Z"
-                end_date = "2200-12-01T12:31:12Z"
-            elif end_date != "..":
-                start_date = "1900-10-01T00:00:00Z"
-                end_date = end_date[0:19] + "Z"
-            else:
-                start_date = "1900-10-01T00:00:00Z"
-                end_date = "2200-12-01T12:31:12Z"
-
-            return {"lte": end_date, "gte": start_date}
+            start_date, end_date = intervals
+            return {
+                "gte": rfc3339_str_to_epoch(start_date)
+                if start_date not in ("..", "")
+                else None,
+                "lte": rfc3339_str_to_epoch(end_date)
+                if end_date not in ("..", "")
+                else None,
+            }
 
     @overrides
     async def get_search(
@@ -176,8 +276,11 @@ class CoreClient(AsyncBaseCoreClient):
             "bbox": bbox,
             "limit": limit,
             "token": token,
-            "query": json.loads(query) if query else query,
+            "query": codec.loads(query) if query else query,
         }
+        for name in ("simplify", "precision"):
+            if kwargs.get(name) is not None:
+                base_args[name] = kwargs[name]
         if datetime:
             base_args["datetime"] = datetime
         if sortby:
@@ -192,6 +295,19 @@ class CoreClient(AsyncBaseCoreClient):
                 )
             base_args["sortby"] = sort_param
 
+        nearby = kwargs.get("nearby")
+        if nearby:
+            try:
+                lon, lat, *distance = (float(v) for v in nearby.split(","))
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid nearby parameter")
+            if len(distance) > 1:
+                raise HTTPException(status_code=400, detail="Invalid nearby parameter")
+            base_args["nearby"] = {
+                "point": [lon, lat],
+                "distance": distance[0] if distance else None,
+            }
+
         # if fields:
         #     includes = set()
         #     excludes = set()
@@ -213,78 +329,94 @@ class CoreClient(AsyncBaseCoreClient):
 
         return resp
 
-    @overrides
-    async def post_search(
-        self, search_request: stac_pydantic.api.Search, **kwargs
-    ) -> ItemCollection:
-        """POST search catalog."""
-        request: Request = kwargs["request"]
-        base_url = str(request.base_url)
-        items = []
-        count = 0
-
-        if search_request.limit:
-            limit = search_request.limit
-        else:
-            limit = 10
+    def make_search(self, search_request: stac_pydantic.api.Search) -> SearchPlan:
+        """Plan a search from the filters of a search request."""
+        query = getattr(search_request, "query", None)
+        search = self.database.make_search()
 
         if search_request.ids:
-            items = await self.database.get_items(
-                item_ids=search_request.ids
+            search = self.database.apply_ids_filter(
+                search=search, item_ids=search_request.ids
+            )
+
+        if search_request.collections:
+            search = self.database.apply_collections_filter(
+                search=search, collection_ids=search_request.collections
             )
-            count = len(items)
 
-        # if search_request.datetime:
-        #     datetime_search = self._return_date(search_request.datetime)
-        #     search = self.database.apply_datetime_filter(
-        #         search=search, datetime_search=datetime_search
-        #     )
+        if search_request.datetime:
+            datetime_search = self._return_date(search_request.datetime)
+            search = self.database.apply_datetime_filter(
+                search=search, datetime_search=datetime_search
+            )
 
         if search_request.bbox:
             bbox = search_request.bbox
             if len(bbox) == 6:
                 bbox = [bbox[0], bbox[1], bbox[3], bbox[4]]
-            items, count = await self.database.apply_bbox_filter(
-                collection_id="test-collection", bbox=bbox, limit=limit
-            )
+            search = self.database.apply_bbox_filter(search=search, bbox=bbox)
 
         if search_request.intersects:
-            items, count = await self.database.apply_intersects_filter(
-                intersects=search_request.intersects, limit=limit
+            search = self.database.apply_intersects_filter(
+                search=search, intersects=search_request.intersects
             )
 
-        # if search_request.query:
-        #     for (field_name, expr) in search_request.query.items():
-        #         field = "properties__" + field_name
-        #         for (op, value) in expr.items():
-        #             search = self.database.apply_stacql_filter(
-        #                 search=search, op=op, field=field, value=value
-        #             )
+        nearby = getattr(search_request, "nearby", None)
+        if nearby:
+            search = self.database.apply_nearby_filter(
+                search=search, point=nearby.point, distance=nearby.distance
+            )
+
+        if query:
+            for (field_name, expr) in query.items():
+                for (op, value) in expr.items():
+                    search = self.database.apply_stacql_filter(
+                        search=search, op=op, field=field_name, value=value
+                    )
+
+        return search
+
+    @overrides
+    async def post_search(
+        self, search_request: stac_pydantic.api.Search, **kwargs
+    ) -> ItemCollection:
+        """POST search catalog."""
+        request: Request = kwargs["request"]
+        base_url = str(request.base_url)
+        token = getattr(search_request, "token", None)
+        geometry = {
+            "simplify": getattr(search_request, "simplify", None),
+            "precision": getattr(search_request, "precision", None),
+        }
+
+        if search_request.limit:
+            limit = search_request.limit
+        else:
+            limit = 10
+
+        with metrics.timer(metrics.SEARCH_STAGE_SECONDS, "plan"):
+            search = self.make_search(search_request)
 
         # sort = None
         # if search_request.sortby:
         #     sort = self.database.populate_sort(search_request.sortby)
 
-        if search_request.collections:
-            if len(items) > 0:
-                items_copy = items
-                items = []
-                count = 0
-                for item in items_copy:
-                    if item["collection"] in search_request.collections:
-                        items.append(item)
-                        count += 1
-            else:
-                items = []
-                for collection_id in search_request.collections:
-                    items_list, count, _ = await self.database.get_item_collection(
-                        collection_id=collection_id
-                    )
-                    items = items + items_list
+        if limit >= self.stream_min_limit:
+            stream = await self.database.stream_search(
+                search=search,
+                limit=limit,
+                token=token,
+                chunk_size=self.stream_chunk_size,
+            )
+            return await self.stream_response(
+                stream, request=request, limit=limit, **geometry
+            )
 
-        items = [
-            self.item_serializer.db_to_stac(item, base_url=base_url) for item in items
-        ]
+        items, count, next_token = await self.database.execute_search(
+            search=search, limit=limit, token=token
+        )
+
+        items = self.items_to_stac(items, base_url, **geometry)
 
         context_obj = None
         if self.extension_is_enabled("ContextExtension"):
@@ -296,8 +428,8 @@ class CoreClient(AsyncBaseCoreClient):
                 context_obj["matched"] = count
 
         links = []
-        # if next_token:
-        #     links = await PagingLinks(request=request, next=next_token).get_links()
+        if next_token:
+            links = await PagingLinks(request=request, next=next_token).get_links()
 
         return ItemCollection(
             type="FeatureCollection",
@@ -312,7 +444,9 @@ class TransactionsClient(AsyncBaseTransactionsClient):
     """Transactions extension specific CRUD operations."""
 
     session: Session = attr.ib(default=attr.Factory(Session.create_from_env))
-    database = DatabaseLogic()
+    database: DatabaseLogic = attr.ib(
+        init=False, default=attr.Factory(_database, takes_self=True)
+    )
 
     @overrides
     async def create_item(self, item: stac_types.Item, **kwargs) -> stac_types.Item:
@@ -321,13 +455,19 @@ class TransactionsClient(AsyncBaseTransactionsClient):
 
         # If a feature collection is posted
         if item["type"] == "FeatureCollection":
-            bulk_client = BulkTransactionsClient()
             processed_items = [
-                bulk_client.preprocess_item(item, base_url) for item in item["features"]  # type: ignore
+                await self.database.prep_create_item(item=feature, base_url=base_url)
+                for feature in item["features"]  # type: ignore
             ]
-            await self.database.bulk_async(
+            results = await self.database.bulk_async(
                 processed_items, refresh=kwargs.get("refresh", False)
             )
+            for result in results:
+                if result.error:
+                    logger.warning(
+                        f"Item {result.item_id} in collection {result.collection_id} "
+                        f"was not added: {result.error}"
+                    )
 
             return None  # type: ignore
         else:
@@ -342,11 +482,8 @@ class TransactionsClient(AsyncBaseTransactionsClient):
         now = datetime_type.now(timezone.utc).isoformat().replace("+00:00", "Z")
         item["properties"]["updated"] = str(now)
 
-        await self.database.check_collection_exists(collection_id=item["collection"])
-        # todo: index instead of delete and create
-        await self.delete_item(item_id=item["id"], collection_id=item["collection"])
-        time.sleep(1)
-        await self.create_item(item=item, **kwargs)
+        item = await self.database.prep_create_item(item=item, base_url=base_url)
+        await self.database.update_item(item, refresh=kwargs.get("refresh", False))
 
         return ItemSerializer.db_to_stac(item, base_url)
 
@@ -364,10 +501,9 @@ class TransactionsClient(AsyncBaseTransactionsClient):
     ) -> stac_types.Collection:
         """Create collection."""
         base_url = str(kwargs["request"].base_url)
-        collection_links = CollectionLinks(
-            collection_id=collection["id"], base_url=base_url
-        ).create_links()
-        collection["links"] = collection_links
+        collection["links"] = link_templates(base_url).collection_links(
+            collection["id"]
+        )
         await self.database.create_collection(collection=collection)
 
         return CollectionSerializer.db_to_stac(collection, base_url)
@@ -378,11 +514,10 @@ class TransactionsClient(AsyncBaseTransactionsClient):
     ) -> stac_types.Collection:
         """Update collection."""
         base_url = str(kwargs["request"].base_url)
-
-        await self.database.find_collection(collection_id=collection["id"])
-        await self.delete_collection(collection["id"])
-        time.sleep(1)
-        await self.create_collection(collection, **kwargs)
+        collection["links"] = link_templates(base_url).collection_links(
+            collection["id"]
+        )
+        await self.database.update_collection(collection=collection)
 
         return CollectionSerializer.db_to_stac(collection, base_url)
 
@@ -400,12 +535,9 @@ class BulkTransactionsClient(BaseBulkTransactionsClient):
     """Postgres bulk transactions."""
 
     session: Session = attr.ib(default=attr.Factory(Session.create_from_env))
-    database = DatabaseLogic()
-
-    def __attrs_post_init__(self):
-        """Create es engine."""
-        settings = Tile38Settings()
-        self.client = settings.create_client
+    database: DatabaseLogic = attr.ib(
+        init=False, default=attr.Factory(_database, takes_self=True)
+    )
 
     def preprocess_item(self, item: stac_types.Item, base_url) -> stac_types.Item:
         """Preprocess items to match data model."""
@@ -415,7 +547,7 @@ class BulkTransactionsClient(BaseBulkTransactionsClient):
     def bulk_item_insert(
         self, items: Items, chunk_size: Optional[int] = None, **kwargs
     ) -> str:
-        """Bulk item insertion using es."""
+        """Bulk item insertion using pipelined tile38 commands."""
         request = kwargs.get("request")
         if request:
             base_url = str(request.base_url)
@@ -426,6 +558,91 @@ class BulkTransactionsClient(BaseBulkTransactionsClient):
             self.preprocess_item(item, base_url) for item in items.items.values()
         ]
 
-        self.database.bulk_sync(processed_items, refresh=kwargs.get("refresh", False))
+        results = self.database.bulk_sync(
+            processed_items,
+            refresh=kwargs.get("refresh", False),
+            chunk_size=chunk_size,
+        )
+
+        failed = [result for result in results if result.error]
+        message = f"Successfully added {len(results) - len(failed)} Items."
+        if failed:
+            message += f" {len(failed)} Items failed: " + "; ".join(
+                f"{result.item_id} in collection {result.collection_id}: {result.error}"
+                for result in failed
+            )
+        return message
+
+
+@attr.s
+class ExportClient:
+    """Export of whole collections as newline delimited GeoJSON."""
+
+    session: Session = attr.ib(default=attr.Factory(Session.create_from_env))
+    item_serializer: Type[serializers.ItemSerializer] = attr.ib(
+        default=serializers.ItemSerializer
+    )
+    chunk_size: int = attr.ib(default=EXPORT_CHUNK_SIZE)
+    database: DatabaseLogic = attr.ib(
+        init=False, default=attr.Factory(_database, takes_self=True)
+    )
+
+    async def export_items(self, collection_id: str, **kwargs) -> StreamingResponse:
+        """Stream every item of a collection, one GeoJSON feature per line.
+
+        Items are read with a Tile38 SCAN cursor and sent a page at a time,
+        gzip compressed when the client accepts it.
+        """
+        request: Request = kwargs["request"]
+        base_url = str(request.base_url)
+        await self.database.find_collection(collection_id=collection_id)
+
+        async def lines():
+            async for items in self.database.iter_collection_items(
+                collection_id, chunk_size=self.chunk_size
+            ):
+                yield "".join(
+                    codec.dumps(self.item_serializer.db_to_stac(item, base_url)) + "\n"
+                    for item in items
+                ).encode()
+
+        headers = {"Vary": "Accept-Encoding"}
+        body = lines()
+        if accepts_encoding(request.headers.get("accept-encoding", ""), "gzip"):
+            headers["Content-Encoding"] = "gzip"
+            body = gzip_stream(body)
+        return StreamingResponse(
+            body, media_type="application/x-ndjson", headers=headers
+        )
+
 
-        return f"Successfully added {len(processed_items)} Items."
+def accepts_encoding(accept_encoding: str, encoding: str) -> bool:
+    """Test whether an Accept-Encoding header accepts a content coding.
+
+    The coding is accepted when it, or `*` if it is not listed, has a
+    non-zero q-value.
+    """
+    qvalues = {}
+    for coding in accept_encoding.split(","):
+        name, *params = (part.strip() for part in coding.split(";"))
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name:
+            qvalues[name.lower()] = q
+    return qvalues.get(encoding, qvalues.get("*", 0.0)) > 0
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Compress a stream of bytes into a gzip stream."""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -1,40 +1,152 @@
 """Database logic."""
-# import asyncio
-import json
+import asyncio
+import hashlib
 import logging
+from base64 import urlsafe_b64decode, urlsafe_b64encode
 
 # from http import client
-from typing import Any, Dict, List, Type, Union
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    Union,
+)
 
 import attr
 import pyle38
+import redis.asyncio as aioredis
+from geojson_pydantic.geometries import (
+    GeometryCollection,
+    LineString,
+    MultiLineString,
+    MultiPoint,
+    MultiPolygon,
+    Point,
+    Polygon,
+)
+from pyle38.parse_response import parse_response
+from redis.exceptions import ConnectionError, TimeoutError
 
-from stac_fastapi.caching import serializers
-from stac_fastapi.caching.config import AsyncTile38Settings
-from stac_fastapi.caching.config import Tile38Settings as SyncTile38Settings
-from stac_fastapi.types.errors import ConflictError, NotFoundError
+from stac_fastapi.caching import codec, metrics, serializers
+from stac_fastapi.caching.cache import TTLCache
+from stac_fastapi.caching.config import (
+    BULK_CHUNK_SIZE,
+    COLLECTION_CACHE_SIZE,
+    COLLECTION_CACHE_TTL,
+)
+from stac_fastapi.caching.datetime_utils import rfc3339_str_to_epoch
+from stac_fastapi.caching.extensions import Operator
+from stac_fastapi.caching.filters import (
+    WHERE_RANGES,
+    CompiledQuery,
+    compile_query,
+    datetime_predicate,
+)
+from stac_fastapi.caching.geometry import bbox_contains, bbox_overlaps, intersects_bbox
+from stac_fastapi.caching.invalidation import InvalidationBus
+from stac_fastapi.caching.response_cache import (
+    ALL_TAG,
+    COLLECTIONS_TAG,
+    ResponseCache,
+    collection_write_tags,
+    item_write_tags,
+    tag_collection_id,
+)
+from stac_fastapi.caching.search_plan import (
+    ACCESS_IDS,
+    ACCESS_INTERSECTS,
+    ACCESS_NEARBY,
+    SearchPlan,
+)
+from stac_fastapi.caching.session import Session
+from stac_fastapi.caching.simplify import SIMPLIFIED_KEY, simplified_geometries
+from stac_fastapi.caching.tile_cache import Tile, TileCache
+from stac_fastapi.types.errors import (
+    ConflictError,
+    InvalidQueryParameter,
+    NotFoundError,
+)
 from stac_fastapi.types.stac import Collection, Item
 
-# from base64 import urlsafe_b64decode, urlsafe_b64encode
+logger = logging.getLogger(__name__)
 
+NumType = Union[float, int]
 
-# from geojson_pydantic.geometries import (
-#     GeometryCollection,
-#     LineString,
-#     MultiLineString,
-#     MultiPoint,
-#     MultiPolygon,
-#     Point,
-#     Polygon,
-# )
+# single key that held every item before items were split per collection
+ITEMS_INDEX = "stac_items"
+ITEMS_KEY_PREFIX = "items:"
+COLLECTIONS_INDEX = "collections"
+# cache key of the list of every collection, distinct from any collection id
+ALL_COLLECTIONS = ("collections",)
+# item id -> {collection_id: true} documents, to find the collections of an id
+ITEM_COLLECTIONS_INDEX = "item_collections"
 
+# errors raised by pyle38 for a failed command, they share no base class
+TILE38_ERRORS = (
+    pyle38.errors.Tile38Error,
+    pyle38.errors.Tile38IdNotFoundError,
+    pyle38.errors.Tile38KeyNotFoundError,
+    pyle38.errors.Tile38NotCaughtUpError,
+    pyle38.errors.Tile38PathNotFoundError,
+)
 
-logger = logging.getLogger(__name__)
+# errors after which a read sent to a follower is sent to the leader instead
+FOLLOWER_ERRORS = (
+    ConnectionError,
+    TimeoutError,
+    pyle38.errors.Tile38NotCaughtUpError,
+)
+# replies of a follower still syncing with its leader, which pyle38 raises as
+# a plain Tile38Error unless they say "not caught up"
+FOLLOWER_SYNC_ERRORS = ("catching up to leader", "not caught up")
 
-NumType = Union[float, int]
 
-ITEMS_INDEX = "stac_items"
-COLLECTIONS_INDEX = "stac_collections"
+def is_follower_error(error: Exception) -> bool:
+    """Test whether a read failed because of the follower it was sent to.
+
+    Only a follower that has not caught up with its leader once since it
+    started replies with an error: later replication lag is found by
+    `Session.check_followers`.
+    """
+    if isinstance(error, FOLLOWER_ERRORS):
+        return True
+    return isinstance(error, pyle38.errors.Tile38Error) and any(
+        message in str(error) for message in FOLLOWER_SYNC_ERRORS
+    )
+
+
+# items read per Tile38 command when reading the items of a tile
+TILE_CHUNK_SIZE = 1000
+
+_MISSING = object()
+
+# commands sent per pipeline and pipelines in flight in a batched lookup
+PIPELINE_SIZE = 500
+MAX_CONCURRENT_PIPELINES = 4
+
+# numeric item properties stored as Tile38 FIELDS, mapped to their field names
+INDEXED_FIELDS = {
+    "datetime": "datetime",
+    "eo:cloud_cover": "eo_cloud_cover",
+    "gsd": "gsd",
+    "proj:epsg": "proj_epsg",
+}
+DATETIME_FIELDS = {"datetime"}
+# FIELDS of the datetime range of an item, or of its `datetime`: they don't
+# hold the properties of the same name, which queries post-filter
+START_DATETIME_FIELD = "start_datetime"
+END_DATETIME_FIELD = "end_datetime"
+# range of the items without one, which no datetime filter overlaps, rather
+# than the 0 Tile38 reads for a missing field: 1970-01-01 is in open ranges
+UNDATED_START = float(2**53)
+UNDATED_END = -UNDATED_START
 
 DEFAULT_SORT = {
     "properties.datetime": {"order": "desc"},
@@ -48,18 +160,177 @@ def bbox2polygon(b0, b1, b2, b3):
     return [[[b0, b1], [b2, b1], [b2, b3], [b0, b3], [b0, b1]]]
 
 
-def mk_item_id(item_id: str, collection_id: str):
-    """Make the Tile38 document _id value from the Item id and collection."""
-    return f"{item_id}|{collection_id}"
+def mk_items_key(collection_id: str):
+    """Make the Tile38 key holding the items of one collection."""
+    return f"{ITEMS_KEY_PREFIX}{collection_id}"
+
+
+# printable ASCII characters with a meaning in gjson paths, as escaped by
+# gjson's Escape: all but letters, digits, "_", "-" and ":"
+JSON_PATH_SPECIAL_CHARS = frozenset(
+    chr(c) for c in range(ord("!"), ord("~") + 1) if not chr(c).isalnum()
+) - set("_-:")
+
+
+def mk_json_path(name: str) -> str:
+    """Make a Tile38 JSON path matching one member named `name`."""
+    return "".join(
+        f"\\{char}" if char in JSON_PATH_SPECIAL_CHARS else char for char in name
+    )
+
+
+def parse_reply(response: Any) -> Dict:
+    """Decode the JSON reply to a Tile38 command with the codec.
+
+    Failed commands raise the matching pyle38 error.
+    """
+    try:
+        reply = codec.loads(response)
+    except (TypeError, ValueError):
+        reply = None
+    if not isinstance(reply, dict) or not reply.get("ok"):
+        return parse_response(response)
+    return reply
+
+
+def parse_pipeline_responses(responses: List[Any]) -> List[Union[Dict, Exception]]:
+    """Parse the replies to pipelined Tile38 commands.
+
+    The error of a failed command is returned in place of its reply.
+    """
+    parsed = []
+    for response in responses:
+        try:
+            parsed.append(parse_reply(response))
+        except TILE38_ERRORS as e:
+            parsed.append(e)
+    return parsed
+
+
+def mk_item_fields(item: Item, clear_missing: bool = False) -> Dict[str, NumType]:
+    """Make the Tile38 FIELDS of an item from its indexed properties.
+
+    Tile38 keeps the FIELDS a SET leaves out, so replacing an item needs
+    `clear_missing` to reset them to 0, the value Tile38 reads for no field.
+    """
+    fields = {}
+    properties = item.get("properties", {})
+    for name, field in INDEXED_FIELDS.items():
+        value = properties.get(name)
+        if value is None:
+            continue
+        if name in DATETIME_FIELDS:
+            value = rfc3339_str_to_epoch(value)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            fields[field] = value
+
+    # single-datetime items cover the range [datetime, datetime]
+    start = properties.get("start_datetime") or properties.get("datetime")
+    end = properties.get("end_datetime") or properties.get("datetime")
+    if start and end:
+        fields[START_DATETIME_FIELD] = rfc3339_str_to_epoch(start)
+        fields[END_DATETIME_FIELD] = rfc3339_str_to_epoch(end)
+    else:
+        fields[START_DATETIME_FIELD] = UNDATED_START
+        fields[END_DATETIME_FIELD] = UNDATED_END
+    if clear_missing:
+        for field in INDEXED_FIELDS.values():
+            fields.setdefault(field, 0)
+    return fields
+
+
+def mk_fingerprint(*query: Any) -> str:
+    """Make a short, stable fingerprint of the parameters of a query."""
+    query_json = codec.dumps(query, sort_keys=True, default=str)
+    return hashlib.sha1(query_json.encode()).hexdigest()[:16]
+
+
+def encode_token(fingerprint: str, key_index: int, cursor: int) -> str:
+    """Encode a Tile38 cursor into an opaque pagination token."""
+    token = codec.dumps({"q": fingerprint, "k": key_index, "c": cursor})
+    return urlsafe_b64encode(token.encode()).decode()
+
+
+def token_fingerprint(token: str) -> Optional[str]:
+    """Get the fingerprint of the query a pagination token was issued for."""
+    try:
+        return codec.loads(urlsafe_b64decode(token.encode())).get("q")
+    except Exception:
+        return None
+
+
+def decode_token(token: str, fingerprint: str) -> Tuple[int, int]:
+    """Decode a pagination token into a key index and a Tile38 cursor.
+
+    Tokens can only be used with the query they were issued for.
+    """
+    try:
+        decoded = codec.loads(urlsafe_b64decode(token.encode()))
+        key_index, cursor = int(decoded["k"]), int(decoded["c"])
+    except Exception:
+        raise InvalidQueryParameter(f"Invalid pagination token {token}")
+    if decoded.get("q") != fingerprint:
+        raise InvalidQueryParameter("Pagination token does not match the query")
+    return key_index, cursor
+
+
+@attr.s
+class ObjectArea:
+    """OBJECT area of a Tile38 search, for any GeoJSON geometry.
+
+    pyle38 only builds OBJECT areas of polygons.
+    """
+
+    geometry: Dict[str, Any] = attr.ib()
+
+    def get(self) -> List[str]:
+        """Get the arguments of the area."""
+        return ["OBJECT", codec.dumps(self.geometry)]
+
+
+@attr.s
+class BulkItemResult:
+    """Outcome of the insertion of one item in a bulk insert."""
+
+    item_id: str = attr.ib()
+    collection_id: str = attr.ib()
+    error: Optional[Exception] = attr.ib(default=None)
+
+
+@attr.s
+class PageStream:
+    """One page of items, read from Tile38 in chunks as the replies arrive.
+
+    Iterating the stream yields lists of items, and `next_token` is set once
+    the last one has been read.
+    """
+
+    chunks: Callable[["PageStream"], AsyncIterator[List[Dict[str, Any]]]] = attr.ib()
+    next_token: Optional[str] = attr.ib(default=None)
+
+    def __aiter__(self) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Read the chunks of the page."""
+        return self.chunks(self)
+
+    async def read(self) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Read the whole page and its next token."""
+        items = []
+        async for chunk in self:
+            items.extend(chunk)
+        return items, self.next_token
 
 
 @attr.s
 class DatabaseLogic:
     """Database logic."""
 
-    client = AsyncTile38Settings().create_client
-    sync_client = SyncTile38Settings().create_client
+    # collection id -> collection JSON, and ALL_COLLECTIONS -> [(id, JSON)]
+    collection_cache = TTLCache(maxsize=COLLECTION_CACHE_SIZE, ttl=COLLECTION_CACHE_TTL)
 
+    session: Session = attr.ib(factory=Session.create_from_env)
+    response_cache: ResponseCache = attr.ib(factory=ResponseCache.create_from_env)
+    invalidation_bus: InvalidationBus = attr.ib(factory=InvalidationBus.create_from_env)
+    tile_cache: TileCache = attr.ib(factory=TileCache.create_from_env)
     item_serializer: Type[serializers.ItemSerializer] = attr.ib(
         default=serializers.ItemSerializer
     )
@@ -67,44 +338,155 @@ class DatabaseLogic:
         default=serializers.CollectionSerializer
     )
 
+    @property
+    def client(self):
+        """Get the pyle38 client of the session."""
+        return self.session.client
+
+    @property
+    def pipeline_client(self):
+        """Get the redis client of the session."""
+        return self.session.pipeline_client
+
+    @property
+    def sync_pipeline_client(self):
+        """Get the synchronous redis client of the session."""
+        return self.session.sync_pipeline_client
+
     """CORE LOGIC"""
 
     async def get_all_collections(self) -> List[Dict[str, Any]]:
         """Database logic to retrieve a list of all collections."""
-        # https://github.com/stac-utils/stac-fastapi-elasticsearch/issues/65
-        # collections should be paginated, but at least return more than the default 10 for now
-        objects = await self.client.scan("collections").asObjects()
-        collections = []
-        for i in range(objects.count):
-            collection = json.loads(objects.objects[i].object)
-            collections.append(json.loads(collection["collection"]))
-        return collections
+        return [
+            codec.loads(collection)
+            for _, collection in await self._get_all_collections_json()
+        ]
 
     async def get_all_collection_ids(self) -> List[str]:
-        collections = await self.get_all_collections()
-        collection_ids = []
-        for collection in collections:
-            collection_ids.append(collection["id"])
-        return collection_ids
-
-    async def get_item_collection(self, collection_id: str) -> List[Dict[str, Any]]:
-        """Database logic to retrieve a list of all items in a collection."""
-        objects = await self.client.scan("stac_items").asObjects()
-        items = []
-        matched = objects.count
-        for i in range(matched):
-            # item = json.loads(objects.objects[i].object)
-            item = objects.objects[i].object
-            item = json.loads(item["item"])
-            if item["collection"] == collection_id:
-                items.append(item)
-        return items, len(items), None
+        """Database logic to retrieve the ids of all collections."""
+        return [id for id, _ in await self._get_all_collections_json()]
+
+    async def _get_all_collections_json(self) -> List[Tuple[str, str]]:
+        """Read the id and JSON of every collection, through the cache."""
+        collections = self.collection_cache.get(ALL_COLLECTIONS)
+        if collections is None:
+            # https://github.com/stac-utils/stac-fastapi-elasticsearch/issues/65
+            # collections should be paginated, but at least return more than the default 10 for now
+            reply = await self._command(["SCAN", [COLLECTIONS_INDEX]])
+            collections = [
+                (obj["id"], codec.loads(obj["object"])["collection"])
+                for obj in reply.get("objects", [])
+            ]
+            self.collection_cache.set(ALL_COLLECTIONS, collections)
+        return collections
+
+    def _page(
+        self,
+        keys: List[str],
+        command: Callable[[str], Any],
+        limit: int,
+        token: Optional[str],
+        fingerprint: str,
+        compiled_query: Optional[CompiledQuery] = None,
+        chunk_size: Optional[int] = None,
+    ) -> PageStream:
+        """Read one page of items from a SCAN or INTERSECTS over several keys.
+
+        The keys are walked in order with the Tile38 CURSOR/LIMIT options, so
+        a page only costs as much as the items it returns. Items failing the
+        post-filters of `compiled_query` are dropped and the next ones read.
+        With a `chunk_size`, no command reads more items than that.
+        """
+
+        async def chunks(stream: PageStream):
+            key_index, cursor = decode_token(token, fingerprint) if token else (0, 0)
+            returned = 0
+            while key_index < len(keys) and returned < limit:
+                count = limit - returned
+                if chunk_size:
+                    count = min(count, chunk_size)
+                reply = await self._command(
+                    command(keys[key_index])
+                    .cursor(cursor)
+                    .limit(count)
+                    .nofields()
+                    .compile(),
+                    read=True,
+                )
+                page = [obj["object"] for obj in reply.get("objects", [])]
+                if compiled_query:
+                    with metrics.timer(metrics.SEARCH_STAGE_SECONDS, "filter"):
+                        page = compiled_query.filter(page)
+                cursor = reply.get("cursor", 0)
+                if not cursor:
+                    key_index += 1
+                if page:
+                    returned += len(page)
+                    yield page
+
+            if key_index < len(keys):
+                stream.next_token = encode_token(fingerprint, key_index, cursor)
+
+        return PageStream(chunks)
+
+    async def get_item_collection(
+        self, collection_id: str, limit: int = 10, token: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[int], Optional[str]]:
+        """Database logic to retrieve a page of items in a collection."""
+        stream = await self.stream_item_collection(collection_id, limit, token)
+        with metrics.timer(metrics.SEARCH_STAGE_SECONDS, "read"):
+            items, next_token = await stream.read()
+        return items, None, next_token
+
+    async def stream_item_collection(
+        self,
+        collection_id: str,
+        limit: int = 10,
+        token: Optional[str] = None,
+        chunk_size: Optional[int] = None,
+    ) -> PageStream:
+        """Database logic to stream a page of items in a collection."""
+        return self._page(
+            keys=[mk_items_key(collection_id)],
+            command=self.client.scan,
+            limit=limit,
+            token=token,
+            fingerprint=mk_fingerprint("items", collection_id),
+            chunk_size=chunk_size,
+        )
+
+    async def iter_collection_items(
+        self, collection_id: str, chunk_size: int = 1000
+    ) -> AsyncIterator[List[Item]]:
+        """Read every item of a collection, one Tile38 SCAN page at a time.
+
+        Like any cursor, items written or deleted during the scan may be
+        missed or read twice.
+        """
+        key = mk_items_key(collection_id)
+        cursor = 0
+        while True:
+            reply = await self._command(
+                self.client.scan(key)
+                .cursor(cursor)
+                .limit(chunk_size)
+                .nofields()
+                .compile(),
+                read=True,
+            )
+            items = [obj["object"] for obj in reply.get("objects", [])]
+            if items:
+                yield items
+            cursor = reply.get("cursor", 0)
+            if not cursor:
+                break
 
     async def get_one_item(self, collection_id: str, item_id: str) -> Dict:
         """Database logic to retrieve a single item."""
-        db_id = mk_item_id(item_id=item_id, collection_id=collection_id)
         try:
-            response = await self.client.jget("stac_items", db_id)
+            reply = await self._command(
+                ["GET", [mk_items_key(collection_id), item_id]], read=True
+            )
         except pyle38.errors.Tile38IdNotFoundError:
             raise NotFoundError(
                 f"Item {item_id} does not exist in Collection {collection_id}"
@@ -113,156 +495,674 @@ class DatabaseLogic:
             raise NotFoundError(
                 f"Item {item_id} does not exist in Collection {collection_id}"
             )
-        response = json.loads(response.value)
-        item = json.loads(response["item"])
-        return item
-
-    async def get_collections(self, collection_ids: List[str]) -> Dict:
-        """Database logic to retrieve a list of collections."""
-        collections = []
-        for id in collection_ids:
-            collection = await self.client.jget("collections", id).asObject()
-            collection = json.loads(collection.object["collection"])
-            collections.append(collection)
+        return reply["object"]
 
-        return collections
+    async def _command(self, command: List[Any], read: bool = False) -> Dict:
+        """Send one compiled Tile38 command and decode its reply with the codec.
 
-    async def get_items(self, item_ids: List[str]) -> Dict:
-        """Database logic to retrieve a list of items."""
-        items = []
-        collection_ids = await self.get_all_collection_ids()
-        for collection_id in collection_ids:
-            for id in item_ids:
-                db_id = mk_item_id(item_id=id, collection_id=collection_id)
+        A `read` is sent to the next follower of the session, and to the
+        leader when there is none or the follower fails or lags behind.
+        """
+        name, args = command
+        if read:
+            follower = self.session.follower_client()
+            if follower is not None:
+                address, client = follower
                 try:
-                    item = await self.client.get("stac_items", db_id).asObject()
-                    item = json.loads(item.object["item"])
-                    items.append(item)
-                except Exception:
-                    pass
+                    return await self._send_command(client, name, args)
+                except Exception as e:
+                    if not is_follower_error(e):
+                        raise
+                    self.session.follower_failed(address, e)
+        return await self._send_command(self.pipeline_client, name, args)
+
+    @staticmethod
+    async def _send_command(client: aioredis.Redis, name: str, args: List[Any]) -> Dict:
+        with metrics.timer(metrics.TILE38_COMMAND_SECONDS, name.lower()):
+            response = await client.execute_command(name, *args)
+        with metrics.timer(metrics.SERIALIZER_SECONDS, "tile38_reply"):
+            return parse_reply(response)
+
+    async def _pipeline(
+        self, commands: List[List[Any]], read: bool = False
+    ) -> List[Optional[Dict]]:
+        """Send Tile38 commands in pipelined batches.
+
+        Batches of PIPELINE_SIZE commands are sent over at most
+        MAX_CONCURRENT_PIPELINES connections. The parsed responses are returned
+        in order, with None for the commands on a missing key, id or JSON path.
+        """
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_PIPELINES)
+
+        async def send(batch: List[List[Any]]) -> List[Optional[Dict]]:
+            async with semaphore:
+                responses = await self._execute_pipeline(batch, read=read)
+
+            parsed = []
+            for response in responses:
+                if isinstance(
+                    response,
+                    (
+                        pyle38.errors.Tile38IdNotFoundError,
+                        pyle38.errors.Tile38KeyNotFoundError,
+                        pyle38.errors.Tile38PathNotFoundError,
+                    ),
+                ):
+                    response = None
+                elif isinstance(response, Exception):
+                    raise response
+                parsed.append(response)
+            return parsed
+
+        batches = await asyncio.gather(
+            *(
+                send(commands[i : i + PIPELINE_SIZE])
+                for i in range(0, len(commands), PIPELINE_SIZE)
+            )
+        )
+        return [response for batch in batches for response in batch]
+
+    async def _execute_pipeline(
+        self, commands: List[List[Any]], read: bool = False
+    ) -> List[Union[Dict, Exception]]:
+        """Send Tile38 commands in one pipeline.
+
+        Like `_command`, a `read` pipeline goes to a follower when it can.
+        """
+        if read:
+            follower = self.session.follower_client()
+            if follower is not None:
+                address, client = follower
+                try:
+                    responses = await self._send_pipeline(client, commands)
+                    for response in responses:
+                        if isinstance(response, Exception) and is_follower_error(
+                            response
+                        ):
+                            raise response
+                    return responses
+                except Exception as e:
+                    if not is_follower_error(e):
+                        raise
+                    self.session.follower_failed(address, e)
+        return await self._send_pipeline(self.pipeline_client, commands)
+
+    @staticmethod
+    async def _send_pipeline(
+        client: aioredis.Redis, commands: List[List[Any]]
+    ) -> List[Union[Dict, Exception]]:
+        pipe = client.pipeline(transaction=False)
+        for command, args in commands:
+            pipe.execute_command(command, *args)
+        with metrics.timer(metrics.TILE38_COMMAND_SECONDS, "pipeline"):
+            responses = await pipe.execute()
+        with metrics.timer(metrics.SERIALIZER_SECONDS, "tile38_reply"):
+            return parse_pipeline_responses(responses)
+
+    def _sync_execute_pipeline(
+        self, commands: List[List[Any]]
+    ) -> List[Union[Dict, Exception]]:
+        """Send Tile38 commands in one pipeline from synchronous code."""
+        pipe = self.sync_pipeline_client.pipeline(transaction=False)
+        for command, args in commands:
+            pipe.execute_command(command, *args)
+        return parse_pipeline_responses(pipe.execute())
+
+    async def get_collections(self, collection_ids: List[str]) -> List[Collection]:
+        """Database logic to retrieve a list of collections.
+
+        Collections that don't exist are left out.
+        """
+        cached = {id: self.collection_cache.get(id) for id in collection_ids}
+        missing = [id for id, collection in cached.items() if collection is None]
+        responses = await self._pipeline(
+            [["JGET", [COLLECTIONS_INDEX, id]] for id in missing]
+        )
+        for id, response in zip(missing, responses):
+            if response:
+                cached[id] = codec.loads(response["value"])["collection"]
+                self.collection_cache.set(id, cached[id])
+
+        return [
+            codec.loads(cached[id]) for id in collection_ids if cached[id] is not None
+        ]
+
+    async def get_items(
+        self, item_ids: List[str], collection_ids: Optional[List[str]] = None
+    ) -> List[Item]:
+        """Database logic to retrieve a list of items by id.
+
+        The collections holding each id are read from the id->collection index
+        in one batch, then the items in a second one. Ids missing from the
+        index are looked up in every collection.
+        """
+        responses = await self._pipeline(
+            [["JGET", [ITEM_COLLECTIONS_INDEX, id]] for id in item_ids], read=True
+        )
+
+        all_collection_ids = collection_ids
+        lookups = []
+        for item_id, response in zip(item_ids, responses):
+            if response:
+                candidates = list(codec.loads(response["value"]))
+                if collection_ids:
+                    candidates = [c for c in candidates if c in collection_ids]
+            else:
+                if all_collection_ids is None:
+                    all_collection_ids = await self.get_all_collection_ids()
+                candidates = all_collection_ids
+            lookups.extend((collection_id, item_id) for collection_id in candidates)
+        return await self._get_items_at(lookups)
+
+    async def _get_items_at(self, lookups: List[Tuple[str, str]]) -> List[Item]:
+        """Read items by `(collection_id, item_id)`, leaving out missing ones."""
+        responses = await self._pipeline(
+            [
+                self.client.get(mk_items_key(collection_id), item_id)
+                .output("OBJECT")
+                .compile()
+                for collection_id, item_id in lookups
+            ],
+            read=True,
+        )
+        return [response["object"] for response in responses if response]
+
+    def _get_page(
+        self,
+        item_ids: List[Any],
+        fetch: Callable[[List[Any]], Awaitable[List[Item]]],
+        limit: int,
+        token: Optional[str],
+        fingerprint: str,
+        compiled_query: CompiledQuery,
+        chunk_size: Optional[int] = None,
+    ) -> PageStream:
+        """Read one page of items looked up by id with `fetch`.
+
+        The token holds the position of the next id to look up, and is only
+        issued while ids remain.
+        """
+
+        async def chunks(stream: PageStream):
+            offset, _ = decode_token(token, fingerprint) if token else (0, 0)
+            returned = 0
+            while offset < len(item_ids) and returned < limit:
+                count = limit - returned
+                if chunk_size:
+                    count = min(count, chunk_size)
+                page_ids = item_ids[offset : offset + count]
+                offset += len(page_ids)
+                page = compiled_query.filter(await fetch(page_ids))
+                if page:
+                    returned += len(page)
+                    yield page
+
+            if offset < len(item_ids):
+                stream.next_token = encode_token(fingerprint, offset, 0)
+
+        return PageStream(chunks)
+
+    async def execute_search(
+        self, search: SearchPlan, limit: int, token: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[int], Optional[str]]:
+        """Database logic to execute a search plan."""
+        if search.empty:
+            return [], 0, None
+        stream = await self.stream_search(search, limit, token)
+        with metrics.timer(metrics.SEARCH_STAGE_SECONDS, "read"):
+            items, next_token = await stream.read()
+        return items, None, next_token
+
+    async def stream_search(
+        self,
+        search: SearchPlan,
+        limit: int,
+        token: Optional[str] = None,
+        chunk_size: Optional[int] = None,
+    ) -> PageStream:
+        """Database logic to stream the results of a search plan.
+
+        Every collection key is read with one Tile38 command carrying all the
+        filters Tile38 can evaluate. The remaining predicates are applied to
+        each chunk as it is read.
+        """
+        if search.empty:
+            # no key to read
+            return self._page(
+                keys=[],
+                command=self.client.scan,
+                limit=limit,
+                token=None,
+                fingerprint="",
+            )
+
+        if search.access_path == ACCESS_IDS:
+            with metrics.timer(metrics.SEARCH_STAGE_SECONDS, "compile"):
+                compiled_query = compile_query(search.query)
+                if search.datetime_search:
+                    compiled_query.post_filters.append(
+                        datetime_predicate(search.datetime_search)
+                    )
+            return self._get_page(
+                item_ids=search.ids,
+                fetch=lambda ids: self.get_items(ids, search.collection_ids),
+                limit=limit,
+                token=token,
+                fingerprint=mk_fingerprint("search", search.fingerprint_args()),
+                compiled_query=compiled_query,
+                chunk_size=chunk_size,
+            )
+
+        collection_ids = search.collection_ids
+        if not collection_ids:
+            collection_ids = await self.get_all_collection_ids()
+        if search.access_path == ACCESS_NEARBY:
+            return self._stream_nearby(search, collection_ids, limit, token)
+
+        with metrics.timer(metrics.SEARCH_STAGE_SECONDS, "compile"):
+            compiled_query = self.compile_query(search.query)
+
+        # filters Tile38 evaluates with WHERE clauses would be post-filters
+        # over every item of the tiles
+        if (
+            search.bbox
+            and search.access_path == ACCESS_INTERSECTS
+            and not search.datetime_search
+            and not compiled_query.where
+        ):
+            tiles = self.tile_cache.cover(search.bbox)
+            if tiles is not None:
+                stream = await self._stream_tiles(
+                    search, tiles, collection_ids, limit, token, chunk_size
+                )
+                if stream is not None:
+                    return stream
+
+        fingerprint = mk_fingerprint(
+            "search", collection_ids, search.fingerprint_args()
+        )
+
+        with metrics.timer(metrics.SEARCH_STAGE_SECONDS, "compile"):
+            if search.ids:
+                item_ids = set(search.ids)
+                compiled_query.post_filters.append(lambda item: item["id"] in item_ids)
+
+        def command(key: str):
+            if search.access_path == ACCESS_INTERSECTS:
+                command = self.client.intersects(key)
+                command._query = ObjectArea(search.geometry)
+            else:
+                command = self.client.scan(key)
+            command = self._where_datetime(command, search.datetime_search)
+            return self._where_query(command, compiled_query)
+
+        return self._page(
+            keys=[mk_items_key(collection_id) for collection_id in collection_ids],
+            command=command,
+            limit=limit,
+            token=token,
+            fingerprint=fingerprint,
+            compiled_query=compiled_query,
+            chunk_size=chunk_size,
+        )
+
+    def _stream_nearby(
+        self,
+        search: SearchPlan,
+        collection_ids: List[str],
+        limit: int,
+        token: Optional[str],
+    ) -> PageStream:
+        """Stream the results of a search of the items closest to a point.
+
+        A bbox is checked exactly on the items Tile38 returns, other
+        geometries can't be combined with a nearby search.
+        """
+        if search.geometry and not search.bbox:
+            raise InvalidQueryParameter("nearby can't be combined with intersects")
+        nearby = search.nearby
+        fingerprint = mk_fingerprint(
+            "nearby", collection_ids, search.fingerprint_args()
+        )
+
+        with metrics.timer(metrics.SEARCH_STAGE_SECONDS, "compile"):
+            compiled_query = self.compile_query(search.query)
+            if search.ids:
+                item_ids = set(search.ids)
+                compiled_query.post_filters.append(lambda item: item["id"] in item_ids)
+            if search.bbox:
+                bbox = search.bbox
+                compiled_query.post_filters.append(
+                    lambda item: intersects_bbox(item["geometry"], bbox)
+                )
+
+        def command(key: str):
+            command = self.client.nearby(key).point(
+                nearby["lat"], nearby["lon"], nearby["distance"]
+            )
+            command = self._where_datetime(command, search.datetime_search)
+            return self._where_query(command, compiled_query)
+
+        return self._nearby_page(
+            keys=[mk_items_key(collection_id) for collection_id in collection_ids],
+            command=command,
+            limit=limit,
+            token=token,
+            fingerprint=fingerprint,
+            compiled_query=compiled_query,
+        )
+
+    def _nearby_page(
+        self,
+        keys: List[str],
+        command: Callable[[str], Any],
+        limit: int,
+        token: Optional[str],
+        fingerprint: str,
+        compiled_query: CompiledQuery,
+    ) -> PageStream:
+        """Read one page of the items closest to a point, over several keys.
+
+        Tile38 NEARBY returns the items of a key by distance. The first
+        `offset + limit` items of every key are read and merged by distance,
+        and read again twice as many while post-filters leave the page short.
+        The token holds the offset of the next page.
+        """
+
+        async def chunks(stream: PageStream):
+            offset, _ = decode_token(token, fingerprint) if token else (0, 0)
+            wanted = offset + limit
+            count = wanted
+            while True:
+                replies = await asyncio.gather(
+                    *(
+                        self._command(
+                            command(key).distance().limit(count).nofields().compile(),
+                            read=True,
+                        )
+                        for key in keys
+                    )
+                )
+                nearest = sorted(
+                    (
+                        (obj.get("distance", 0), index, obj["object"])
+                        for reply in replies
+                        for index, obj in enumerate(reply.get("objects", []))
+                    ),
+                    key=lambda candidate: candidate[:2],
+                )
+                with metrics.timer(metrics.SEARCH_STAGE_SECONDS, "filter"):
+                    items = compiled_query.filter([obj for _, _, obj in nearest])
+                exhausted = not any(reply.get("cursor") for reply in replies)
+                if len(items) >= wanted or exhausted:
+                    break
+                count *= 2
+
+            page = items[offset:wanted]
+            if page:
+                yield page
+            if len(items) > wanted or (len(items) == wanted and not exhausted):
+                stream.next_token = encode_token(fingerprint, wanted, 0)
+
+        return PageStream(chunks)
+
+    async def _stream_tiles(
+        self,
+        search: SearchPlan,
+        tiles: List[Tile],
+        collection_ids: List[str],
+        limit: int,
+        token: Optional[str],
+        chunk_size: Optional[int],
+    ) -> Optional[PageStream]:
+        """Stream the results of a bbox search from the items of its tiles.
+
+        The items whose bounds overlap the bbox are read by id, in order,
+        and the other filters applied to them. Searches with filters Tile38
+        evaluates in WHERE clauses don't read tiles. Returns None, to search
+        Tile38 instead, when a tile holds too many items to be cached,
+        unless the token continues a search answered from the tiles.
+        """
+        fingerprint = mk_fingerprint("tiles", collection_ids, search.fingerprint_args())
+        if token is not None and token_fingerprint(token) != fingerprint:
+            return None
+        bbox = search.bbox
+        candidates = await self._tile_candidates(
+            collection_ids, bbox, tiles, read_all=token is not None
+        )
+        if candidates is None:
+            return None
+        lookups, unsure = candidates
+
+        with metrics.timer(metrics.SEARCH_STAGE_SECONDS, "compile"):
+            compiled_query = compile_query(search.query)
+            if search.ids:
+                item_ids = set(search.ids)
+                compiled_query.post_filters.append(lambda item: item["id"] in item_ids)
+            # items whose bounds are not inside the bbox may still miss it
+            compiled_query.post_filters.append(
+                lambda item: (item["collection"], item["id"]) not in unsure
+                or intersects_bbox(item["geometry"], bbox)
+            )
 
-        return items
+        return self._get_page(
+            item_ids=lookups,
+            fetch=self._get_items_at,
+            limit=limit,
+            token=token,
+            fingerprint=fingerprint,
+            compiled_query=compiled_query,
+            chunk_size=chunk_size,
+        )
+
+    async def _tile_candidates(
+        self,
+        collection_ids: List[str],
+        bbox: List[float],
+        tiles: List[Tile],
+        read_all: bool = False,
+    ) -> Optional[Tuple[List[Tuple[str, str]], Set[Tuple[str, str]]]]:
+        """Find the items whose bounds overlap a bbox in the tiles covering it.
+
+        Returns their `(collection_id, item_id)` in order, and those whose
+        bounds are not inside the bbox. Tiles missing from the cache are read
+        concurrently. A tile holding too many items to be cached makes it
+        return None, unless `read_all` is set: it is then read whole.
+        """
+        keys = {
+            (collection_id, tile): self.tile_cache.key(collection_id, tile)
+            for collection_id in collection_ids
+            for tile in tiles
+        }
+        entries = {}
+        missing = []
+        for tile_key, key in keys.items():
+            cached = self.tile_cache.get(key, _MISSING)
+            if cached is _MISSING:
+                missing.append(tile_key)
+            else:
+                entries[tile_key] = cached
+        metrics.count(metrics.TILE_CACHE_TILES, "hit", len(entries))
+        metrics.count(metrics.TILE_CACHE_TILES, "miss", len(missing))
+        read = await asyncio.gather(
+            *(
+                self._read_tile(collection_id, tile, self.tile_cache.max_items)
+                for collection_id, tile in missing
+            )
+        )
+        for tile_key, tile_entries in zip(missing, read):
+            self.tile_cache.set(keys[tile_key], tile_entries)
+            entries[tile_key] = tile_entries
+
+        too_big = [tile_key for tile_key, e in entries.items() if e is None]
+        metrics.count(metrics.TILE_CACHE_TILES, "too_big", len(too_big))
+        if too_big and not read_all:
+            return None
+        for tile_key in too_big:
+            entries[tile_key] = await self._read_tile(*tile_key)
+
+        lookups = []
+        unsure = set()
+        for collection_id in collection_ids:
+            overlapping = set()
+            for tile in tiles:
+                for item_id, bounds in entries[(collection_id, tile)]:
+                    if bbox_overlaps(bounds, bbox):
+                        overlapping.add(item_id)
+                        if not bbox_contains(bbox, bounds):
+                            unsure.add((collection_id, item_id))
+            lookups.extend((collection_id, id) for id in sorted(overlapping))
+        return lookups, unsure
+
+    async def _read_tile(
+        self, collection_id: str, tile: Tile, max_items: Optional[int] = None
+    ) -> Optional[List[Tuple[str, List[float]]]]:
+        """Read the ids and bounds of the items of a tile of a collection.
+
+        Returns None when the tile holds more than `max_items` items.
+        """
+        x, y, zoom = tile
+        entries = []
+        cursor = 0
+        while True:
+            reply = await self._command(
+                self.client.intersects(mk_items_key(collection_id))
+                .cursor(cursor)
+                .limit(TILE_CHUNK_SIZE)
+                .nofields()
+                .output("BOUNDS")
+                .tile(x, y, zoom)
+                .compile(),
+                read=True,
+            )
+            for obj in reply.get("bounds", []):
+                sw, ne = obj["bounds"]["sw"], obj["bounds"]["ne"]
+                entries.append(
+                    (obj["id"], [sw["lon"], sw["lat"], ne["lon"], ne["lat"]])
+                )
+            if max_items is not None and len(entries) > max_items:
+                return None
+            cursor = reply.get("cursor", 0)
+            if not cursor:
+                return entries
 
     @staticmethod
-    def make_search():
+    def make_search() -> SearchPlan:
         """Database logic to create a Search instance."""
-        pass
-        # return Search().sort(*DEFAULT_SORT)
+        return SearchPlan()
 
-    # @staticmethod
-    # def apply_ids_filter(search: Search, item_ids: List[str]):
-    #     """Database logic to search a list of STAC item ids."""
-    #     return search.filter("terms", id=item_ids)
+    @staticmethod
+    def apply_ids_filter(search: SearchPlan, item_ids: List[str]) -> SearchPlan:
+        """Database logic to search a list of STAC item ids."""
+        search.ids = list(item_ids)
+        return search
 
     @staticmethod
-    def apply_collections_filter(search: dict, collection_ids: List[str]):
+    def apply_collections_filter(
+        search: SearchPlan, collection_ids: List[str]
+    ) -> SearchPlan:
         """Database logic to search a list of STAC collection ids."""
-        pass
-        # return search.filter("terms", collection=collection_ids)
+        search.collection_ids = list(collection_ids)
+        return search
 
-    # @staticmethod
-    # def apply_datetime_filter(search: Search, datetime_search):
-    #     """Database logic to search datetime field."""
-    #     if "eq" in datetime_search:
-    #         search = search.filter(
-    #             "term", **{"properties__datetime": datetime_search["eq"]}
-    #         )
-    #     else:
-    #         search = search.filter(
-    #             "range", properties__datetime={"lte": datetime_search["lte"]}
-    #         )
-    #         search = search.filter(
-    #             "range", properties__datetime={"gte": datetime_search["gte"]}
-    #         )
-    #     return search
+    @staticmethod
+    def apply_datetime_filter(
+        search: SearchPlan, datetime_search: Optional[Dict]
+    ) -> SearchPlan:
+        """Database logic to search datetime field.
 
-    # @staticmethod
-    async def apply_bbox_filter(self, collection_id: str, bbox: List, limit: int):
-        # def apply_bbox_filter(search: Search, bbox: List):
+        Items match when their [start_datetime, end_datetime] range overlaps
+        the searched interval; open ends of the interval are None.
+        """
+        search.datetime_search = datetime_search
+        return search
+
+    @staticmethod
+    def apply_bbox_filter(search: SearchPlan, bbox: List) -> SearchPlan:
         """Database logic to search on bounding box."""
-        # objects = await self.client.intersects("test").bounds(bbox[0],bbox[1],bbox[2],bbox[3]).asObjects()
-        geom = {
+        search.geometry = {
             "type": "Polygon",
             "coordinates": bbox2polygon(bbox[0], bbox[1], bbox[2], bbox[3]),
         }
-        objects = (
-            await self.client.intersects("stac_items")
-            .object(geom)
-            .limit(limit)
-            .asObjects()
-        )
-        count = objects.count
-        items = []
-        if count < limit:
-            limit = count
-        for i in range(limit):
-            item_result = objects.objects[i].object
-            item_result["id"] = objects.objects[i].id
-            items.append(json.loads(item_result["item"]))
+        search.bbox = [float(value) for value in bbox[:4]]
+        return search
 
-        return items, count
+    @staticmethod
+    def apply_intersects_filter(
+        search: SearchPlan,
+        intersects: Union[
+            Point,
+            MultiPoint,
+            LineString,
+            MultiLineString,
+            Polygon,
+            MultiPolygon,
+            GeometryCollection,
+        ],
+    ) -> SearchPlan:
+        """Database logic to search a geojson object.
 
-    # @staticmethod
-    async def apply_intersects_filter(self, intersects: dict, limit: int):
-        #     self,
-        #     search: dict
-        #     intersects: Union[
-        #         Point,
-        #         MultiPoint,
-        #         LineString,
-        #         MultiLineString,
-        #         Polygon,
-        #         MultiPolygon,
-        #         GeometryCollection,
-        #     ],
-        # ):
-        """Database logic to search a geojson object."""
-        items = []
-        if intersects.type == "Point":
-            new_intersects = {}
-            point = intersects.coordinates
-            new_intersects["type"] = "Polygon"
-            new_intersects["coordinates"] = bbox2polygon(
-                float(point[0]),
-                float(point[1]),
-                float(point[0]) + 0.001,
-                float(point[1]) + 0.001,
-            )
-            objects = (
-                await self.client.intersects("stac_items")
-                .object(new_intersects)
-                .limit(limit)
-                .asObjects()
-            )
-        elif intersects.type == "Polygon":
-            objects = (
-                await self.client.intersects("stac_items")
-                .object(intersects)
-                .limit(limit)
-                .asObjects()
-            )
-        else:
-            return items, 0
-        count = objects.count
-        if count < limit:
-            limit = count
-        for i in range(limit):
-            item_result = objects.objects[i].object
-            item_result["id"] = objects.objects[i].id
-            items.append(json.loads(item_result["item"]))
+        Tile38 tests every geometry type, including the parts of multi-part
+        geometries and collections, in a single INTERSECTS ... OBJECT.
+        """
+        search.bbox = None
+        search.geometry = intersects.dict(exclude_none=True)
+        return search
 
-        return items, count
+    @staticmethod
+    def apply_nearby_filter(
+        search: SearchPlan, point: Tuple[float, float], distance: Optional[float]
+    ) -> SearchPlan:
+        """Database logic to search the items closest to a `[lon, lat]` point.
 
-    # @staticmethod
-    # def apply_stacql_filter(search: Search, op: str, field: str, value: float):
-    #     """Database logic to perform query for search endpoint."""
-    #     if op != "eq":
-    #         key_filter = {field: {f"{op}": value}}
-    #         search = search.filter(Q("range", **key_filter))
-    #     else:
-    #         search = search.filter("term", **{field: value})
+        Only items within `distance` meters are returned when it is given.
+        """
+        lon, lat = point
+        search.nearby = {"lon": lon, "lat": lat, "distance": distance}
+        return search
 
-    #     return search
+    @staticmethod
+    def apply_stacql_filter(
+        search: SearchPlan, op: str, field: str, value: Any
+    ) -> SearchPlan:
+        """Database logic to perform query for search endpoint."""
+        search.query.setdefault(field, {})[op] = value
+        return search
+
+    @staticmethod
+    def compile_query(query: Optional[Dict]) -> CompiledQuery:
+        """Split a query into WHERE clauses on indexed FIELDS and post-filters."""
+        return compile_query(query, INDEXED_FIELDS, DATETIME_FIELDS)
+
+    @staticmethod
+    def _where_datetime(command, datetime_search: Optional[Dict]):
+        """Add the WHERE clauses of a datetime filter to a Tile38 command.
+
+        Open ends of the filter leave out the undated items.
+        """
+        if not datetime_search:
+            return command
+        if "eq" in datetime_search:
+            gte = lte = datetime_search["eq"]
+        else:
+            gte, lte = datetime_search["gte"], datetime_search["lte"]
+        if lte is None:
+            lte = UNDATED_START - 1
+        if gte is None:
+            gte = UNDATED_END + 1
+        command = command.where(START_DATETIME_FIELD, "-inf", lte)
+        return command.where(END_DATETIME_FIELD, gte, "+inf")
+
+    @staticmethod
+    def _where_query(command, compiled_query: CompiledQuery):
+        """Add the WHERE clauses of a compiled query to a Tile38 command."""
+        for op, field, value in compiled_query.where:
+            if op == Operator.in_:
+                # pyle38 has no builder for WHEREIN
+                command._where.append(["WHEREIN", field, len(value), *value])
+            else:
+                command = command.where(field, *WHERE_RANGES[op](value))
+        return command
 
     # @staticmethod
     # def populate_sort(sortby: List) -> Optional[Dict[str, Dict[str, str]]]:
@@ -276,141 +1176,428 @@ class DatabaseLogic:
 
     async def check_collection_exists(self, collection_id: str):
         """Database logic to check if a collection exists."""
+        if collection_id in self.collection_cache:
+            return
         try:
-            await self.client.jget("collections", collection_id)
-        except pyle38.errors.Tile38IdNotFoundError:
-            raise NotFoundError(f"Collection {collection_id} does not exist")
-        except pyle38.errors.Tile38KeyNotFoundError:
+            await self.find_collection(collection_id)
+        except NotFoundError:
             raise NotFoundError(f"Collection {collection_id} does not exist")
 
     async def prep_create_item(self, item: Item, base_url: str) -> Item:
         """Database logic for prepping an item for insertion."""
         await self.check_collection_exists(collection_id=item["collection"])
 
-        db_id = mk_item_id(item_id=item["id"], collection_id=item["collection"])
-
-        try:
-            await self.client.jget("stac_items", db_id)
-            raise ConflictError(
-                f"Item {item['id']} in collection {item['collection']} already exists"
-            )
-        except pyle38.errors.Tile38IdNotFoundError:
-            pass
-        except pyle38.errors.Tile38KeyNotFoundError:
-            pass
-
         return self.item_serializer.stac_to_db(item, base_url)
 
     def sync_prep_create_item(self, item: Item, base_url: str) -> Item:
         """Database logic for prepping an item for insertion."""
-        pass
+        collection_id = item["collection"]
+        if collection_id not in self.collection_cache:
+            [response] = self._sync_execute_pipeline(
+                [["JGET", [COLLECTIONS_INDEX, collection_id]]]
+            )
+            if isinstance(response, Exception):
+                if isinstance(
+                    response,
+                    (
+                        pyle38.errors.Tile38IdNotFoundError,
+                        pyle38.errors.Tile38KeyNotFoundError,
+                    ),
+                ):
+                    raise NotFoundError(f"Collection {collection_id} does not exist")
+                raise response
+            self.collection_cache.set(
+                collection_id, codec.loads(response["value"])["collection"]
+            )
+
+        return self.item_serializer.stac_to_db(item, base_url)
 
-    # collection_id = item["collection"]
-    # if not self.sync_client.exists(index=COLLECTIONS_INDEX, id=collection_id):
-    #     raise NotFoundError(f"Collection {collection_id} does not exist")
+    async def create_item(self, item: Item, refresh: bool = False):
+        """Database logic for creating one item.
 
-    #     if self.sync_client.exists(
-    #         index=ITEMS_INDEX, id=mk_item_id(item["id"], item["collection"])
-    #     ):
-    #         raise ConflictError(
-    #             f"Item {item['id']} in collection {item['collection']} already exists"
-    #         )
+        The SET NX of the item, its index entry and the invalidation of the
+        caches are sent in one pipeline. The index entry is deleted again
+        when the item could not be stored, and the item when it could not be
+        indexed.
+        """
+        tags = item_write_tags(item["collection"], item["id"])
+        created, indexed, *invalidated = await self._execute_pipeline(
+            [
+                self._set_item_command(item, "NX"),
+                self._index_item_command(item),
+                *self._invalidation_commands(*tags),
+            ]
+        )
+        if isinstance(created, Exception):
+            if "already exists" in str(created):
+                raise ConflictError(
+                    f"Item {item['id']} in collection {item['collection']} already exists"
+                )
+            await self._pipeline(
+                [self._unindex_item_command(item["id"], item["collection"])]
+            )
+            raise created
+        if isinstance(indexed, Exception):
+            await self._command(["DEL", [mk_items_key(item["collection"]), item["id"]]])
+            raise indexed
+        self._evict(*tags)
+        for response in invalidated:
+            if isinstance(response, Exception):
+                raise response
 
-    #     return self.item_serializer.stac_to_db(item, base_url)
+    @staticmethod
+    def _set_item_command(
+        item: Item, condition: Optional[str] = None, clear_missing: bool = False
+    ) -> List[Any]:
+        """Make the SET command storing an item as a GeoJSON object with FIELDS.
 
-    async def create_item(self, item: Item, refresh: bool = False):
-        """Database logic for creating one item."""
-        # todo: check if collection exists, but cache
-        db_id = mk_item_id(item_id=item["id"], collection_id=item["collection"])
+        `condition` is NX to only create the item or XX to only replace it.
+        The simplified geometries of the item are stored with it.
+        """
+        args = [mk_items_key(item["collection"]), item["id"]]
+        for field, value in mk_item_fields(item, clear_missing).items():
+            args.extend(["FIELD", field, value])
+        if condition:
+            args.append(condition)
+        item = {**item, SIMPLIFIED_KEY: simplified_geometries(item.get("geometry"))}
+        args.extend(["OBJECT", codec.dumps(item)])
+        return ["SET", args]
 
+    async def update_item(self, item: Item, refresh: bool = False):
+        """Database logic for replacing one item in a single SET XX."""
         try:
-            await self.client.jget("stac_items", db_id)
-            raise ConflictError(
-                f"Item {item['id']} in collection {item['collection']} already exists"
+            await self._command(self._set_item_command(item, "XX", clear_missing=True))
+        except (
+            pyle38.errors.Tile38IdNotFoundError,
+            pyle38.errors.Tile38KeyNotFoundError,
+        ):
+            raise NotFoundError(
+                f"Item {item['id']} in collection {item['collection']} not found"
             )
-        except pyle38.errors.Tile38IdNotFoundError:
-            pass
-        except pyle38.errors.Tile38KeyNotFoundError:
-            pass
+        await self._invalidate(*item_write_tags(item["collection"], item["id"]))
+
+    @staticmethod
+    def _index_item_command(item: Item) -> List[Any]:
+        """Make the JSET command adding an item to the id->collection index."""
+        return [
+            "JSET",
+            [
+                ITEM_COLLECTIONS_INDEX,
+                item["id"],
+                mk_json_path(item["collection"]),
+                "true",
+                "RAW",
+            ],
+        ]
 
-        await self.client.set("stac_items", db_id).object(item["geometry"]).exec()
-        await self.client.jset("stac_items", db_id, "item", json.dumps(item))
+    @staticmethod
+    def _unindex_item_command(item_id: str, collection_id: str) -> List[Any]:
+        """Make the JDEL command removing an item from the id->collection index."""
+        return [
+            "JDEL",
+            [ITEM_COLLECTIONS_INDEX, item_id, mk_json_path(collection_id)],
+        ]
 
     async def delete_item(
         self, item_id: str, collection_id: str, refresh: bool = False
     ):
-        """Database logic for deleting one item."""
-        db_id = mk_item_id(item_id=item_id, collection_id=collection_id)
-        try:
-            await self.client.expire("stac_items", db_id, 0.1)
-        except pyle38.errors.Tile38IdNotFoundError:
+        """Database logic for deleting one item and its index entry."""
+        deleted, _ = await self._pipeline(
+            [
+                ["DEL", [mk_items_key(collection_id), item_id, "ERRON404"]],
+                self._unindex_item_command(item_id, collection_id),
+            ]
+        )
+        if deleted is None:
             raise NotFoundError(
                 f"Item {item_id} in collection {collection_id} not found"
             )
+        await self._invalidate(*item_write_tags(collection_id, item_id))
+
+    def _set_collection(self, collection: Collection):
+        """Make the SET command storing a collection as a JSON string object."""
+        document = codec.dumps({"collection": codec.dumps(collection)})
+        return self.client.set(COLLECTIONS_INDEX, collection["id"]).string(document)
 
     async def create_collection(self, collection: Collection, refresh: bool = False):
         """Database logic for creating one collection."""
         try:
-            await self.client.jget("collections", collection["id"])
+            await self._set_collection(collection).nx().exec()
+        except pyle38.errors.Tile38Error as e:
+            if "already exists" not in str(e):
+                raise
             raise ConflictError(f"Collection {collection['id']} already exists")
-        except pyle38.errors.Tile38IdNotFoundError:
-            pass
-        except pyle38.errors.Tile38KeyNotFoundError:
-            pass
+        self.collection_cache.invalidate(collection["id"], ALL_COLLECTIONS)
+        await self._invalidate(*collection_write_tags(collection["id"]))
 
-        await self.client.jset(
-            "collections", collection["id"], "collection", json.dumps(collection)
-        )
+    async def update_collection(self, collection: Collection, refresh: bool = False):
+        """Database logic for replacing one collection in a single SET XX."""
+        try:
+            await self._set_collection(collection).xx().exec()
+        except (
+            pyle38.errors.Tile38IdNotFoundError,
+            pyle38.errors.Tile38KeyNotFoundError,
+        ):
+            raise NotFoundError(f"Collection {collection['id']} not found")
+        finally:
+            self.collection_cache.invalidate(collection["id"], ALL_COLLECTIONS)
+        await self._invalidate(*collection_write_tags(collection["id"]))
 
     async def find_collection(self, collection_id: str) -> Collection:
         """Database logic to find and return a collection."""
-        try:
-            response = await self.client.jget("collections", collection_id)
-        except pyle38.errors.Tile38IdNotFoundError:
-            raise NotFoundError(f"Collection {collection_id} not found")
-        except pyle38.errors.Tile38KeyNotFoundError:
-            raise NotFoundError(f"Collection {collection_id} not found")
-        response = json.loads(response.value)
-        collection = json.loads(response["collection"])
-        return collection
+        collection = self.collection_cache.get(collection_id)
+        if collection is None:
+            try:
+                reply = await self._command(
+                    ["JGET", [COLLECTIONS_INDEX, collection_id]]
+                )
+            except pyle38.errors.Tile38IdNotFoundError:
+                raise NotFoundError(f"Collection {collection_id} not found")
+            except pyle38.errors.Tile38KeyNotFoundError:
+                raise NotFoundError(f"Collection {collection_id} not found")
+            collection = codec.loads(reply["value"])["collection"]
+            self.collection_cache.set(collection_id, collection)
+        return codec.loads(collection)
 
     async def delete_collection(self, collection_id: str, refresh: bool = False):
         """Database logic for deleting one collection."""
         await self.find_collection(collection_id=collection_id)
-        await self.client.expire("collections", collection_id, 0.1)
-
-    # async def bulk_async(self, processed_items, refresh: bool = False):
-    #     """Database logic for async bulk item insertion."""
-    #     await asyncio.get_event_loop().run_in_executor(
-    #         None,
-    #         lambda: helpers.bulk(
-    #             self.sync_client, self._mk_actions(processed_items), refresh=refresh
-    #         ),
-    #     )
-
-    # def bulk_sync(self, processed_items, refresh: bool = False):
-    #     """Database logic for sync bulk item insertion."""
-    #     helpers.bulk(
-    #         self.sync_client, self._mk_actions(processed_items), refresh=refresh
-    #     )
+        # deleted first so no new item can be added while the items are removed
+        await self.client.delete(COLLECTIONS_INDEX, collection_id)
+        self.collection_cache.invalidate(collection_id, ALL_COLLECTIONS)
+        await self.delete_collection_items(collection_id)
+        await self._invalidate(*collection_write_tags(collection_id))
 
-    # @staticmethod
-    # def _mk_actions(processed_items):
-    #     return [
-    #         {
-    #             "_index": ITEMS_INDEX,
-    #             "_id": mk_item_id(item["id"], item["collection"]),
-    #             "_source": item,
-    #         }
-    #         for item in processed_items
-    #     ]
+    async def delete_collection_items(
+        self, collection_id: str, chunk_size: int = 1000
+    ) -> int:
+        """Delete the items of a collection in pipelined batches.
+
+        Items are removed with DEL rather than a single DROP, so their index
+        entries go away with them and each deletion is seen by Tile38 hooks
+        and channels.
+        """
+        key = mk_items_key(collection_id)
+        path = mk_json_path(collection_id)
+        deleted = 0
+        while True:
+            # deleted ids leave the key, so the first page is always the next one
+            ids = await self.client.scan(key).limit(chunk_size).asIds()
+            if not ids.ids:
+                break
+            commands = []
+            for id in ids.ids:
+                commands.append(["DEL", [key, id]])
+                commands.append(["JDEL", [ITEM_COLLECTIONS_INDEX, id, path]])
+            await self._pipeline(commands)
+            deleted += len(ids.ids)
+
+        logger.info(f"Deleted {deleted} items of collection {collection_id}")
+        return deleted
+
+    def _mk_bulk_commands(self, items: List[Item]) -> List[List[Any]]:
+        """Make the SET NX and index commands inserting a chunk of items."""
+        commands = []
+        for item in items:
+            commands.append(self._set_item_command(item, "NX"))
+            commands.append(self._index_item_command(item))
+        return commands
+
+    @staticmethod
+    def _mk_bulk_results(
+        items: List[Item], responses: List[Union[Dict, Exception]]
+    ) -> List[BulkItemResult]:
+        """Read the outcome of each item from the replies to its commands."""
+        results = []
+        for i, item in enumerate(items):
+            error = next(
+                (r for r in responses[2 * i : 2 * i + 2] if isinstance(r, Exception)),
+                None,
+            )
+            if error is not None and "already exists" in str(error):
+                error = ConflictError(
+                    f"Item {item['id']} in collection {item['collection']} already exists"
+                )
+            results.append(BulkItemResult(item["id"], item["collection"], error))
+        return results
+
+    async def bulk_async(
+        self,
+        processed_items: List[Item],
+        refresh: bool = False,
+        chunk_size: Optional[int] = None,
+    ) -> List[BulkItemResult]:
+        """Database logic for async bulk item insertion.
+
+        Items are sent in pipelines of `chunk_size` items. Each item is written
+        with SET NX, so existing items are reported as conflicts without a
+        separate existence check.
+        """
+        chunk_size = chunk_size or BULK_CHUNK_SIZE
+        results = []
+        for i in range(0, len(processed_items), chunk_size):
+            chunk = processed_items[i : i + chunk_size]
+            responses = await self._execute_pipeline(self._mk_bulk_commands(chunk))
+            results.extend(self._mk_bulk_results(chunk, responses))
+        if processed_items:
+            await self._invalidate(*self._bulk_write_tags(processed_items))
+        return results
+
+    def bulk_sync(
+        self,
+        processed_items: List[Item],
+        refresh: bool = False,
+        chunk_size: Optional[int] = None,
+    ) -> List[BulkItemResult]:
+        """Database logic for sync bulk item insertion."""
+        chunk_size = chunk_size or BULK_CHUNK_SIZE
+        results = []
+        for i in range(0, len(processed_items), chunk_size):
+            chunk = processed_items[i : i + chunk_size]
+            responses = self._sync_execute_pipeline(self._mk_bulk_commands(chunk))
+            results.extend(self._mk_bulk_results(chunk, responses))
+        if processed_items:
+            self._sync_invalidate(*self._bulk_write_tags(processed_items))
+        return results
+
+    async def _invalidate(self, *tags: str) -> None:
+        """Invalidate the cached responses of some tags, in every worker.
+
+        The next reads of this worker go to the leader, which has the write.
+        """
+        self.session.wrote()
+        await self.response_cache.invalidate(*tags)
+        self.tile_cache.evict(list(tags) or [ALL_TAG])
+        await self.invalidation_bus.publish(*tags)
+
+    def _invalidation_commands(self, *tags: str) -> List[List[Any]]:
+        """Make the commands invalidating some tags in Tile38, to pipeline.
+
+        They invalidate the shared cached responses and announce the tags to
+        the other workers, and are sent along with the write.
+        """
+        commands = [
+            *self.response_cache.invalidate_commands(*tags),
+            *self.invalidation_bus.publish_commands(*tags),
+        ]
+        return [[name, args] for name, *args in commands]
+
+    def _evict(self, *tags: str) -> None:
+        """Invalidate the caches of this worker of some tags, after a write."""
+        self.session.wrote()
+        self.response_cache.evict(list(tags) or [ALL_TAG])
+        self.tile_cache.evict(list(tags) or [ALL_TAG])
+
+    def _sync_invalidate(self, *tags: str) -> None:
+        """Invalidate the cached responses of some tags from synchronous code."""
+        self.session.wrote()
+        self.response_cache.sync_invalidate(*tags)
+        self.tile_cache.evict(list(tags) or [ALL_TAG])
+        self.invalidation_bus.sync_publish(*tags)
+
+    @classmethod
+    def evict_collections(cls, tags: List[str]) -> None:
+        """Drop the cached collections of tags written by another worker."""
+        for tag in tags:
+            if tag == ALL_TAG:
+                cls.collection_cache.invalidate()
+                return
+            if tag == COLLECTIONS_TAG:
+                cls.collection_cache.invalidate(ALL_COLLECTIONS)
+            collection_id = tag_collection_id(tag)
+            if collection_id is not None:
+                cls.collection_cache.invalidate(collection_id, ALL_COLLECTIONS)
+
+    @staticmethod
+    def _bulk_write_tags(items: List[Item]) -> List[str]:
+        """Get the response cache tags of the collections written by a bulk insert.
+
+        Items are only created, so the entries of single items, which are only
+        cached once they exist, are left alone.
+        """
+        tags = set()
+        for collection_id in {item["collection"] for item in items}:
+            tags.update(item_write_tags(collection_id))
+        return list(tags)
+
+    """ MIGRATIONS """
+
+    async def migrate_items_key(self, chunk_size: int = 1000) -> int:
+        """Move items out of the single legacy `stac_items` key.
+
+        Every item is rewritten as a native object with FIELDS into the key of
+        its own collection, along with its index entry, one pipeline per chunk,
+        and the legacy key is dropped once all of its items have been copied.
+        """
+        migrated = 0
+        cursor = 0
+        while True:
+            objects = (
+                await self.client.scan(ITEMS_INDEX)
+                .cursor(cursor)
+                .limit(chunk_size)
+                .asObjects()
+            )
+            commands = []
+            for i in range(objects.count):
+                item = codec.loads(objects.objects[i].object["item"])
+                commands.append(self._set_item_command(item))
+                commands.append(self._index_item_command(item))
+            if commands:
+                for response in await self._execute_pipeline(commands):
+                    if isinstance(response, Exception):
+                        raise response
+            migrated += objects.count
+            cursor = objects.cursor
+            if not cursor:
+                break
+
+        if migrated:
+            await self.client.drop(ITEMS_INDEX)
+            await self._invalidate()
+        logger.info(f"Migrated {migrated} items out of {ITEMS_INDEX}")
+        return migrated
+
+    async def index_item_collections(self, chunk_size: int = 1000) -> int:
+        """Add every stored item to the id->collection index.
+
+        Items written before the index existed are otherwise looked up in
+        every collection when searched by id.
+        """
+        indexed = 0
+        keys = await self.client.keys(f"{ITEMS_KEY_PREFIX}*")
+        for key in keys.keys:
+            path = mk_json_path(key[len(ITEMS_KEY_PREFIX) :])
+            cursor = 0
+            while True:
+                ids = (
+                    await self.client.scan(key).cursor(cursor).limit(chunk_size).asIds()
+                )
+                await self._pipeline(
+                    [
+                        ["JSET", [ITEM_COLLECTIONS_INDEX, id, path, "true", "RAW"]]
+                        for id in ids.ids
+                    ]
+                )
+                indexed += len(ids.ids)
+                cursor = ids.cursor
+                if not cursor:
+                    break
+
+        logger.info(f"Indexed {indexed} items in {ITEM_COLLECTIONS_INDEX}")
+        return indexed
 
     # DANGER
     async def delete_items(self) -> None:
         """Danger. this is only for tests."""
-        await self.client.drop(ITEMS_INDEX)
+        keys = await self.client.keys(f"{ITEMS_KEY_PREFIX}*")
+        for key in [ITEMS_INDEX, ITEM_COLLECTIONS_INDEX, *keys.keys]:
+            await self.client.drop(key)
+        await self._invalidate()
 
     # DANGER
     async def delete_collections(self) -> None:
         """Danger. this is only for tests."""
         await self.client.drop(COLLECTIONS_INDEX)
+        self.collection_cache.invalidate()
+        await self._invalidate()
@@ -1,7 +1,7 @@
 """A few datetime methods."""
 from datetime import datetime, timezone
 
-from pystac.utils import datetime_to_str
+from pystac.utils import datetime_to_str, str_to_datetime
 
 
 def now_in_utc() -> datetime:
@@ -12,3 +12,11 @@ def now_in_utc() -> datetime:
 def now_to_rfc3339_str() -> str:
     """Return an RFC 3339 string representing now."""
     return datetime_to_str(now_in_utc())
+
+
+def rfc3339_str_to_epoch(value: str) -> float:
+    """Return the POSIX timestamp of an RFC 3339 string."""
+    dt = str_to_datetime(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
@@ -1,5 +1,18 @@
 """elasticsearch extensions modifications."""
 
+from .export import CompressionMiddleware, ExportExtension
+from .metrics import MetricsExtension
+from .nearby import NearbyExtension
 from .query import Operator, QueryableTypes, QueryExtension
+from .simplify import SimplifyExtension
 
-__all__ = ["Operator", "QueryableTypes", "QueryExtension"]
+__all__ = [
+    "CompressionMiddleware",
+    "ExportExtension",
+    "MetricsExtension",
+    "NearbyExtension",
+    "Operator",
+    "QueryableTypes",
+    "QueryExtension",
+    "SimplifyExtension",
+]
@@ -0,0 +1,52 @@
+"""Export extension."""
+from typing import List, Optional
+
+import attr
+from brotli_asgi import BrotliMiddleware
+from fastapi import APIRouter, FastAPI
+from starlette.types import ASGIApp
+
+from stac_fastapi.api.models import CollectionUri
+from stac_fastapi.api.routes import create_async_endpoint
+from stac_fastapi.types.extension import ApiExtension
+
+
+@attr.s
+class ExportExtension(ApiExtension):
+    """Export Extension.
+
+    Adds the `GET /collections/{collection_id}/items.ndjson` endpoint, which
+    streams every item of a collection as newline delimited GeoJSON.
+    """
+
+    client = attr.ib()
+    conformance_classes: List[str] = attr.ib(factory=list)
+    schema_href: Optional[str] = attr.ib(default=None)
+
+    def register(self, app: FastAPI) -> None:
+        """Register the extension with a FastAPI application."""
+        router = APIRouter()
+        router.add_api_route(
+            name="Export Items",
+            path="/collections/{collection_id}/items.ndjson",
+            methods=["GET"],
+            endpoint=create_async_endpoint(self.client.export_items, CollectionUri),
+        )
+        app.include_router(router, tags=["Export Extension"])
+
+
+# paths of the exports, which negotiate and compress their own encoding
+EXPORT_PATH_PATTERN = r"/items\.ndjson$"
+
+
+class CompressionMiddleware(BrotliMiddleware):
+    """Brotli and gzip compression of the responses, but for the exports.
+
+    The gzip fallback of `BrotliMiddleware` would compress the gzip stream
+    of an export a second time.
+    """
+
+    def __init__(self, app: ASGIApp, **kwargs) -> None:
+        """Leave the exports out of the compressed responses."""
+        kwargs.setdefault("excluded_handlers", [EXPORT_PATH_PATTERN])
+        super().__init__(app, **kwargs)
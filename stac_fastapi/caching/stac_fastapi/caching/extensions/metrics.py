@@ -0,0 +1,43 @@
+"""Metrics extension."""
+from typing import List, Optional
+
+import attr
+from fastapi import APIRouter, FastAPI
+from starlette.responses import Response
+
+from stac_fastapi.caching import metrics
+from stac_fastapi.types.errors import NotFoundError
+from stac_fastapi.types.extension import ApiExtension
+
+
+async def metrics_endpoint() -> Response:
+    """Render the Prometheus metrics of the process."""
+    latest = metrics.latest()
+    if latest is None:
+        raise NotFoundError("Metrics need prometheus_client to be installed")
+    content, media_type = latest
+    return Response(content=content, media_type=media_type)
+
+
+@attr.s
+class MetricsExtension(ApiExtension):
+    """Metrics Extension.
+
+    Adds the `GET /metrics` endpoint, which exposes the Tile38 command,
+    search stage and serializer timings of the process to Prometheus.
+    """
+
+    conformance_classes: List[str] = attr.ib(factory=list)
+    schema_href: Optional[str] = attr.ib(default=None)
+
+    def register(self, app: FastAPI) -> None:
+        """Register the extension with a FastAPI application."""
+        router = APIRouter()
+        router.add_api_route(
+            name="Metrics",
+            path="/metrics",
+            methods=["GET"],
+            endpoint=metrics_endpoint,
+            include_in_schema=False,
+        )
+        app.include_router(router, tags=["Metrics Extension"])
@@ -0,0 +1,57 @@
+"""Nearby extension."""
+from typing import List, Optional, Tuple
+
+import attr
+from fastapi import FastAPI
+from pydantic import BaseModel, PositiveFloat, validator
+
+from stac_fastapi.types.extension import ApiExtension
+from stac_fastapi.types.search import APIRequest
+
+
+class NearbySearch(BaseModel):
+    """Point to search around, as `[lon, lat]`, and the maximum distance in meters."""
+
+    point: Tuple[float, float]
+    distance: Optional[PositiveFloat] = None
+
+    @validator("point")
+    def validate_point(cls, point: Tuple[float, float]) -> Tuple[float, float]:
+        """Check the point is a longitude and a latitude."""
+        lon, lat = point
+        if not (-180 <= lon <= 180 and -90 <= lat <= 90):
+            raise ValueError("nearby point must be [lon, lat] in degrees")
+        return point
+
+
+@attr.s
+class NearbyExtensionGetRequest(APIRequest):
+    """Nearby Extension GET request model, `lon,lat` or `lon,lat,distance`."""
+
+    nearby: Optional[str] = attr.ib(default=None)
+
+
+class NearbyExtensionPostRequest(BaseModel):
+    """Nearby Extension POST request model."""
+
+    nearby: Optional[NearbySearch]
+
+
+@attr.s
+class NearbyExtension(ApiExtension):
+    """Nearby Extension.
+
+    Adds a `nearby` parameter to `/search` requests, returning the items
+    closest to a point first, optionally only those within a distance in
+    meters, like `{"nearby": {"point": [lon, lat], "distance": 5000}}`.
+    """
+
+    GET = NearbyExtensionGetRequest
+    POST = NearbyExtensionPostRequest
+
+    conformance_classes: List[str] = attr.ib(factory=list)
+    schema_href: Optional[str] = attr.ib(default=None)
+
+    def register(self, app: FastAPI) -> None:
+        """Register the extension with a FastAPI application."""
+        pass
@@ -20,6 +20,16 @@ logger.setLevel(logging.INFO)
 # Be careful: https://github.com/samuelcolvin/pydantic/issues/1423#issuecomment-642797287
 NumType = Union[float, int]
 
+OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "lt": operator.lt,
+    "lte": operator.le,
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "in": lambda value, values: value in values,
+}
+
 
 class Operator(str, AutoValueEnum):
     """Defines the set of operators supported by the API."""
@@ -30,17 +40,17 @@ class Operator(str, AutoValueEnum):
     lte = auto()
     gt = auto()
     gte = auto()
+    in_ = "in"
 
     # TODO: These are defined in the spec but aren't currently implemented by the api
     # startsWith = auto()
     # endsWith = auto()
     # contains = auto()
-    # in = auto()
 
     @DynamicClassAttribute
     def operator(self) -> Callable[[Any, Any], bool]:
         """Return python operator."""
-        return getattr(operator, self._value_)
+        return OPERATORS[self._value_]
 
 
 class Queryables(str, AutoValueEnum):
@@ -0,0 +1,67 @@
+"""Simplify extension."""
+from typing import List, Optional
+
+import attr
+from fastapi import FastAPI
+from pydantic import BaseModel, conint
+
+from stac_fastapi.caching.config import SIMPLIFY_TOLERANCES
+from stac_fastapi.types.extension import ApiExtension
+from stac_fastapi.types.search import APIRequest
+
+
+class Tolerance(float):
+    """Tolerance of one of the simplified geometries stored, in degrees.
+
+    A type rather than a validator, since search request models are made
+    of the types of the fields of the extensions.
+    """
+
+    @classmethod
+    def __get_validators__(cls):
+        """Get the validators of the type."""
+        yield cls.validate
+
+    @classmethod
+    def validate(cls, value) -> "Tolerance":
+        """Check the tolerance is one of `SIMPLIFY_TOLERANCES`."""
+        tolerance = float(value)
+        if tolerance not in SIMPLIFY_TOLERANCES:
+            raise ValueError(f"simplify must be one of {SIMPLIFY_TOLERANCES}")
+        return cls(tolerance)
+
+
+@attr.s
+class SimplifyExtensionGetRequest(APIRequest):
+    """Simplify Extension GET request model."""
+
+    simplify: Optional[float] = attr.ib(default=None)
+    precision: Optional[int] = attr.ib(default=None)
+
+
+class SimplifyExtensionPostRequest(BaseModel):
+    """Simplify Extension POST request model."""
+
+    simplify: Optional[Tolerance]
+    precision: Optional[conint(ge=0, le=15)]  # type: ignore
+
+
+@attr.s
+class SimplifyExtension(ApiExtension):
+    """Simplify Extension.
+
+    Adds `simplify` and `precision` parameters to `/search` requests and
+    item listings, returning the geometries simplified with a tolerance in
+    degrees, one of `SIMPLIFY_TOLERANCES`, and their coordinates rounded to
+    a number of decimals.
+    """
+
+    GET = SimplifyExtensionGetRequest
+    POST = SimplifyExtensionPostRequest
+
+    conformance_classes: List[str] = attr.ib(factory=list)
+    schema_href: Optional[str] = attr.ib(default=None)
+
+    def register(self, app: FastAPI) -> None:
+        """Register the extension with a FastAPI application."""
+        pass
@@ -0,0 +1,163 @@
+"""Query extension compiler."""
+import math
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+import attr
+
+from stac_fastapi.caching.datetime_utils import rfc3339_str_to_epoch
+from stac_fastapi.caching.extensions import Operator
+from stac_fastapi.types.errors import InvalidQueryParameter
+from stac_fastapi.types.stac import Item
+
+# bounds of the Tile38 WHERE range matching each operator, `(` excludes a bound
+WHERE_RANGES: Dict[Operator, Callable[[float], Tuple[Any, Any]]] = {
+    Operator.eq: lambda value: (value, value),
+    Operator.lt: lambda value: ("-inf", f"({value}"),
+    Operator.lte: lambda value: ("-inf", value),
+    Operator.gt: lambda value: (f"({value}", "+inf"),
+    Operator.gte: lambda value: (value, "+inf"),
+}
+
+_MISSING = object()
+
+
+def _is_number(value: Any) -> bool:
+    return (
+        isinstance(value, (int, float))
+        and not isinstance(value, bool)
+        and math.isfinite(value)
+    )
+
+
+def _property_getter(name: str) -> Callable[[Item], Any]:
+    """Make a function reading one property of an item."""
+    if name.startswith("properties."):
+        name = name[len("properties.") :]
+
+    def get(item: Item) -> Any:
+        return item.get("properties", {}).get(name, _MISSING)
+
+    return get
+
+
+def _predicate(name: str, op: Operator, value: Any) -> Callable[[Item], bool]:
+    """Make a function testing one query expression against an item."""
+    get = _property_getter(name)
+    compare = op.operator
+
+    def predicate(item: Item) -> bool:
+        prop = get(item)
+        if prop is _MISSING:
+            return op == Operator.ne
+        try:
+            return compare(prop, value)
+        except TypeError:
+            return False
+
+    return predicate
+
+
+@attr.s
+class CompiledQuery:
+    """A query extension expression split for Tile38.
+
+    `where` holds `(op, field, value)` clauses on indexed Tile38 FIELDS and
+    `post_filters` the predicates that have to run on the returned items.
+    """
+
+    where: List[Tuple[Operator, str, Any]] = attr.ib(factory=list)
+    post_filters: List[Callable[[Item], bool]] = attr.ib(factory=list)
+
+    def matches(self, item: Item) -> bool:
+        """Test an item against the post-filters."""
+        return all(predicate(item) for predicate in self.post_filters)
+
+    def filter(self, items: List[Item]) -> List[Item]:
+        """Keep the items passing every post-filter."""
+        if not self.post_filters:
+            return items
+        return [item for item in items if self.matches(item)]
+
+
+def _where_value(name: str, value: Any, datetime_fields) -> Optional[float]:
+    """Return the value of a FIELD comparison, or None if it can't be indexed."""
+    if name in datetime_fields and isinstance(value, str):
+        try:
+            return rfc3339_str_to_epoch(value)
+        except ValueError:
+            raise InvalidQueryParameter(f"Invalid datetime {value} for {name}")
+    return value if _is_number(value) else None
+
+
+def compile_query(
+    query: Optional[Dict[str, Dict[str, Any]]],
+    indexed_fields: Optional[Mapping[str, str]] = None,
+    datetime_fields=(),
+) -> CompiledQuery:
+    """Compile a query extension expression.
+
+    Numeric comparisons on `indexed_fields` become Tile38 WHERE/WHEREIN
+    clauses, everything else is compiled into post-filter predicates. Tile38
+    reads a missing FIELD as 0, so clauses that match 0 are also kept as
+    post-filters.
+    """
+    compiled = CompiledQuery()
+    indexed_fields = indexed_fields or {}
+    for name, expr in (query or {}).items():
+        if not isinstance(expr, dict):
+            raise InvalidQueryParameter(f"Invalid query expression for {name}")
+        prop = name[len("properties.") :] if name.startswith("properties.") else name
+        field = indexed_fields.get(prop)
+        for op_name, value in expr.items():
+            try:
+                op = Operator(op_name)
+            except ValueError:
+                raise InvalidQueryParameter(f"Unsupported query operator {op_name}")
+            if op == Operator.in_ and not isinstance(value, list):
+                raise InvalidQueryParameter(f"Operator in on {name} expects a list")
+
+            predicate = _predicate(prop, op, value)
+            if field is None or op == Operator.ne:
+                compiled.post_filters.append(predicate)
+                continue
+
+            if op == Operator.in_:
+                where_value = [_where_value(prop, v, datetime_fields) for v in value]
+                indexable = all(v is not None for v in where_value)
+            else:
+                where_value = _where_value(prop, value, datetime_fields)
+                indexable = where_value is not None
+            if not indexable:
+                compiled.post_filters.append(predicate)
+                continue
+
+            compiled.where.append((op, field, where_value))
+            if op.operator(0, where_value):
+                compiled.post_filters.append(predicate)
+    return compiled
+
+
+def datetime_predicate(datetime_search: Dict) -> Callable[[Item], bool]:
+    """Make a function testing an item against a datetime filter.
+
+    This is the Python counterpart of `DatabaseLogic.apply_datetime_filter`,
+    for items read without a Tile38 WHERE clause.
+    """
+    if "eq" in datetime_search:
+        gte = lte = datetime_search["eq"]
+    else:
+        gte, lte = datetime_search["gte"], datetime_search["lte"]
+
+    def predicate(item: Item) -> bool:
+        properties = item.get("properties", {})
+        start = properties.get("start_datetime") or properties.get("datetime")
+        end = properties.get("end_datetime") or properties.get("datetime")
+        if start is None or end is None:
+            return False
+        if lte is not None and rfc3339_str_to_epoch(start) > lte:
+            return False
+        if gte is not None and rfc3339_str_to_epoch(end) < gte:
+            return False
+        return True
+
+    return predicate
@@ -0,0 +1,107 @@
+"""Planar tests of GeoJSON geometries against bounding boxes.
+
+Bounding boxes are `[west, south, east, north]` lists in degrees, and edges
+count as inside, like the Tile38 INTERSECTS of the matching polygon.
+"""
+from typing import Dict, Iterator, List, Sequence
+
+BBox = Sequence[float]
+Position = Sequence[float]
+
+
+def bbox_overlaps(a: BBox, b: BBox) -> bool:
+    """Test whether two bounding boxes share a point."""
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def bbox_contains(outer: BBox, inner: BBox) -> bool:
+    """Test whether a bounding box holds another one."""
+    return (
+        outer[0] <= inner[0]
+        and outer[1] <= inner[1]
+        and inner[2] <= outer[2]
+        and inner[3] <= outer[3]
+    )
+
+
+def _in_bbox(position: Position, bbox: BBox) -> bool:
+    return bbox[0] <= position[0] <= bbox[2] and bbox[1] <= position[1] <= bbox[3]
+
+
+def _segment_intersects_bbox(a: Position, b: Position, bbox: BBox) -> bool:
+    """Clip the segment from `a` to `b` to the box, Liang-Barsky style."""
+    t0, t1 = 0.0, 1.0
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    for p, q in (
+        (-dx, a[0] - bbox[0]),
+        (dx, bbox[2] - a[0]),
+        (-dy, a[1] - bbox[1]),
+        (dy, bbox[3] - a[1]),
+    ):
+        if p == 0:
+            if q < 0:
+                return False
+        elif p < 0:
+            t0 = max(t0, q / p)
+        else:
+            t1 = min(t1, q / p)
+        if t0 > t1:
+            return False
+    return True
+
+
+def _in_ring(position: Position, ring: List[Position]) -> bool:
+    """Test whether a position is inside a closed ring, by ray casting."""
+    x, y = position[0], position[1]
+    inside = False
+    for a, b in zip(ring, ring[1:]):
+        if (a[1] > y) != (b[1] > y):
+            if x < a[0] + (y - a[1]) * (b[0] - a[0]) / (b[1] - a[1]):
+                inside = not inside
+    return inside
+
+
+def _line_intersects_bbox(line: List[Position], bbox: BBox) -> bool:
+    if len(line) == 1:
+        return _in_bbox(line[0], bbox)
+    return any(_segment_intersects_bbox(a, b, bbox) for a, b in zip(line, line[1:]))
+
+
+def _polygon_intersects_bbox(rings: List[List[Position]], bbox: BBox) -> bool:
+    if any(_line_intersects_bbox(ring, bbox) for ring in rings):
+        return True
+    # no edge reaches the box: it is either inside the polygon or outside it
+    corner = (bbox[0], bbox[1])
+    return bool(rings) and (
+        _in_ring(corner, rings[0]) and not any(_in_ring(corner, r) for r in rings[1:])
+    )
+
+
+def _parts(geometry: Dict) -> Iterator[Dict]:
+    """Split collections and multi-part geometries into single parts."""
+    kind = geometry["type"]
+    if kind == "GeometryCollection":
+        for part in geometry["geometries"]:
+            yield from _parts(part)
+    elif kind.startswith("Multi"):
+        for coordinates in geometry["coordinates"]:
+            yield {"type": kind[len("Multi") :], "coordinates": coordinates}
+    else:
+        yield geometry
+
+
+def intersects_bbox(geometry: Dict, bbox: BBox) -> bool:
+    """Test whether a GeoJSON geometry and a bounding box share a point."""
+    for part in _parts(geometry):
+        kind, coordinates = part["type"], part["coordinates"]
+        if kind == "Point":
+            hit = _in_bbox(coordinates, bbox)
+        elif kind == "LineString":
+            hit = _line_intersects_bbox(coordinates, bbox)
+        elif kind == "Polygon":
+            hit = _polygon_intersects_bbox(coordinates, bbox)
+        else:
+            raise ValueError(f"Unsupported geometry type {kind}")
+        if hit:
+            return True
+    return False
@@ -0,0 +1,196 @@
+"""Cache invalidations announced to every worker through a Tile38 channel.
+
+A write is announced by setting a short lived point in the `cache_events`
+key, whose properties hold the response cache tags of what it changed. A
+geofence channel on that key, created at startup with SETCHAN, sends the
+point to every worker subscribed to the channel, which drops the cached
+collections and responses of those tags.
+
+A single events key is used rather than channels on the keys written by
+the API: collections are STRING objects, which geofences do not see, and
+items have one key per collection.
+"""
+import asyncio
+import logging
+import uuid
+from typing import Callable, ClassVar, Iterable, List, Optional
+
+import attr
+
+from stac_fastapi.caching import codec
+from stac_fastapi.caching.config import (
+    CACHE_INVALIDATION_BUS,
+    CACHE_INVALIDATION_START_TIMEOUT,
+)
+from stac_fastapi.caching.response_cache import ALL_TAG
+from stac_fastapi.caching.session import Session
+
+logger = logging.getLogger(__name__)
+
+EVENTS_KEY = "cache_events"
+CHANNEL = "stac_cache_events"
+# seconds an event point is kept, it is only needed to fire the channel
+EVENT_TTL = 10
+# every point of the events key is inside the fence of the channel
+SETCHAN_COMMAND = [
+    "SETCHAN",
+    CHANNEL,
+    "INTERSECTS",
+    EVENTS_KEY,
+    "FENCE",
+    "DETECT",
+    "inside",
+    "BOUNDS",
+    -90,
+    -180,
+    90,
+    180,
+]
+
+Handler = Callable[[List[str]], None]
+
+
+@attr.s
+class InvalidationBus:
+    """Announce the tags invalidated by writes, and apply those of the others.
+
+    Handlers are called with the tags invalidated by the writes of the other
+    workers. When the subscription is lost, notifications may be missed:
+    once it is back, handlers are called with `ALL_TAG`.
+    """
+
+    session: Session = attr.ib(factory=Session.create_from_env)
+    enabled: bool = attr.ib(default=CACHE_INVALIDATION_BUS)
+    backoff_cap: float = attr.ib(default=5.0)
+    start_timeout: float = attr.ib(default=CACHE_INVALIDATION_START_TIMEOUT)
+    # announcements of this worker, which it has already applied
+    origin: str = attr.ib(factory=lambda: uuid.uuid4().hex)
+
+    _handlers: List[Handler] = attr.ib(factory=list, init=False)
+    _task: Optional[asyncio.Task] = attr.ib(default=None, init=False)
+    _subscribed: Optional[asyncio.Event] = attr.ib(default=None, init=False)
+
+    # bus of the process, shared by the database logic and the app
+    _default: ClassVar[Optional["InvalidationBus"]] = None
+
+    @classmethod
+    def create_from_env(cls, session: Optional[Session] = None):
+        """Create from environment."""
+        if cls._default is None:
+            cls._default = cls(session=session or Session.create_from_env())
+        return cls._default
+
+    def add_handler(self, handler: Handler) -> None:
+        """Call `handler` with the tags invalidated by the other workers."""
+        self._handlers.append(handler)
+
+    def _event_command(self, tags: Iterable[str]) -> List:
+        event = {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [0, 0]},
+            "properties": {"origin": self.origin, "tags": list(tags) or [ALL_TAG]},
+        }
+        return [
+            "SET",
+            EVENTS_KEY,
+            uuid.uuid4().hex,
+            "EX",
+            EVENT_TTL,
+            "OBJECT",
+            codec.dumps(event),
+        ]
+
+    def publish_commands(self, *tags: str) -> List[List]:
+        """Make the commands announcing the tags invalidated by a write."""
+        return [self._event_command(tags)] if self.enabled else []
+
+    async def publish(self, *tags: str) -> None:
+        """Announce the tags invalidated by a write, every tag if none is given."""
+        if self.enabled:
+            await self.session.pipeline_client.execute_command(
+                *self._event_command(tags)
+            )
+
+    def sync_publish(self, *tags: str) -> None:
+        """Announce the tags invalidated by a write from synchronous code."""
+        if self.enabled:
+            self.session.sync_pipeline_client.execute_command(
+                *self._event_command(tags)
+            )
+
+    async def start(self) -> None:
+        """Create the channel and listen to it until `stop` is called.
+
+        Returns once the worker is subscribed, so that the writes that follow
+        are seen, or after `start_timeout` seconds: the subscription is then
+        retried in the background, and until it succeeds the worker only
+        sees its own writes.
+        """
+        if not self.enabled or self._task is not None:
+            return
+        self._subscribed = asyncio.Event()
+        self._task = asyncio.create_task(self._listen())
+        try:
+            await asyncio.wait_for(self._subscribed.wait(), self.start_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                "Not subscribed to the cache invalidation channel after "
+                f"{self.start_timeout}s, starting with local invalidations only"
+            )
+
+    async def stop(self) -> None:
+        """Stop listening to the channel."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _listen(self) -> None:
+        delay = 0.0
+        reconnected = False
+        while True:
+            pubsub = self.session.pubsub()
+            try:
+                await self.session.pipeline_client.execute_command(*SETCHAN_COMMAND)
+                await pubsub.subscribe(CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self._receive(message["data"])
+                    elif message["type"] == "subscribe":
+                        self._subscribed.set()
+                        if reconnected:
+                            self._dispatch([ALL_TAG])
+                        delay = 0.0
+            except Exception as e:
+                delay = min(max(delay * 2, 0.1), self.backoff_cap)
+                logger.warning(
+                    f"Lost the cache invalidation channel, retrying in {delay}s: {e}"
+                )
+            finally:
+                await pubsub.reset()
+                await pubsub.connection_pool.disconnect()
+            reconnected = True
+            await asyncio.sleep(delay)
+
+    def _receive(self, data: str) -> None:
+        try:
+            notification = codec.loads(data)
+            # events expiring are notified too, only writes are announcements
+            if notification.get("command") != "set":
+                return
+            properties = notification["object"]["properties"]
+        except (ValueError, KeyError, TypeError, AttributeError):
+            logger.warning(f"Invalid cache invalidation event: {data}")
+            return
+        if properties.get("origin") != self.origin:
+            self._dispatch(properties.get("tags") or [ALL_TAG])
+
+    def _dispatch(self, tags: List[str]) -> None:
+        for handler in self._handlers:
+            try:
+                handler(tags)
+            except Exception:
+                logger.exception("Cache invalidation handler failed")
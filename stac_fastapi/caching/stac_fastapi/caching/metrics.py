@@ -0,0 +1,86 @@
+"""Prometheus metrics of Tile38 commands, search stages, serializers and caches.
+
+Metrics are recorded when prometheus_client is installed, timers do nothing
+otherwise.
+"""
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
+
+try:
+    import prometheus_client
+except ImportError:  # pragma: no cover
+    prometheus_client = None
+
+__all__ = [
+    "SEARCH_STAGE_SECONDS",
+    "SERIALIZER_SECONDS",
+    "TILE38_COMMAND_SECONDS",
+    "TILE_CACHE_TILES",
+    "count",
+    "latest",
+    "timer",
+]
+
+if prometheus_client is not None:
+    # round trip of a command, including the wait for a pooled connection;
+    # pipelines are labelled "pipeline"
+    TILE38_COMMAND_SECONDS = prometheus_client.Histogram(
+        "stac_tile38_command_seconds",
+        "Tile38 command latency.",
+        ["command"],
+    )
+    # plan: request filters to search plan, compile: Tile38 clauses and
+    # post-filters, read: all the reads of a page, which include
+    # filter: post-filters of a chunk
+    SEARCH_STAGE_SECONDS = prometheus_client.Histogram(
+        "stac_search_stage_seconds",
+        "Duration of the stages of a search or item listing.",
+        ["stage"],
+    )
+    # tile38_reply: decoding replies, item/collection: db_to_stac of a page
+    # of items or of collections, response: encoding a response body
+    SERIALIZER_SECONDS = prometheus_client.Histogram(
+        "stac_serializer_seconds",
+        "Duration of the decoding and encoding of documents.",
+        ["serializer"],
+    )
+    # hit: read from the tile cache, miss: read from Tile38 and cached,
+    # too_big: holding too many items to be cached
+    TILE_CACHE_TILES = prometheus_client.Counter(
+        "stac_tile_cache_tiles",
+        "Tiles read by bbox searches.",
+        ["result"],
+    )
+else:  # pragma: no cover
+    TILE38_COMMAND_SECONDS = SEARCH_STAGE_SECONDS = SERIALIZER_SECONDS = None
+    TILE_CACHE_TILES = None
+
+
+@contextmanager
+def timer(histogram, label: str) -> Iterator[None]:
+    """Observe the duration of the block in `histogram`, under `label`."""
+    if histogram is None:  # pragma: no cover
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(label).observe(time.perf_counter() - start)
+
+
+def count(counter, label: str, amount: int = 1) -> None:
+    """Add `amount` to `counter`, under `label`."""
+    if counter is not None:
+        counter.labels(label).inc(amount)
+
+
+def latest() -> Optional[Tuple[bytes, str]]:
+    """Render the metrics of the process and their content type.
+
+    Returns None when prometheus_client is not installed.
+    """
+    if prometheus_client is None:  # pragma: no cover
+        return None
+    return prometheus_client.generate_latest(), prometheus_client.CONTENT_TYPE_LATEST
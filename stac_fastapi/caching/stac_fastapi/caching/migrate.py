@@ -0,0 +1,40 @@
+"""Storage layout migrations."""
+import asyncio
+import logging
+
+from stac_fastapi.caching.database_logic import DatabaseLogic
+from stac_fastapi.caching.session import Session
+
+logger = logging.getLogger(__name__)
+
+
+async def migrate_items_key() -> int:
+    """Move items from the legacy `stac_items` key into per-collection keys."""
+    return await DatabaseLogic().migrate_items_key()
+
+
+async def index_item_collections() -> int:
+    """Build the id->collection index of the stored items."""
+    return await DatabaseLogic().index_item_collections()
+
+
+async def migrate():
+    """Run every storage migration in order."""
+    try:
+        migrated = await migrate_items_key()
+        indexed = await index_item_collections()
+    finally:
+        await Session.create_from_env().close()
+    return migrated, indexed
+
+
+def run():
+    """Run the storage migrations from the command line."""
+    logging.basicConfig(level=logging.INFO)
+    migrated, indexed = asyncio.run(migrate())
+    print(f"Migrated {migrated} items.")
+    print(f"Indexed {indexed} items.")
+
+
+if __name__ == "__main__":
+    run()
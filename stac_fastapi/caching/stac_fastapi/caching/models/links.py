@@ -1,5 +1,6 @@
 """link helpers."""
 
+from functools import lru_cache
 from typing import Any, Dict, List, Optional
 from urllib.parse import ParseResult, parse_qs, unquote, urlencode, urljoin, urlparse
 
@@ -13,6 +14,7 @@ from starlette.requests import Request
 # These can be inferred from the item/collection, so they aren't included in the database
 # Instead they are dynamically generated when querying the database using the classes defined below
 INFERRED_LINK_RELS = ["self", "item", "parent", "collection", "root"]
+_INFERRED_LINK_RELS = frozenset(INFERRED_LINK_RELS)
 
 
 def merge_params(url: str, newparams: Dict) -> str:
@@ -136,3 +138,58 @@ class PagingLinks(BaseLinks):
                 }
 
         return None
+
+
+@attr.s
+class LinkTemplates:
+    """Create the inferred links of items and collections for one base url.
+
+    Produces the same links as `ItemLinks` and `CollectionLinks` of
+    stac_fastapi.types, with the collection and item ids appended to a
+    `collections/` url resolved once, instead of a `urljoin` per link.
+    """
+
+    base_url: str = attr.ib()
+    collections_url: str = attr.ib(init=False)
+
+    def __attrs_post_init__(self):
+        """Resolve the collections url."""
+        self.collections_url = urljoin(self.base_url, "collections/")
+
+    def item_links(self, collection_id: str, item_id: str) -> List[Dict[str, Any]]:
+        """Return the inferred links of an item."""
+        collection_url = f"{self.collections_url}{collection_id}"
+        return [
+            dict(
+                rel=Relations.self,
+                type=MimeTypes.geojson,
+                href=f"{collection_url}/items/{item_id}",
+            ),
+            dict(rel=Relations.parent, type=MimeTypes.json, href=collection_url),
+            dict(rel=Relations.collection, type=MimeTypes.json, href=collection_url),
+            dict(rel=Relations.root, type=MimeTypes.json, href=self.base_url),
+        ]
+
+    def collection_links(self, collection_id: str) -> List[Dict[str, Any]]:
+        """Return the inferred links of a collection."""
+        collection_url = f"{self.collections_url}{collection_id}"
+        return [
+            dict(rel=Relations.self, type=MimeTypes.json, href=collection_url),
+            dict(rel=Relations.parent, type=MimeTypes.json, href=self.base_url),
+            dict(rel="items", type=MimeTypes.geojson, href=f"{collection_url}/items"),
+            dict(rel=Relations.root, type=MimeTypes.json, href=self.base_url),
+        ]
+
+    def resolve_links(self, links: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Drop the inferred links and make relative links absolute."""
+        return [
+            {**link, "href": urljoin(self.base_url, link["href"])}
+            for link in links
+            if link["rel"] not in _INFERRED_LINK_RELS
+        ]
+
+
+@lru_cache(maxsize=64)
+def link_templates(base_url: str) -> LinkTemplates:
+    """Get the link templates of a base url."""
+    return LinkTemplates(base_url)
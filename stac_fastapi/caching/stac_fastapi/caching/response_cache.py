@@ -0,0 +1,493 @@
+"""Cache of the responses of the read endpoints, validated with ETags.
+
+Entries are tagged with the resources they were read from. Writes give new
+versions to the tags of what they changed, and an entry is only served while
+the tags it was built from keep their versions, so a response that was being
+built during a write is never served afterwards.
+"""
+import hashlib
+import re
+import threading
+import time
+import uuid
+from typing import Callable, ClassVar, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+import attr
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from stac_fastapi.caching import codec
+from stac_fastapi.caching.cache import TTLCache
+from stac_fastapi.caching.config import (
+    RESPONSE_CACHE_MAX_BYTES,
+    RESPONSE_CACHE_SHARED,
+    RESPONSE_CACHE_SIZE,
+    RESPONSE_CACHE_TTL,
+)
+from stac_fastapi.caching.session import Session
+
+# Tile38 keys of the entries and tag versions shared by the workers
+RESPONSES_KEY = "responses"
+RESPONSE_TAGS_KEY = "response_tags"
+
+# tag of every entry, and of the entries reading every collection or item
+ALL_TAG = "all"
+COLLECTIONS_TAG = "collections"
+ITEMS_TAG = "items"
+
+
+def collection_tag(collection_id: str) -> str:
+    """Tag the entries read from a collection and its items."""
+    return codec.dumps(["collection", collection_id])
+
+
+def items_tag(collection_id: str) -> str:
+    """Tag the entries listing or searching the items of a collection."""
+    return codec.dumps(["items", collection_id])
+
+
+def item_tag(collection_id: str, item_id: str) -> str:
+    """Tag the entries of one item."""
+    return codec.dumps(["item", collection_id, item_id])
+
+
+def tag_collection_id(
+    tag: str, kinds: Iterable[str] = ("collection",)
+) -> Optional[str]:
+    """Get the collection of a tag made by `collection_tag`, None for others.
+
+    Tags of items are read too when `kinds` holds "items" or "item".
+    """
+    if not tag.startswith("["):
+        return None
+    kind, collection_id, *_ = codec.loads(tag)
+    return collection_id if kind in kinds else None
+
+
+def item_write_tags(collection_id: str, item_id: Optional[str] = None) -> List[str]:
+    """Get the tags invalidated by writing an item, or items of a collection."""
+    tags = [ITEMS_TAG, items_tag(collection_id)]
+    if item_id is not None:
+        tags.append(item_tag(collection_id, item_id))
+    return tags
+
+
+def collection_write_tags(collection_id: str) -> List[str]:
+    """Get the tags invalidated by writing or deleting a collection."""
+    return [COLLECTIONS_TAG, ITEMS_TAG, collection_tag(collection_id)]
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag, with weak comparison."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    return opaque in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+
+@attr.s(frozen=True)
+class CachedResponse:
+    """An encoded response body, its ETag and the versions it was built from."""
+
+    body: bytes = attr.ib()
+    media_type: str = attr.ib()
+    etag: str = attr.ib()
+    versions: Dict[str, str] = attr.ib(factory=dict)
+
+    @classmethod
+    def from_body(cls, body: bytes, media_type: str, versions: Dict[str, str]):
+        """Make an entry with a weak ETag, the digest of its body.
+
+        The ETag is weak since the body is compressed afterwards, depending
+        on the Accept-Encoding of each request.
+        """
+        etag = f'W/"{hashlib.sha256(body).hexdigest()[:32]}"'
+        return cls(body=body, media_type=media_type, etag=etag, versions=versions)
+
+    def dumps(self) -> str:
+        """Encode the entry to store it in Tile38."""
+        return codec.dumps(
+            {
+                "body": self.body.decode(),
+                "media_type": self.media_type,
+                "etag": self.etag,
+                "versions": self.versions,
+            }
+        )
+
+    @classmethod
+    def loads(cls, document: str) -> "CachedResponse":
+        """Decode an entry stored in Tile38."""
+        entry = codec.loads(document)
+        entry["body"] = entry["body"].encode()
+        return cls(**entry)
+
+
+def _tile38_string(reply) -> Optional[str]:
+    """Get the string object of a GET reply, None when missing."""
+    try:
+        reply = codec.loads(reply)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(reply, dict) or not reply.get("ok"):
+        return None
+    return reply.get("object")
+
+
+@attr.s
+class ResponseCache:
+    """Cache of encoded responses, tagged by the resources they were read from.
+
+    Entries and tag versions are held in the process, or in Tile38 when a
+    `session` is given, so that every worker sees the writes of the others.
+    Tag versions are kept twice as long as entries, which bounds the time
+    a response can take to be built and still be cached.
+    """
+
+    maxsize: int = attr.ib(default=RESPONSE_CACHE_SIZE)
+    ttl: float = attr.ib(default=RESPONSE_CACHE_TTL)
+    max_bytes: int = attr.ib(default=RESPONSE_CACHE_MAX_BYTES)
+    session: Optional[Session] = attr.ib(default=None)
+    timer: Callable[[], float] = attr.ib(default=time.monotonic)
+
+    _entries: TTLCache = attr.ib(init=False)
+    _versions: Dict[str, Tuple[str, float]] = attr.ib(factory=dict, init=False)
+    _lock: threading.Lock = attr.ib(factory=threading.Lock, init=False)
+
+    # cache of the process, shared by the middleware and the database logic
+    _default: ClassVar[Optional["ResponseCache"]] = None
+
+    @_entries.default
+    def _make_entries(self):
+        return TTLCache(maxsize=self.maxsize, ttl=self.ttl, timer=self.timer)
+
+    @classmethod
+    def create_from_env(cls, session: Optional[Session] = None):
+        """Create from environment.
+
+        Entries are shared through Tile38 when RESPONSE_CACHE_SHARED is set,
+        on the connections of `session`.
+        """
+        if cls._default is None:
+            if RESPONSE_CACHE_SHARED:
+                cls._default = cls(session=session or Session.create_from_env())
+            else:
+                cls._default = cls()
+        return cls._default
+
+    @property
+    def enabled(self) -> bool:
+        """Check whether responses are cached."""
+        return self.maxsize > 0 and self.ttl > 0
+
+    @staticmethod
+    def key(method: str, url: str, params: Iterable, body=None) -> str:
+        """Make the key of a request.
+
+        Requests differing only by the order of their query parameters or the
+        formatting of their JSON body have the same key.
+        """
+        document = [method, url, sorted(params), body]
+        return hashlib.sha256(
+            codec.dumps(document, sort_keys=True).encode()
+        ).hexdigest()
+
+    async def get(
+        self, key: str, tags: List[str]
+    ) -> Tuple[Optional[CachedResponse], Dict[str, str]]:
+        """Get the entry of a key, if fresh, and the current versions of `tags`.
+
+        The versions are those to store with a response built after the call.
+        """
+        tags = [ALL_TAG, *tags]
+        if self.session is None:
+            entry = self._entries.get(key)
+            versions = self._local_versions(tags)
+        else:
+            pipe = self.session.pipeline_client.pipeline(transaction=False)
+            pipe.execute_command("GET", RESPONSES_KEY, key)
+            for tag in tags:
+                pipe.execute_command("GET", RESPONSE_TAGS_KEY, tag)
+            document, *replies = await pipe.execute()
+            document = _tile38_string(document)
+            entry = CachedResponse.loads(document) if document else None
+            versions = {tag: _tile38_string(r) or "" for tag, r in zip(tags, replies)}
+        if entry is not None and entry.versions != versions:
+            entry = None
+        return entry, versions
+
+    async def set(self, key: str, entry: CachedResponse) -> None:
+        """Store an entry, unless its body is over `max_bytes`."""
+        if len(entry.body) > self.max_bytes:
+            return
+        if self.session is None:
+            self._entries.set(key, entry)
+        else:
+            await self.session.pipeline_client.execute_command(
+                "SET", RESPONSES_KEY, key, "EX", self.ttl, "STRING", entry.dumps()
+            )
+
+    async def invalidate(self, *tags: str) -> None:
+        """Invalidate the entries of some tags, or every entry when none is given."""
+        if self.session is None:
+            self._bump_local_versions(tags or (ALL_TAG,))
+            return
+        pipe = self.session.pipeline_client.pipeline(transaction=False)
+        for command in self._bump_commands(tags or (ALL_TAG,)):
+            pipe.execute_command(*command)
+        await pipe.execute()
+
+    def invalidate_commands(self, *tags: str) -> List[List]:
+        """Make the commands invalidating the shared entries of some tags.
+
+        There are none when entries are held by each process, whose entries
+        are invalidated with `evict`.
+        """
+        if self.session is None:
+            return []
+        return self._bump_commands(tags or (ALL_TAG,))
+
+    def sync_invalidate(self, *tags: str) -> None:
+        """Invalidate the entries of some tags from synchronous code."""
+        if self.session is None:
+            self._bump_local_versions(tags or (ALL_TAG,))
+            return
+        pipe = self.session.sync_pipeline_client.pipeline(transaction=False)
+        for command in self._bump_commands(tags or (ALL_TAG,)):
+            pipe.execute_command(*command)
+        pipe.execute()
+
+    def evict(self, tags: List[str]) -> None:
+        """Invalidate the entries of tags written by another worker.
+
+        Entries shared through Tile38 are already invalidated by the writer.
+        """
+        if self.session is None:
+            self._bump_local_versions(tags)
+
+    def _local_versions(self, tags: List[str]) -> Dict[str, str]:
+        now = self.timer()
+        versions = {}
+        for tag in tags:
+            version, expires = self._versions.get(tag, ("", 0.0))
+            versions[tag] = version if expires > now else ""
+        return versions
+
+    def _bump_local_versions(self, tags: Iterable[str]) -> None:
+        now = self.timer()
+        with self._lock:
+            if len(self._versions) > self.maxsize:
+                self._versions = {
+                    tag: version
+                    for tag, version in self._versions.items()
+                    if version[1] > now
+                }
+            for tag in tags:
+                self._versions[tag] = (uuid.uuid4().hex, now + 2 * self.ttl)
+
+    def _bump_commands(self, tags: Iterable[str]) -> List[List]:
+        return [
+            [
+                "SET",
+                RESPONSE_TAGS_KEY,
+                tag,
+                "EX",
+                2 * self.ttl,
+                "STRING",
+                uuid.uuid4().hex,
+            ]
+            for tag in tags
+        ]
+
+
+# read routes, by the tags of their responses
+_COLLECTIONS = re.compile(r"^/collections/?$")
+_COLLECTION = re.compile(r"^/collections/(?P<collection_id>[^/]+)/?$")
+_ITEMS = re.compile(r"^/collections/(?P<collection_id>[^/]+)/items/?$")
+_ITEM = re.compile(
+    r"^/collections/(?P<collection_id>[^/]+)/items/(?P<item_id>[^/]+)/?$"
+)
+_SEARCH = re.compile(r"^/search/?$")
+
+
+def _search_tags(collection_ids: Optional[List[str]]) -> List[str]:
+    if not collection_ids:
+        return [ITEMS_TAG]
+    tags = []
+    for collection_id in collection_ids:
+        tags.extend([collection_tag(collection_id), items_tag(collection_id)])
+    return tags
+
+
+def route_tags(method: str, path: str, params: List, body=None) -> Optional[List[str]]:
+    """Get the tags of the response to a read request, None if not cached."""
+    if method == "GET":
+        if _COLLECTIONS.match(path):
+            return [COLLECTIONS_TAG]
+        match = _COLLECTION.match(path)
+        if match:
+            return [collection_tag(match["collection_id"])]
+        match = _ITEMS.match(path)
+        if match:
+            collection_id = match["collection_id"]
+            return [collection_tag(collection_id), items_tag(collection_id)]
+        match = _ITEM.match(path)
+        if match:
+            collection_id = match["collection_id"]
+            return [
+                collection_tag(collection_id),
+                item_tag(collection_id, match["item_id"]),
+            ]
+    if _SEARCH.match(path):
+        if method == "GET":
+            collection_ids = [
+                collection_id
+                for name, value in params
+                if name == "collections"
+                for collection_id in value.split(",")
+                if collection_id
+            ]
+            return _search_tags(collection_ids)
+        if method == "POST" and isinstance(body, dict):
+            collection_ids = body.get("collections")
+            if collection_ids is None or isinstance(collection_ids, list):
+                return _search_tags(collection_ids)
+    return None
+
+
+class ResponseCacheMiddleware:
+    """Serve the read endpoints from the response cache, with ETags.
+
+    Responses are cached when they are successful and sent in one piece,
+    streamed responses are passed through. Requests whose If-None-Match
+    header holds the ETag of the response get an empty 304 response.
+    """
+
+    def __init__(self, app: ASGIApp, cache: Optional[ResponseCache] = None):
+        """Wrap an ASGI app."""
+        self.app = app
+        self.cache = cache or ResponseCache.create_from_env()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Handle one request."""
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in ("GET", "POST")
+            or not self.cache.enabled
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        if scope["method"] == "POST" and not _SEARCH.match(scope["path"]):
+            # searches are the only cached POST requests, transaction and
+            # bulk bodies are left to the app without being read
+            await self.app(scope, receive, send)
+            return
+
+        params = parse_qsl(
+            scope.get("query_string", b"").decode(), keep_blank_values=True
+        )
+        body = None
+        if scope["method"] == "POST":
+            raw_body, receive = await self._read_body(receive)
+            try:
+                body = codec.loads(raw_body)
+            except ValueError:
+                await self.app(scope, receive, send)
+                return
+
+        tags = route_tags(scope["method"], scope["path"], params, body)
+        if tags is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        host = headers.get("host", "")
+        url = f"{scope.get('scheme', 'http')}://{host}{scope.get('root_path', '')}{scope['path']}"
+        key = self.cache.key(scope["method"], url, params, body)
+        entry, versions = await self.cache.get(key, tags)
+        if entry is None:
+            entry = await self._call_and_capture(scope, receive, send, versions)
+            if entry is None:
+                return
+            await self.cache.set(key, entry)
+        await self._send_entry(entry, headers.get("if-none-match"), send)
+
+    @staticmethod
+    async def _read_body(receive: Receive) -> Tuple[bytes, Receive]:
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        body = b"".join(chunks)
+        sent = False
+
+        async def replay() -> Message:
+            nonlocal sent
+            if sent:
+                return await receive()
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        return body, replay
+
+    async def _call_and_capture(
+        self, scope: Scope, receive: Receive, send: Send, versions: Dict[str, str]
+    ) -> Optional[CachedResponse]:
+        """Call the app, and make an entry of a successful response sent at once.
+
+        Other responses are forwarded as they are sent, and None is returned.
+        """
+        start: Optional[Message] = None
+        passthrough = False
+        chunks: List[bytes] = []
+
+        async def capture(message: Message) -> None:
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+            elif message["type"] == "http.response.start":
+                start = message
+                response_headers = Headers(raw=message.get("headers", []))
+                if message["status"] != 200 or "content-length" not in response_headers:
+                    passthrough = True
+                    await send(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                if message.get("more_body", False):
+                    passthrough = True
+                    await send(start)
+                    await send({**message, "body": b"".join(chunks)})
+
+        await self.app(scope, receive, capture)
+        if passthrough or start is None:
+            return None
+        media_type = Headers(raw=start.get("headers", [])).get(
+            "content-type", "application/json"
+        )
+        return CachedResponse.from_body(b"".join(chunks), media_type, versions)
+
+    @staticmethod
+    async def _send_entry(
+        entry: CachedResponse, if_none_match: Optional[str], send: Send
+    ):
+        headers = MutableHeaders()
+        headers["etag"] = entry.etag
+        if etag_matches(if_none_match, entry.etag):
+            await send(
+                {"type": "http.response.start", "status": 304, "headers": headers.raw}
+            )
+            await send({"type": "http.response.body", "body": b""})
+            return
+        headers["content-type"] = entry.media_type
+        headers["content-length"] = str(len(entry.body))
+        await send(
+            {"type": "http.response.start", "status": 200, "headers": headers.raw}
+        )
+        await send({"type": "http.response.body", "body": entry.body})
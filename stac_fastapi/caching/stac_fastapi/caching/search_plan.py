@@ -0,0 +1,60 @@
+"""Search planning."""
+from typing import Any, Dict, List, Optional
+
+import attr
+
+# access paths of a search plan, from the most to the least selective; nearby
+# searches are ordered by distance, so they take precedence
+ACCESS_NEARBY = "nearby"
+ACCESS_IDS = "ids"
+ACCESS_INTERSECTS = "intersects"
+ACCESS_SCAN = "scan"
+
+
+@attr.s
+class SearchPlan:
+    """Filters of one search, run as a single Tile38 command per collection key.
+
+    The plan is built by the `apply_*_filter` methods of `DatabaseLogic` and
+    executed by `DatabaseLogic.execute_search`.
+    """
+
+    ids: Optional[List[str]] = attr.ib(default=None)
+    collection_ids: Optional[List[str]] = attr.ib(default=None)
+    datetime_search: Optional[Dict] = attr.ib(default=None)
+    geometry: Optional[Dict] = attr.ib(default=None)
+    # [west, south, east, north] when the geometry is a bbox
+    bbox: Optional[List[float]] = attr.ib(default=None)
+    query: Dict[str, Dict[str, Any]] = attr.ib(factory=dict)
+    # {"lon", "lat", "distance"} of a search of the items closest to a point
+    nearby: Optional[Dict[str, Any]] = attr.ib(default=None)
+    # set by a filter no item can match
+    empty: bool = attr.ib(default=False)
+
+    @property
+    def access_path(self) -> str:
+        """Pick how the items of the plan are read.
+
+        Ids are looked up directly, unless a geometry is also given: Tile38
+        can't test a single object against an area, so the spatial index is
+        used and the ids are checked on the returned items instead.
+        """
+        if self.nearby:
+            return ACCESS_NEARBY
+        if self.geometry:
+            return ACCESS_INTERSECTS
+        if self.ids:
+            return ACCESS_IDS
+        return ACCESS_SCAN
+
+    def fingerprint_args(self) -> List[Any]:
+        """Return the parameters identifying the results of the plan."""
+        return [
+            self.access_path,
+            self.ids,
+            self.collection_ids,
+            self.datetime_search,
+            self.geometry,
+            self.query,
+            self.nearby,
+        ]
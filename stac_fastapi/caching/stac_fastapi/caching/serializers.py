@@ -1,12 +1,13 @@
 """Serializers."""
 import abc
-from typing import TypedDict
+from typing import Optional, TypedDict
 
 import attr
 
 from stac_fastapi.caching.datetime_utils import now_to_rfc3339_str
+from stac_fastapi.caching.models.links import link_templates
+from stac_fastapi.caching.simplify import response_geometry
 from stac_fastapi.types import stac as stac_types
-from stac_fastapi.types.links import CollectionLinks, ItemLinks, resolve_links
 
 
 @attr.s  # type:ignore
@@ -26,12 +27,9 @@ class ItemSerializer(Serializer):
     @classmethod
     def stac_to_db(cls, stac_data: stac_types.Item, base_url: str) -> stac_types.Item:
         """Transform STAC Item to database-ready STAC Item."""
-        item_links = ItemLinks(
-            collection_id=stac_data["collection"],
-            item_id=stac_data["id"],
-            base_url=base_url,
-        ).create_links()
-        stac_data["links"] = item_links
+        stac_data["links"] = link_templates(base_url).item_links(
+            stac_data["collection"], stac_data["id"]
+        )
 
         # elasticsearch doesn't like the fact that some values are float and some were int
         if "eo:bands" in stac_data["properties"]:
@@ -48,17 +46,26 @@ class ItemSerializer(Serializer):
         return stac_data
 
     @classmethod
-    def db_to_stac(cls, item: dict, base_url: str) -> stac_types.Item:
-        """Transform database model to stac item."""
+    def db_to_stac(
+        cls,
+        item: dict,
+        base_url: str,
+        simplify: Optional[float] = None,
+        precision: Optional[int] = None,
+    ) -> stac_types.Item:
+        """Transform database model to stac item.
+
+        The geometry is simplified with the `simplify` tolerance in degrees,
+        and its coordinates rounded to `precision` decimals, when given.
+        """
         item_id = item["id"]
         collection_id = item["collection"]
-        item_links = ItemLinks(
-            collection_id=collection_id, item_id=item_id, base_url=base_url
-        ).create_links()
+        templates = link_templates(base_url)
+        item_links = templates.item_links(collection_id, item_id)
 
         original_links = item["links"]
         if original_links:
-            item_links += resolve_links(original_links, base_url)
+            item_links += templates.resolve_links(original_links)
 
         return stac_types.Item(
             type="Feature",
@@ -68,7 +75,9 @@ class ItemSerializer(Serializer):
             else [],
             id=item_id,
             collection=item["collection"] if "collection" in item else "",
-            geometry=item["geometry"] if "geometry" in item else {},
+            geometry=response_geometry(item, simplify, precision)
+            if "geometry" in item
+            else {},
             bbox=item["bbox"] if "bbox" in item else [],
             properties=item["properties"] if "properties" in item else {},
             links=item_links if "links" in item else [],
@@ -82,13 +91,12 @@ class CollectionSerializer(Serializer):
     @classmethod
     def db_to_stac(cls, collection: dict, base_url: str) -> stac_types.Collection:
         """Transform database model to stac collection."""
-        collection_links = CollectionLinks(
-            collection_id=collection["id"], base_url=base_url
-        ).create_links()
+        templates = link_templates(base_url)
+        collection_links = templates.collection_links(collection["id"])
 
         original_links = collection["links"]
         if original_links:
-            collection_links += resolve_links(original_links, base_url)
+            collection_links += templates.resolve_links(original_links)
 
         return stac_types.Collection(
             type="Collection",
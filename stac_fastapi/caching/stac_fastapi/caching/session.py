@@ -1,36 +1,258 @@
 """database session management."""
+import asyncio
 import logging
-from contextlib import contextmanager
+import time
+from typing import ClassVar, Dict, List, Optional, Tuple
 
 import attr
-from fastapi_utils.session import FastAPISessionMaker as _FastAPISessionMaker
+import redis
+import redis.asyncio as aioredis
+from pyle38 import Tile38
+from pyle38.errors import Tile38NotCaughtUpError
+from redis.asyncio.retry import Retry as AsyncRetry
+from redis.backoff import ExponentialBackoff
+from redis.exceptions import ConnectionError, TimeoutError
+from redis.retry import Retry
+
+from stac_fastapi.caching import codec, config
 
 logger = logging.getLogger(__name__)
 
+# errors after which a Tile38 command is retried on a new connection
+RETRY_ON_ERROR = [ConnectionError, TimeoutError]
+
 
-class FastAPISessionMaker(_FastAPISessionMaker):
-    """FastAPISessionMaker."""
+def _on_connect_json(connection: redis.Connection):
+    """Set the OUTPUT of a new Tile38 connection to JSON."""
+    connection.on_connect()
+    connection.send_command("OUTPUT", "json")
+    connection.read_response()
 
-    @contextmanager
-    def context_session(self):
-        """Override base method to include exception handling."""
-        ...
+
+async def _on_connect_json_async(connection: aioredis.Connection):
+    """Set the OUTPUT of a new async Tile38 connection to JSON."""
+    await connection.on_connect()
+    await connection.send_command("OUTPUT", "json")
+    await connection.read_response()
 
 
 @attr.s
 class Session:
-    """Database session management."""
+    """Tile38 connections of one API worker.
+
+    The clients are created on first use, so creating a session opens no
+    socket. Raw commands share pools of at most `max_connections`
+    connections, waiting up to `pool_timeout` seconds for a free one, and
+    are retried `retries` times with exponential backoff when the
+    connection fails.
+
+    Reads may be sent to the `followers`, `host:port` addresses taken in
+    turn. Followers get no retries: a follower that fails or lags behind is
+    left out of the rotation for `follower_cooldown` seconds and the read
+    goes to the leader instead. Once connected, the session checks every
+    `follower_check_interval` seconds that each follower is caught up with
+    the leader, and after a write, sends the reads of the worker to the
+    leader for `leader_reads_after_write` seconds.
+    """
+
+    host: str = attr.ib(default=config.DOMAIN or "localhost")
+    port: int = attr.ib(default=int(config.PORT or 9851))
+    max_connections: int = attr.ib(default=config.TILE38_MAX_CONNECTIONS)
+    pool_timeout: float = attr.ib(default=config.TILE38_POOL_TIMEOUT)
+    retries: int = attr.ib(default=config.TILE38_RETRIES)
+    backoff_base: float = attr.ib(default=0.05)
+    backoff_cap: float = attr.ib(default=2.0)
+    followers: List[str] = attr.ib(factory=lambda: list(config.TILE38_FOLLOWERS))
+    follower_cooldown: float = attr.ib(default=config.TILE38_FOLLOWER_COOLDOWN)
+    follower_check_interval: float = attr.ib(
+        default=config.TILE38_FOLLOWER_CHECK_INTERVAL
+    )
+    leader_reads_after_write: float = attr.ib(
+        default=config.TILE38_LEADER_READS_AFTER_WRITE
+    )
+
+    _client: Optional[Tile38] = attr.ib(default=None, init=False)
+    _pipeline_client: Optional[aioredis.Redis] = attr.ib(default=None, init=False)
+    _sync_pipeline_client: Optional[redis.Redis] = attr.ib(default=None, init=False)
+    _follower_clients: Dict[str, aioredis.Redis] = attr.ib(factory=dict, init=False)
+    _followers_down: Dict[str, float] = attr.ib(factory=dict, init=False)
+    _next_follower: int = attr.ib(default=0, init=False)
+    _leader_reads_until: float = attr.ib(default=0, init=False)
+    _follower_checks: Optional[asyncio.Task] = attr.ib(default=None, init=False)
+
+    # session of the process, shared by everything created from the environment
+    _default: ClassVar[Optional["Session"]] = None
 
     @classmethod
     def create_from_env(cls):
         """Create from environment."""
-        ...
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
 
     @classmethod
     def create_from_settings(cls, settings):
         """Create a Session object from settings."""
-        ...
+        return cls()
+
+    @property
+    def url(self) -> str:
+        """Get the Tile38 url."""
+        return f"redis://{self.host}:{self.port}"
+
+    @property
+    def client(self) -> Tile38:
+        """Get the pyle38 client, used to build commands."""
+        if self._client is None:
+            follower_url = (
+                f"redis://{self.followers[0]}" if self.followers else self.url
+            )
+            self._client = Tile38(url=self.url, follower_url=follower_url)
+        return self._client
+
+    def _connection_kwargs(self, retry_class, retries: Optional[int] = None):
+        return dict(
+            host=self.host,
+            port=self.port,
+            max_connections=self.max_connections,
+            timeout=self.pool_timeout,
+            decode_responses=True,
+            retry=retry_class(
+                ExponentialBackoff(cap=self.backoff_cap, base=self.backoff_base),
+                self.retries if retries is None else retries,
+            ),
+            retry_on_error=RETRY_ON_ERROR,
+        )
+
+    @property
+    def pipeline_client(self) -> aioredis.Redis:
+        """Get the redis client sending raw and pipelined Tile38 commands."""
+        if self._pipeline_client is None:
+            pool = aioredis.BlockingConnectionPool(
+                redis_connect_func=_on_connect_json_async,
+                **self._connection_kwargs(AsyncRetry),
+            )
+            self._pipeline_client = aioredis.Redis(connection_pool=pool)
+            # tile38 replies are parsed by the codec, not by the redis callbacks
+            self._pipeline_client.response_callbacks.clear()
+        return self._pipeline_client
+
+    @property
+    def sync_pipeline_client(self) -> redis.Redis:
+        """Get the redis client sending Tile38 commands from synchronous code."""
+        if self._sync_pipeline_client is None:
+            pool = redis.BlockingConnectionPool(
+                redis_connect_func=_on_connect_json,
+                **self._connection_kwargs(Retry),
+            )
+            self._sync_pipeline_client = redis.Redis(connection_pool=pool)
+            self._sync_pipeline_client.response_callbacks.clear()
+        return self._sync_pipeline_client
+
+    def pubsub(self) -> aioredis.client.PubSub:
+        """Open a connection subscribing to Tile38 channels.
+
+        It is not taken from the pools, as it is held for as long as it
+        listens, and keeps the RESP output the subscription replies need.
+        """
+        client = aioredis.Redis(host=self.host, port=self.port, decode_responses=True)
+        return client.pubsub()
+
+    def _follower(self, address: str) -> aioredis.Redis:
+        """Get the client of a follower."""
+        if address not in self._follower_clients:
+            host, _, port = address.rpartition(":")
+            kwargs = self._connection_kwargs(AsyncRetry, retries=0)
+            kwargs.update(host=host, port=int(port))
+            pool = aioredis.BlockingConnectionPool(
+                redis_connect_func=_on_connect_json_async, **kwargs
+            )
+            client = aioredis.Redis(connection_pool=pool)
+            client.response_callbacks.clear()
+            self._follower_clients[address] = client
+        return self._follower_clients[address]
+
+    def follower_client(self) -> Optional[Tuple[str, aioredis.Redis]]:
+        """Get the next follower in the rotation and its client.
+
+        Returns None when there is no follower, all of them are left out of
+        the rotation, or the worker wrote less than `leader_reads_after_write`
+        seconds ago.
+        """
+        now = time.monotonic()
+        if self._leader_reads_until > now:
+            return None
+        for _ in range(len(self.followers)):
+            address = self.followers[self._next_follower % len(self.followers)]
+            self._next_follower += 1
+            if self._followers_down.get(address, 0) > now:
+                continue
+            return address, self._follower(address)
+        return None
+
+    def wrote(self) -> None:
+        """Send the reads to the leader for `leader_reads_after_write` seconds."""
+        if self.followers:
+            self._leader_reads_until = time.monotonic() + self.leader_reads_after_write
+
+    def follower_failed(self, address: str, error: Exception) -> None:
+        """Leave a follower out of the rotation for `follower_cooldown` seconds."""
+        logger.warning(
+            f"Tile38 follower {address} failed, reading from leader: {error}"
+        )
+        self._followers_down[address] = time.monotonic() + self.follower_cooldown
+
+    async def check_followers(self) -> None:
+        """Leave the followers lagging behind the leader out of the rotation.
+
+        A follower replying to `SERVER` that it is not caught up is left out
+        for `follower_cooldown` seconds, like a failing one.
+        """
+        for address in self.followers:
+            try:
+                reply = codec.loads(
+                    await self._follower(address).execute_command("SERVER")
+                )
+            except Exception as e:
+                self.follower_failed(address, e)
+                continue
+            if not reply.get("ok") or not reply["stats"].get("caught_up", True):
+                self.follower_failed(address, Tile38NotCaughtUpError("not caught up"))
+
+    async def _check_followers(self) -> None:
+        while True:
+            await self.check_followers()
+            await asyncio.sleep(self.follower_check_interval)
+
+    async def connect(self) -> None:
+        """Open a first connection, retrying with backoff until Tile38 answers.
+
+        The followers are then checked in the background.
+        """
+        await self.pipeline_client.execute_command("PING")
+        logger.info(f"Connected to Tile38 at {self.url}")
+        if self.followers and self._follower_checks is None:
+            self._follower_checks = asyncio.create_task(self._check_followers())
+
+    async def close(self) -> None:
+        """Close every connection of the session.
 
-    def __attrs_post_init__(self):
-        """Post init handler."""
-        ...
+        Clients used afterwards open new connections.
+        """
+        if self._follower_checks is not None:
+            self._follower_checks.cancel()
+            self._follower_checks = None
+        if self._client is not None:
+            await self._client.quit()
+        if self._pipeline_client is not None:
+            await self._pipeline_client.connection_pool.disconnect()
+        if self._sync_pipeline_client is not None:
+            self._sync_pipeline_client.connection_pool.disconnect()
+        for client in self._follower_clients.values():
+            await client.connection_pool.disconnect()
+        self._client = None
+        self._pipeline_client = None
+        self._sync_pipeline_client = None
+        self._follower_clients = {}
+        self._followers_down = {}
+        logger.info(f"Closed the connections to Tile38 at {self.url}")
@@ -0,0 +1,158 @@
+"""Lighter GeoJSON geometries for responses.
+
+Geometries are simplified with the Douglas-Peucker algorithm, with planar
+tolerances in degrees, and their coordinates rounded to a number of
+decimals. The simplified geometries of the `SIMPLIFY_TOLERANCES` are
+computed when items are written and stored with them, under the
+`simplified_geometries` member, so responses only pick one.
+"""
+from typing import Dict, List, Optional, Sequence
+
+from stac_fastapi.caching.config import SIMPLIFY_TOLERANCES
+
+# member of the stored items holding their simplified geometries, by tolerance
+SIMPLIFIED_KEY = "simplified_geometries"
+
+Position = Sequence[float]
+
+
+def tolerance_key(tolerance: float) -> str:
+    """Get the key of the simplified geometry of a tolerance."""
+    return repr(float(tolerance))
+
+
+def _segment_distance(p: Position, a: Position, b: Position) -> float:
+    """Get the planar distance from `p` to the segment from `a` to `b`."""
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    length = dx * dx + dy * dy
+    t = 0.0
+    if length:
+        t = ((p[0] - a[0]) * dx + (p[1] - a[1]) * dy) / length
+        t = min(max(t, 0.0), 1.0)
+    x, y = a[0] + t * dx - p[0], a[1] + t * dy - p[1]
+    return (x * x + y * y) ** 0.5
+
+
+def _simplify_line(line: List[Position], tolerance: float) -> List[Position]:
+    """Keep the positions of a line further than `tolerance` from the others."""
+    if len(line) < 3:
+        return line
+    keep = [False] * len(line)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(line) - 1)]
+    while stack:
+        first, last = stack.pop()
+        farthest, distance = first, tolerance
+        for i in range(first + 1, last):
+            d = _segment_distance(line[i], line[first], line[last])
+            if d > distance:
+                farthest, distance = i, d
+        if farthest != first:
+            keep[farthest] = True
+            stack.append((first, farthest))
+            stack.append((farthest, last))
+    return [position for position, kept in zip(line, keep) if kept]
+
+
+def _simplify_ring(ring: List[Position], tolerance: float) -> List[Position]:
+    # a ring keeps at least a triangle, or is left as it is
+    simplified = _simplify_line(ring, tolerance)
+    return simplified if len(simplified) >= 4 else ring
+
+
+def simplify_geometry(geometry: Dict, tolerance: float) -> Dict:
+    """Simplify a GeoJSON geometry, with a tolerance in degrees."""
+    kind = geometry["type"]
+    if kind == "GeometryCollection":
+        geometries = [simplify_geometry(g, tolerance) for g in geometry["geometries"]]
+        return {"type": kind, "geometries": geometries}
+    coordinates = geometry["coordinates"]
+    if kind == "LineString":
+        coordinates = _simplify_line(coordinates, tolerance)
+    elif kind == "MultiLineString":
+        coordinates = [_simplify_line(line, tolerance) for line in coordinates]
+    elif kind == "Polygon":
+        coordinates = [_simplify_ring(ring, tolerance) for ring in coordinates]
+    elif kind == "MultiPolygon":
+        coordinates = [
+            [_simplify_ring(ring, tolerance) for ring in polygon]
+            for polygon in coordinates
+        ]
+    return {"type": kind, "coordinates": coordinates}
+
+
+# nesting depth of the positions in the coordinates of each geometry type
+DEPTHS = {
+    "Point": 0,
+    "MultiPoint": 1,
+    "LineString": 1,
+    "MultiLineString": 2,
+    "Polygon": 2,
+    "MultiPolygon": 3,
+}
+
+
+def _round(coordinates, depth: int, factor: float):
+    if depth == 0:
+        # twice as fast as round(value, precision), with the same shortest repr
+        return [round(value * factor) / factor for value in coordinates]
+    return [_round(c, depth - 1, factor) for c in coordinates]
+
+
+def round_geometry(geometry: Dict, precision: int) -> Dict:
+    """Round the coordinates of a GeoJSON geometry to `precision` decimals."""
+    kind = geometry["type"]
+    if kind == "GeometryCollection":
+        geometries = [round_geometry(g, precision) for g in geometry["geometries"]]
+        return {"type": kind, "geometries": geometries}
+    coordinates = _round(geometry["coordinates"], DEPTHS[kind], 10.0**precision)
+    return {"type": kind, "coordinates": coordinates}
+
+
+def _positions(geometry: Dict) -> int:
+    kind = geometry["type"]
+    if kind == "GeometryCollection":
+        return sum(_positions(g) for g in geometry["geometries"])
+    coordinates = [geometry["coordinates"]]
+    for _ in range(DEPTHS[kind]):
+        coordinates = [c for nested in coordinates for c in nested]
+    return len(coordinates)
+
+
+def simplified_geometries(
+    geometry: Optional[Dict], tolerances: Sequence[float] = SIMPLIFY_TOLERANCES
+) -> Dict[str, Dict]:
+    """Simplify a geometry with each tolerance, to store it with its item.
+
+    Only the geometries with fewer positions than the original are kept.
+    """
+    if not geometry:
+        return {}
+    positions = _positions(geometry)
+    simplified = {}
+    for tolerance in tolerances:
+        candidate = simplify_geometry(geometry, tolerance)
+        if _positions(candidate) < positions:
+            simplified[tolerance_key(tolerance)] = candidate
+    return simplified
+
+
+def response_geometry(
+    item: Dict, simplify: Optional[float] = None, precision: Optional[int] = None
+) -> Optional[Dict]:
+    """Get the geometry of a stored item, simplified and rounded as asked.
+
+    Items stored without simplified geometries are simplified on the fly.
+    """
+    geometry = item.get("geometry")
+    if not geometry:
+        return geometry
+    if simplify:
+        stored = item.get(SIMPLIFIED_KEY)
+        if stored is None:
+            geometry = simplify_geometry(geometry, simplify)
+        else:
+            geometry = stored.get(tolerance_key(simplify), geometry)
+    if precision is not None:
+        geometry = round_geometry(geometry, precision)
+    return geometry
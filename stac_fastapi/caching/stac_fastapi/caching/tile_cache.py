@@ -0,0 +1,144 @@
+"""Cache of the items of web mercator tiles, for bbox searches.
+
+A bbox search is covered by the XYZ tiles of one zoom level, the deepest
+covering it in at most `max_tiles` tiles. The ids and bounds of the items
+of each tile of a collection are read once with a Tile38 INTERSECTS on the
+tile and cached, so that the overlapping and tile aligned bboxes of map
+clients are answered from the cache, then checked exactly against the
+geometries of the items.
+
+Entries are keyed by a generation of their collection. Writes bump it
+instead of looking for the tiles of what they changed, so a tile read
+during a write is stored under the old generation and never served.
+"""
+import math
+import threading
+import time
+from typing import Callable, ClassVar, Dict, Hashable, List, Optional, Tuple
+
+import attr
+
+from stac_fastapi.caching.cache import TTLCache
+from stac_fastapi.caching.config import (
+    TILE_CACHE_MAX_ITEMS,
+    TILE_CACHE_MAX_TILES,
+    TILE_CACHE_MAX_ZOOM,
+    TILE_CACHE_MIN_ZOOM,
+    TILE_CACHE_SIZE,
+    TILE_CACHE_TTL,
+)
+from stac_fastapi.caching.response_cache import ALL_TAG, tag_collection_id
+
+# latitudes out of the web mercator projection are not covered by tiles
+MAX_LATITUDE = 85.0511287798066
+
+# ids and [west, south, east, north] bounds of the items of a tile, or None
+# when the tile holds more than `max_items` items
+TileEntries = Optional[List[Tuple[str, List[float]]]]
+Tile = Tuple[int, int, int]
+
+
+def _tile_x(lon: float, zoom: int) -> float:
+    return (lon + 180) / 360 * 2**zoom
+
+
+def _tile_y(lat: float, zoom: int) -> float:
+    lat = math.radians(lat)
+    return (1 - math.asinh(math.tan(lat)) / math.pi) / 2 * 2**zoom
+
+
+def bbox_tiles(bbox: List[float], zoom: int) -> List[Tile]:
+    """Get the `(x, y, zoom)` tiles covering a bbox."""
+    west, south, east, north = bbox
+    last = 2**zoom - 1
+    # a bbox ending on the edge of a tile does not reach the next one
+    x0 = int(_tile_x(west, zoom))
+    x1 = max(x0, min(math.ceil(_tile_x(east, zoom)) - 1, last))
+    y0 = int(_tile_y(north, zoom))
+    y1 = max(y0, min(math.ceil(_tile_y(south, zoom)) - 1, last))
+    return [(x, y, zoom) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+@attr.s
+class TileCache:
+    """Ids and bounds of the items of tiles, per collection.
+
+    Like the collection cache, entries are held by each process: the other
+    processes evict theirs when told by the cache invalidation channel.
+    """
+
+    maxsize: int = attr.ib(default=TILE_CACHE_SIZE)
+    ttl: float = attr.ib(default=TILE_CACHE_TTL)
+    max_items: int = attr.ib(default=TILE_CACHE_MAX_ITEMS)
+    min_zoom: int = attr.ib(default=TILE_CACHE_MIN_ZOOM)
+    max_zoom: int = attr.ib(default=TILE_CACHE_MAX_ZOOM)
+    max_tiles: int = attr.ib(default=TILE_CACHE_MAX_TILES)
+    timer: Callable[[], float] = attr.ib(default=time.monotonic)
+
+    _entries: TTLCache = attr.ib(init=False)
+    _generation: int = attr.ib(default=0, init=False)
+    _generations: Dict[str, int] = attr.ib(factory=dict, init=False)
+    _lock: threading.Lock = attr.ib(factory=threading.Lock, init=False)
+
+    # cache of the process, shared by the database logic and the app
+    _default: ClassVar[Optional["TileCache"]] = None
+
+    @_entries.default
+    def _make_entries(self):
+        return TTLCache(maxsize=self.maxsize, ttl=self.ttl, timer=self.timer)
+
+    @classmethod
+    def create_from_env(cls):
+        """Create from environment."""
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    def cover(self, bbox: List[float]) -> Optional[List[Tile]]:
+        """Get the tiles of the deepest zoom level covering a bbox.
+
+        Returns None when the cache is disabled, or the bbox crosses the
+        antimeridian, goes beyond the latitudes of the projection or needs
+        more than `max_tiles` tiles at `min_zoom`.
+        """
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return None
+        west, south, east, north = bbox
+        if not (-180 <= west <= east <= 180 and -MAX_LATITUDE <= south <= north):
+            return None
+        if north > MAX_LATITUDE:
+            return None
+        for zoom in range(self.max_zoom, self.min_zoom - 1, -1):
+            tiles = bbox_tiles(bbox, zoom)
+            if len(tiles) <= self.max_tiles:
+                return tiles
+        return None
+
+    def key(self, collection_id: str, tile: Tile) -> Hashable:
+        """Make the key of a tile of a collection, in its current generation."""
+        generation = self._generations.get(collection_id, 0)
+        return (self._generation, collection_id, generation, *tile)
+
+    def get(self, key: Hashable, default=None) -> TileEntries:
+        """Get the entries of a tile, or `default`."""
+        return self._entries.get(key, default)
+
+    def set(self, key: Hashable, entries: TileEntries) -> None:
+        """Store the entries of a tile."""
+        self._entries.set(key, entries)
+
+    def evict(self, tags: List[str]) -> None:
+        """Give new generations to the collections of some response cache tags."""
+        with self._lock:
+            for tag in tags:
+                if tag == ALL_TAG:
+                    self._generation += 1
+                    self._generations.clear()
+                    self._entries.invalidate()
+                    return
+                collection_id = tag_collection_id(
+                    tag, kinds=("collection", "items", "item")
+                )
+                if collection_id is not None:
+                    generation = self._generations.get(collection_id, 0)
+                    self._generations[collection_id] = generation + 1
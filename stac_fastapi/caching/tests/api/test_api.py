@@ -1,8 +1,37 @@
+import asyncio
 import copy
 import uuid
 from datetime import datetime, timedelta
 
 import pytest
+from redis.exceptions import ConnectionError
+
+from stac_fastapi.caching import codec
+from stac_fastapi.caching.core import CoreClient
+from stac_fastapi.caching.database_logic import DatabaseLogic
+from stac_fastapi.caching.geometry import intersects_bbox
+from stac_fastapi.caching.invalidation import InvalidationBus
+from stac_fastapi.caching.models.links import link_templates
+from stac_fastapi.caching.response_cache import (
+    ALL_TAG,
+    CachedResponse,
+    ResponseCache,
+    ResponseCacheMiddleware,
+    collection_tag,
+    collection_write_tags,
+    item_write_tags,
+    items_tag,
+)
+from stac_fastapi.caching.session import Session
+from stac_fastapi.caching.simplify import (
+    SIMPLIFIED_KEY,
+    response_geometry,
+    round_geometry,
+    simplified_geometries,
+    simplify_geometry,
+)
+from stac_fastapi.caching.tile_cache import TileCache, bbox_tiles
+from stac_fastapi.types.links import CollectionLinks, ItemLinks, resolve_links
 
 from ..conftest import MockRequest, create_collection, create_item
 
@@ -20,6 +49,8 @@ ROUTES = {
     "GET /collections/{collection_id}",
     "GET /collections/{collection_id}/items",
     "GET /collections/{collection_id}/items/{item_id}",
+    "GET /collections/{collection_id}/items.ndjson",
+    "GET /metrics",
     "GET /search",
     "POST /search",
     "DELETE /collections/{collection_id}",
@@ -121,7 +152,6 @@ async def test_app_fields_extension(load_test_data, app_client, txn_client):
     txn_client.delete_item(item["id"], item["collection"])
 
 
-@pytest.mark.skip(reason="Query not implemented")
 async def test_app_query_extension_gt(app_client, ctx):
     params = {"query": {"proj:epsg": {"gt": ctx.item["properties"]["proj:epsg"]}}}
     resp = await app_client.post("/search", json=params)
@@ -130,7 +160,6 @@ async def test_app_query_extension_gt(app_client, ctx):
     assert len(resp_json["features"]) == 0
 
 
-@pytest.mark.skip(reason="Query not implemented")
 async def test_app_query_extension_gte(app_client, ctx):
     params = {"query": {"proj:epsg": {"gte": ctx.item["properties"]["proj:epsg"]}}}
     resp = await app_client.post("/search", json=params)
@@ -204,7 +233,6 @@ async def test_search_point_intersects(app_client, ctx):
     assert len(resp_json["features"]) == 1
 
 
-@pytest.mark.skip(reason="Date search not implemented")
 async def test_datetime_non_interval(app_client, ctx):
     dt_formats = [
         "2020-02-12T12:30:22+00:00",
@@ -238,7 +266,6 @@ async def test_bbox_3d(app_client, ctx):
     assert len(resp_json["features"]) == 1
 
 
-@pytest.mark.skip(reason="Line String inttersects not implemented")
 async def test_search_line_string_intersects(app_client, ctx):
     line = [[150.04, -33.14], [150.22, -33.89]]
     intersects = {"type": "LineString", "coordinates": line}
@@ -253,3 +280,668 @@ async def test_search_line_string_intersects(app_client, ctx):
 
     resp_json = resp.json()
     assert len(resp_json["features"]) == 1
+
+
+@pytest.mark.parametrize(
+    "intersects,matched",
+    [
+        ({"type": "MultiPoint", "coordinates": [[10, 50], [150.04, -33.14]]}, 1),
+        ({"type": "MultiPoint", "coordinates": [[10, 50], [11, 51]]}, 0),
+        (
+            {
+                "type": "MultiPolygon",
+                "coordinates": [
+                    [[[10, 50], [11, 50], [11, 51], [10, 50]]],
+                    [[[150, -33], [150.1, -33], [150.1, -33.1], [150, -33]]],
+                ],
+            },
+            1,
+        ),
+        (
+            {
+                "type": "MultiLineString",
+                "coordinates": [[[10, 50], [11, 51]], [[20, 50], [21, 49]]],
+            },
+            0,
+        ),
+    ],
+)
+async def test_search_multi_part_intersects(app_client, ctx, intersects, matched):
+    params = {"intersects": intersects, "collections": [ctx.item["collection"]]}
+    resp = await app_client.post("/search", json=params)
+    assert resp.status_code == 200
+    assert len(resp.json()["features"]) == matched
+
+
+async def test_search_nearby(app_client, ctx, txn_client):
+    """Test nearby searches return the closest items first"""
+    item = copy.deepcopy(ctx.item)
+    item["id"] = "test-item-far"
+    item["bbox"] = [b + 10 if i % 2 == 0 else b for i, b in enumerate(item["bbox"])]
+    for position in item["geometry"]["coordinates"][0]:
+        position[0] += 10
+    await create_item(txn_client, item)
+    point = [161, -33]
+    collections = [ctx.item["collection"]]
+
+    params = {"nearby": {"point": point}, "collections": collections}
+    resp = await app_client.post("/search", json=params)
+    assert resp.status_code == 200
+    ids = [feature["id"] for feature in resp.json()["features"]]
+    assert ids == ["test-item-far", ctx.item["id"]]
+
+    params["limit"] = 1
+    resp = await app_client.post("/search", json=params)
+    assert [feature["id"] for feature in resp.json()["features"]] == ids[:1]
+    next_link = next(link for link in resp.json()["links"] if link["rel"] == "next")
+    resp = await app_client.post("/search", json=next_link["body"])
+    assert [feature["id"] for feature in resp.json()["features"]] == ids[1:]
+
+    resp = await app_client.get(
+        "/search",
+        params={"nearby": "161,-33,100000", "collections": ",".join(collections)},
+    )
+    assert resp.status_code == 200
+    assert [feature["id"] for feature in resp.json()["features"]] == ids[:1]
+
+    resp = await app_client.get("/search", params={"nearby": "161"})
+    assert resp.status_code == 400
+
+    params = {
+        "nearby": {"point": point},
+        "intersects": {"type": "Point", "coordinates": point},
+    }
+    resp = await app_client.post("/search", json=params)
+    assert resp.status_code == 400
+
+
+def test_codec_round_trip():
+    """Test the codec encodes what the standard library does"""
+    document = {"id": "a", "bbox": [1.5, -2], "big": 2**70, "nested": {"b": None}}
+    assert codec.loads(codec.dumps(document)) == document
+    assert codec.dumps({"b": 1, "a": 2}, sort_keys=True).index('"a"') == 1
+
+
+@pytest.mark.parametrize("base_url", ["http://test-server/", "http://test/api/"])
+def test_link_templates(base_url):
+    """Test link templates build the links of stac_fastapi.types"""
+    templates = link_templates(base_url)
+    assert link_templates(base_url) is templates
+
+    assert (
+        templates.item_links("c-1", "item:1")
+        == ItemLinks(
+            collection_id="c-1", item_id="item:1", base_url=base_url
+        ).create_links()
+    )
+    assert (
+        templates.collection_links("c-1")
+        == CollectionLinks(collection_id="c-1", base_url=base_url).create_links()
+    )
+
+    links = [
+        {"rel": "self", "href": "collections/c-1"},
+        {"rel": "license", "href": "license.txt"},
+        {"rel": "via", "href": "https://example.com/a"},
+    ]
+    assert templates.resolve_links(copy.deepcopy(links)) == resolve_links(
+        copy.deepcopy(links), base_url
+    )
+
+
+async def test_session_pool_size(ctx):
+    """Test a session opens no more connections than the size of its pool"""
+    session = Session(max_connections=2)
+    database = DatabaseLogic(session=session)
+    await session.connect()
+    items = await asyncio.gather(
+        *(
+            database.get_one_item(ctx.item["collection"], ctx.item["id"])
+            for _ in range(20)
+        )
+    )
+    assert {item["id"] for item in items} == {ctx.item["id"]}
+    assert len(session.pipeline_client.connection_pool._connections) <= 2
+
+    await session.close()
+    assert (await database.get_one_item(ctx.item["collection"], ctx.item["id"]))["id"]
+    await session.close()
+
+
+async def test_session_connect_unreachable():
+    """Test connecting to an unreachable Tile38 fails once the retries are spent"""
+    session = Session(port=1, retries=2, backoff_base=0.001, backoff_cap=0.01)
+    with pytest.raises(ConnectionError):
+        await session.connect()
+
+
+async def test_session_followers_round_robin(ctx):
+    """Test reads are sent to the followers in turn, and writes to the leader"""
+    leader = Session()
+    address = f"{leader.host}:{leader.port}"
+    session = Session(followers=[address, address])
+    database = DatabaseLogic(session=session)
+
+    first = session.follower_client()
+    second = session.follower_client()
+    assert first[0] == second[0] == address
+    assert session.follower_client()[1] is first[1]
+
+    item = await database.get_one_item(ctx.item["collection"], ctx.item["id"])
+    assert item["id"] == ctx.item["id"]
+    assert session._pipeline_client is None
+    await session.close()
+
+
+async def test_session_follower_down(ctx):
+    """Test reads go to the leader while a follower is unreachable"""
+    session = Session(followers=["localhost:1"], follower_cooldown=60)
+    database = DatabaseLogic(session=session)
+
+    item = await database.get_one_item(ctx.item["collection"], ctx.item["id"])
+    assert item["id"] == ctx.item["id"]
+    assert session.follower_client() is None
+
+    items = await database.get_items([ctx.item["id"]])
+    assert [item["id"] for item in items] == [ctx.item["id"]]
+    await session.close()
+
+
+@pytest.mark.parametrize("err", ["catching up to leader", "not caught up"])
+async def test_session_follower_not_caught_up(ctx, err):
+    """Test reads go to the leader while a follower syncs with it"""
+    leader = Session()
+    session = Session(followers=[f"{leader.host}:{leader.port}"])
+    database = DatabaseLogic(session=session)
+    _, client = session.follower_client()
+
+    # the reply of a Tile38 follower started before it caught up once
+    async def catching_up(*args, **kwargs):
+        return codec.dumps({"ok": False, "err": err, "elapsed": "10.2us"})
+
+    client.execute_command = catching_up
+    item = await database.get_one_item(ctx.item["collection"], ctx.item["id"])
+    assert item["id"] == ctx.item["id"]
+    assert session.follower_client() is None
+
+    session._followers_down.clear()
+    _, client = session.follower_client()
+    client.pipeline = lambda **kwargs: FailingPipeline(err)
+    items = await database.get_items([ctx.item["id"]])
+    assert [item["id"] for item in items] == [ctx.item["id"]]
+    assert session.follower_client() is None
+    await session.close()
+
+
+class FailingPipeline:
+    """Pipeline of a follower replying to every command with an error"""
+
+    def __init__(self, err):
+        self.err = err
+        self.commands = 0
+
+    def execute_command(self, *args):
+        self.commands += 1
+
+    async def execute(self):
+        return [codec.dumps({"ok": False, "err": self.err})] * self.commands
+
+
+async def test_session_follower_lagging(ctx):
+    """Test followers lagging behind the leader are left out of the rotation"""
+    leader = Session()
+    session = Session(followers=[f"{leader.host}:{leader.port}"])
+    _, client = session.follower_client()
+    caught_up = False
+
+    async def server(*args, **kwargs):
+        stats = {"caught_up": caught_up, "caught_up_once": True}
+        return codec.dumps({"ok": True, "stats": stats, "elapsed": "10.2us"})
+
+    client.execute_command = server
+    await session.check_followers()
+    assert session.follower_client() is None
+
+    caught_up = True
+    session._followers_down.clear()
+    await session.check_followers()
+    assert session.follower_client() is not None
+
+    await session.connect()
+    assert session._follower_checks is not None
+    await session.close()
+    assert session._follower_checks is None
+
+
+async def test_session_read_after_write(ctx, monkeypatch):
+    """Test a worker reads its own writes from the leader, not a stale follower"""
+    leader = Session()
+    session = Session(followers=[f"{leader.host}:{leader.port}"])
+    database = DatabaseLogic(session=session)
+    _, client = session.follower_client()
+
+    # a follower that did not replicate the writes yet
+    async def stale(*args, **kwargs):
+        return codec.dumps({"ok": False, "err": "id not found"})
+
+    client.execute_command = stale
+    item = copy.deepcopy(ctx.item)
+    item["id"] = "test-item-2"
+    await database.create_item(item)
+    found = await database.get_one_item(item["collection"], item["id"])
+    assert found["id"] == item["id"]
+    assert session.follower_client() is None
+
+    session._leader_reads_until = 0
+    assert session.follower_client() is not None
+    await session.close()
+
+
+async def test_metrics(app_client, ctx):
+    """Test the metrics endpoint exposes the timings of a search"""
+    pytest.importorskip("prometheus_client")
+    resp = await app_client.post(
+        "/search", json={"collections": [ctx.collection["id"]]}
+    )
+    assert resp.status_code == 200
+
+    resp = await app_client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    for sample in (
+        'stac_tile38_command_seconds_count{command="scan"}',
+        'stac_search_stage_seconds_count{stage="plan"}',
+        'stac_search_stage_seconds_count{stage="read"}',
+        'stac_serializer_seconds_count{serializer="tile38_reply"}',
+        'stac_serializer_seconds_count{serializer="item"}',
+        'stac_serializer_seconds_count{serializer="response"}',
+    ):
+        assert sample in resp.text
+
+
+async def test_response_cache_etag(app_client, ctx):
+    """Test repeated reads get the same ETag, and a 304 when they send it"""
+    url = f"/collections/{ctx.item['collection']}/items/{ctx.item['id']}"
+    resp = await app_client.get(url)
+    assert resp.status_code == 200
+    etag = resp.headers["etag"]
+    # weak, as compression gives the same resource other bodies
+    assert etag.startswith('W/"')
+
+    resp = await app_client.get(url)
+    assert resp.headers["etag"] == etag
+    assert resp.json()["id"] == ctx.item["id"]
+
+    resp = await app_client.get(url, headers={"If-None-Match": etag[2:]})
+    assert resp.status_code == 304
+    resp = await app_client.get(url, headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.headers["etag"] == etag
+    assert resp.content == b""
+
+
+async def test_response_cache_invalidated_by_update(app_client, ctx):
+    """Test an item update gives its reads a new body and ETag"""
+    url = f"/collections/{ctx.item['collection']}/items/{ctx.item['id']}"
+    etag = (await app_client.get(url)).headers["etag"]
+
+    item = copy.deepcopy(ctx.item)
+    item["properties"]["gsd"] = 42
+    resp = await app_client.put(
+        f"/collections/{ctx.item['collection']}/items", json=item
+    )
+    assert resp.status_code == 200
+
+    resp = await app_client.get(url, headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["etag"] != etag
+    assert resp.json()["properties"]["gsd"] == 42
+
+
+async def test_response_cache_search_invalidated_by_create(app_client, ctx):
+    """Test a search is cached until an item is added to its collection"""
+    body = {"collections": [ctx.collection["id"]]}
+    first = await app_client.post("/search", json=body)
+    assert len(first.json()["features"]) == 1
+    second = await app_client.post("/search", json=body)
+    assert second.headers["etag"] == first.headers["etag"]
+
+    item = copy.deepcopy(ctx.item)
+    item["id"] = "test-item-2"
+    resp = await app_client.post(
+        f"/collections/{ctx.collection['id']}/items", json=item
+    )
+    assert resp.status_code == 200
+
+    resp = await app_client.post("/search", json=body)
+    assert resp.headers["etag"] != first.headers["etag"]
+    assert len(resp.json()["features"]) == 2
+
+
+@pytest.mark.parametrize(
+    "path,read", [("/collections/c/items", False), ("/search", True)]
+)
+async def test_response_cache_post_body(path, read):
+    """Test only the bodies of search requests are read by the response cache"""
+    received = []
+
+    async def app(scope, receive, send):
+        received.append(receive)
+
+    async def receive():
+        return {"type": "http.request", "body": b"{}", "more_body": False}
+
+    middleware = ResponseCacheMiddleware(app, cache=ResponseCache())
+    scope = {"type": "http", "method": "POST", "path": path, "headers": []}
+    await middleware(scope, receive, None)
+    assert (received[0] is not receive) == read
+
+
+async def test_response_cache_shared(ctx):
+    """Test entries shared through Tile38 are served until their tags change"""
+    session = Session()
+    cache = ResponseCache(session=session)
+    tags = [items_tag(ctx.collection["id"])]
+    key = cache.key("GET", "http://test-server/search", [], None)
+
+    entry, versions = await cache.get(key, tags)
+    assert entry is None
+    entry = CachedResponse.from_body(b"{}", "application/json", versions)
+    await cache.set(key, entry)
+    assert (await cache.get(key, tags))[0] == entry
+
+    await cache.invalidate(*item_write_tags(ctx.collection["id"]))
+    assert (await cache.get(key, tags))[0] is None
+    await session.close()
+
+
+async def test_invalidation_bus(ctx):
+    """Test writes announced by a worker evict the caches of the others"""
+    session = Session()
+    collection_id = ctx.collection["id"]
+    cache = ResponseCache()
+    tags = [collection_tag(collection_id)]
+    key = cache.key("GET", "http://test-server/search", [], None)
+    _, versions = await cache.get(key, tags)
+    await cache.set(key, CachedResponse.from_body(b"{}", "application/json", versions))
+    DatabaseLogic.collection_cache.set(collection_id, ctx.collection)
+
+    received = []
+    listener = InvalidationBus(session=session, enabled=True)
+    listener.add_handler(received.append)
+    listener.add_handler(cache.evict)
+    listener.add_handler(DatabaseLogic.evict_collections)
+    await listener.start()
+    try:
+        # announcements of the listener itself are already applied
+        await listener.publish(ALL_TAG)
+        writer = InvalidationBus(session=session, enabled=True)
+        await writer.publish(*collection_write_tags(collection_id))
+        for _ in range(100):
+            if received:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        await listener.stop()
+        await session.close()
+
+    assert received == [collection_write_tags(collection_id)]
+    assert (await cache.get(key, tags))[0] is None
+    assert collection_id not in DatabaseLogic.collection_cache
+
+
+async def test_invalidation_bus_start_timeout(caplog):
+    """Test the startup goes on when the channel can't be subscribed to"""
+    session = Session(port=1, retries=0)
+    bus = InvalidationBus(session=session, enabled=True, start_timeout=0.05)
+    try:
+        await asyncio.wait_for(bus.start(), 1)
+        assert "local invalidations only" in caplog.text
+        assert not bus._subscribed.is_set()
+        assert not bus._task.done()
+    finally:
+        await bus.stop()
+        await session.close()
+
+
+def test_intersects_bbox():
+    square = {
+        "type": "Polygon",
+        "coordinates": [[[0, 0], [4, 0], [4, 4], [0, 4], [0, 0]]],
+    }
+    assert intersects_bbox(square, [1, 1, 2, 2])
+    assert intersects_bbox(square, [-1, -1, 5, 5])
+    assert intersects_bbox(square, [3, -1, 5, 1])
+    assert intersects_bbox(square, [4, 4, 5, 5])
+    assert not intersects_bbox(square, [5, 5, 6, 6])
+
+    triangle = {"type": "Polygon", "coordinates": [[[0, 0], [4, 0], [0, 4], [0, 0]]]}
+    assert not intersects_bbox(triangle, [3, 3, 4, 4])
+    holed = {
+        "type": "Polygon",
+        "coordinates": [
+            [[0, 0], [4, 0], [4, 4], [0, 4], [0, 0]],
+            [[1, 1], [3, 1], [3, 3], [1, 3], [1, 1]],
+        ],
+    }
+    assert not intersects_bbox(holed, [1.5, 1.5, 2.5, 2.5])
+
+    line = {"type": "LineString", "coordinates": [[-1, 2], [5, 2]]}
+    assert intersects_bbox(line, [1, 1, 3, 3])
+    assert not intersects_bbox(line, [1, 3, 3, 4])
+    collection = {
+        "type": "GeometryCollection",
+        "geometries": [
+            {"type": "MultiPoint", "coordinates": [[10, 10], [2, 2]]},
+            triangle,
+        ],
+    }
+    assert intersects_bbox(collection, [1.5, 1.5, 2.5, 2.5])
+    assert not intersects_bbox(collection, [5, 5, 6, 6])
+
+
+def test_tile_cache_cover():
+    assert bbox_tiles([-89, 1, -1, 66], 2) == [(1, 1, 2)]
+    cache = TileCache(min_zoom=2, max_zoom=10, max_tiles=4)
+    assert cache.cover([-89, 1, -1, 66]) == [
+        (2, 2, 3),
+        (2, 3, 3),
+        (3, 2, 3),
+        (3, 3, 3),
+    ]
+    assert bbox_tiles([0, -85.0511287798066, 180, 0], 1) == [(1, 1, 1)]
+    assert cache.cover([170, 0, -170, 10]) is None
+    assert cache.cover([0, 80, 1, 89]) is None
+    assert cache.cover([-180, -80, 180, 80]) is None
+
+
+async def test_bbox_search_tile_cache(ctx, txn_client, monkeypatch):
+    """Test bbox searches read each tile once, until an item is written"""
+    reads = []
+    read_tile = DatabaseLogic._read_tile
+
+    async def counted_read_tile(self, *args, **kwargs):
+        reads.append(args)
+        return await read_tile(self, *args, **kwargs)
+
+    monkeypatch.setattr(DatabaseLogic, "_read_tile", counted_read_tile)
+    database = DatabaseLogic()
+
+    async def search(bbox):
+        plan = database.make_search()
+        database.apply_collections_filter(plan, [ctx.collection["id"]])
+        database.apply_bbox_filter(plan, bbox)
+        items, _, _ = await database.execute_search(plan, limit=10)
+        return [item["id"] for item in items]
+
+    assert await search(ctx.item["bbox"]) == [ctx.item["id"]]
+    tiles = len(reads)
+    assert tiles > 0
+    assert await search(ctx.item["bbox"]) == [ctx.item["id"]]
+    assert len(reads) == tiles
+
+    # in the bounds of the item, out of its geometry
+    assert await search([149.58, -34.25, 149.7, -34.15]) == []
+
+    item = copy.deepcopy(ctx.item)
+    item["properties"]["gsd"] = 42
+    await txn_client.update_item(item, request=MockRequest)
+    reads.clear()
+    assert await search(ctx.item["bbox"]) == [ctx.item["id"]]
+    assert len(reads) == tiles
+
+
+async def test_bbox_search_tile_cache_pages(ctx, txn_client):
+    """Test bbox searches answered from tiles are paginated"""
+    item = copy.deepcopy(ctx.item)
+    item["id"] = "test-item-2"
+    await create_item(txn_client, item)
+    database = DatabaseLogic()
+    plan = database.make_search()
+    database.apply_bbox_filter(plan, ctx.item["bbox"])
+
+    first, _, token = await database.execute_search(plan, limit=1)
+    assert token
+    second, _, _ = await database.execute_search(plan, limit=1, token=token)
+    assert [i["id"] for i in first + second] == [ctx.item["id"], "test-item-2"]
+
+
+@pytest.mark.parametrize(
+    "filters",
+    [
+        {"datetime": "2020-01-01T00:00:00Z/2020-12-31T00:00:00Z"},
+        {"datetime": "2021-01-01T00:00:00Z/.."},
+        {"query": {"gsd": {"lte": 20}}},
+        {"query": {"gsd": {"gt": 20}}},
+    ],
+)
+async def test_bbox_search_tile_cache_where(ctx, txn_client, monkeypatch, filters):
+    """Test bbox searches with WHERE clauses search Tile38, with the same results"""
+    item = copy.deepcopy(ctx.item)
+    item["id"] = "test-item-2"
+    item["properties"]["datetime"] = "2021-06-01T00:00:00Z"
+    item["properties"]["gsd"] = 30
+    await create_item(txn_client, item)
+    reads = []
+    read_tile = DatabaseLogic._read_tile
+
+    async def counted_read_tile(self, *args, **kwargs):
+        reads.append(args)
+        return await read_tile(self, *args, **kwargs)
+
+    monkeypatch.setattr(DatabaseLogic, "_read_tile", counted_read_tile)
+
+    async def search(database):
+        plan = database.make_search()
+        database.apply_bbox_filter(plan, ctx.item["bbox"])
+        if "datetime" in filters:
+            plan = database.apply_datetime_filter(
+                plan, CoreClient._return_date(filters["datetime"])
+            )
+        for field, expr in filters.get("query", {}).items():
+            for op, value in expr.items():
+                plan = database.apply_stacql_filter(plan, op, field, value)
+        items, _, _ = await database.execute_search(plan, limit=10)
+        return [item["id"] for item in items]
+
+    cached = await search(DatabaseLogic())
+    assert not reads
+    assert cached == await search(DatabaseLogic(tile_cache=TileCache(maxsize=0)))
+    assert len(cached) == 1
+
+
+async def test_bbox_search_tile_too_big(ctx):
+    """Test bbox searches over tiles holding too many items search Tile38"""
+    database = DatabaseLogic(tile_cache=TileCache(max_items=0))
+    plan = database.make_search()
+    database.apply_bbox_filter(plan, ctx.item["bbox"])
+    items, _, _ = await database.execute_search(plan, limit=10)
+    assert [item["id"] for item in items] == [ctx.item["id"]]
+
+
+def densify(ring, steps):
+    """Split each edge of a ring in `steps` collinear segments"""
+    dense = []
+    for a, b in zip(ring, ring[1:]):
+        for i in range(steps):
+            t = i / steps
+            dense.append([a[0] + (b[0] - a[0]) * t, a[1] + (b[1] - a[1]) * t])
+    return dense + [ring[-1]]
+
+
+def test_simplify_geometry(ctx):
+    ring = ctx.item["geometry"]["coordinates"][0]
+    polygon = {"type": "Polygon", "coordinates": [densify(ring, 50)]}
+    assert simplify_geometry(polygon, 0.001) == {
+        "type": "Polygon",
+        "coordinates": [ring],
+    }
+
+    # a ring is not simplified below a triangle
+    tiny = [[0, 0], [0.0001, 0], [0.0001, 0.0001], [0, 0]]
+    assert simplify_geometry({"type": "Polygon", "coordinates": [tiny]}, 1) == {
+        "type": "Polygon",
+        "coordinates": [tiny],
+    }
+
+    line = {"type": "MultiLineString", "coordinates": [[[0, 0], [1, 0.0005], [2, 0]]]}
+    assert simplify_geometry(line, 0.001)["coordinates"] == [[[0, 0], [2, 0]]]
+    assert simplify_geometry(line, 0.0001) == line
+
+    assert round_geometry({"type": "Point", "coordinates": [1.23456, 7.891]}, 2) == {
+        "type": "Point",
+        "coordinates": [1.23, 7.89],
+    }
+
+    simplified = simplified_geometries(polygon, [0.001, 0.01])
+    assert sorted(simplified) == ["0.001", "0.01"]
+    assert simplified_geometries(ctx.item["geometry"], [0.001]) == {}
+
+    # items stored without simplified geometries are simplified on the fly
+    item = {"geometry": polygon}
+    assert response_geometry(item, 0.001) == simplify_geometry(polygon, 0.001)
+    item[SIMPLIFIED_KEY] = {}
+    assert response_geometry(item, 0.001) == polygon
+
+
+async def test_search_simplify(app_client, ctx, txn_client):
+    """Test searches and item listings return simplified, rounded geometries"""
+    ring = ctx.item["geometry"]["coordinates"][0]
+    item = copy.deepcopy(ctx.item)
+    item["id"] = "test-item-dense"
+    item["geometry"]["coordinates"] = [densify(ring, 50)]
+    await create_item(txn_client, item)
+
+    stored = await DatabaseLogic().get_one_item(ctx.item["collection"], item["id"])
+    assert list(stored[SIMPLIFIED_KEY]) == ["0.0001", "0.001", "0.01"]
+
+    params = {"ids": [item["id"]], "simplify": 0.001, "precision": 3}
+    resp = await app_client.post("/search", json=params)
+    assert resp.status_code == 200
+    [feature] = resp.json()["features"]
+    rounded = [[round(x, 3), round(y, 3)] for x, y in ring]
+    assert feature["geometry"]["coordinates"] == [rounded]
+    assert SIMPLIFIED_KEY not in feature
+
+    resp = await app_client.get(
+        "/search", params={"ids": item["id"], "simplify": "0.001"}
+    )
+    assert resp.json()["features"][0]["geometry"]["coordinates"] == [ring]
+
+    resp = await app_client.get(
+        f"/collections/{item['collection']}/items", params={"precision": 3}
+    )
+    assert resp.status_code == 200
+    for feature in resp.json()["features"]:
+        assert len(feature["geometry"]["coordinates"][0]) in (len(ring), 201)
+
+    resp = await app_client.post("/search", json={"ids": [item["id"]]})
+    assert len(resp.json()["features"][0]["geometry"]["coordinates"][0]) == 201
+
+    for params in ({"simplify": 0.5}, {"precision": 16}):
+        resp = await app_client.post("/search", json=params)
+        assert resp.status_code == 400
+    resp = await app_client.get(
+        f"/collections/{item['collection']}/items", params={"simplify": "0.5"}
+    )
+    assert resp.status_code == 400
@@ -10,16 +10,26 @@ from httpx import AsyncClient
 
 from stac_fastapi.api.app import StacApi
 from stac_fastapi.api.models import create_request_model
+from stac_fastapi.caching.codec import JSONResponse
 from stac_fastapi.caching.config import AsyncTile38Settings
 from stac_fastapi.caching.core import (
     BulkTransactionsClient,
     CoreClient,
+    ExportClient,
     TransactionsClient,
 )
 from stac_fastapi.caching.database_logic import COLLECTIONS_INDEX, ITEMS_INDEX
-from stac_fastapi.caching.extensions import QueryExtension
+from stac_fastapi.caching.extensions import (
+    CompressionMiddleware,
+    ExportExtension,
+    MetricsExtension,
+    NearbyExtension,
+    QueryExtension,
+    SimplifyExtension,
+)
 
 # from stac_fastapi.caching.indexes import IndexesClient
+from stac_fastapi.caching.response_cache import ResponseCacheMiddleware
 from stac_fastapi.extensions.core import (  # FieldsExtension,
     ContextExtension,
     SortExtension,
@@ -158,6 +168,10 @@ async def app():
         # FieldsExtension(),
         QueryExtension(),
         TokenPaginationExtension(),
+        ExportExtension(client=ExportClient(session=None)),
+        MetricsExtension(),
+        NearbyExtension(),
+        SimplifyExtension(),
     ]
 
     get_request_model = create_request_model(
@@ -184,6 +198,8 @@ async def app():
         extensions=extensions,
         search_get_request_model=get_request_model,
         search_post_request_model=post_request_model,
+        response_class=JSONResponse,
+        middlewares=[ResponseCacheMiddleware, CompressionMiddleware],
     ).app
 
 
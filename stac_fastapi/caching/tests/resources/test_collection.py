@@ -1,4 +1,15 @@
+import gzip
+import json
+from copy import deepcopy
+
 import pystac
+import pytest
+
+from stac_fastapi.caching.cache import TTLCache
+from stac_fastapi.caching.core import accepts_encoding
+from stac_fastapi.caching.database_logic import DatabaseLogic
+
+from ..conftest import MockRequest
 
 
 async def test_create_and_delete_collection(app_client, load_test_data):
@@ -70,3 +81,168 @@ async def test_returns_valid_collection(ctx, app_client):
         resp_json, root=mock_root, preserve_dict=False
     )
     collection.validate()
+
+
+async def test_get_collections_batched(ctx, txn_client):
+    """Test collections are read by id in one batch"""
+    collections = await txn_client.database.get_collections(
+        [ctx.collection["id"], "missing-collection"]
+    )
+    assert [collection["id"] for collection in collections] == [ctx.collection["id"]]
+
+
+async def test_collection_cache(ctx, txn_client, core_client, monkeypatch):
+    """Test item ingest reads collections from the cache"""
+    database = txn_client.database
+    database.collection_cache.invalidate()
+    commands = []
+    send_command = DatabaseLogic._send_command
+    send_pipeline = DatabaseLogic._send_pipeline
+
+    async def counted_send_command(client, name, args):
+        commands.append(name)
+        return await send_command(client, name, args)
+
+    async def counted_send_pipeline(client, batch):
+        commands.extend(name for name, _ in batch)
+        return await send_pipeline(client, batch)
+
+    monkeypatch.setattr(
+        DatabaseLogic, "_send_command", staticmethod(counted_send_command)
+    )
+    monkeypatch.setattr(
+        DatabaseLogic, "_send_pipeline", staticmethod(counted_send_pipeline)
+    )
+    await database.check_collection_exists(ctx.collection["id"])
+    assert commands == ["JGET"]
+
+    await database.check_collection_exists(ctx.collection["id"])
+    collection = await core_client.get_collection(
+        ctx.collection["id"], request=MockRequest
+    )
+    assert collection["id"] == ctx.collection["id"]
+    assert commands == ["JGET"]
+
+
+async def test_collection_cache_invalidation(ctx, app_client):
+    """Test collection writes invalidate the collection cache"""
+    resp = await app_client.get("/collections")
+    assert [c["id"] for c in resp.json()["collections"]] == [ctx.collection["id"]]
+
+    ctx.collection["keywords"].append("cached")
+    resp = await app_client.put("/collections", json=ctx.collection)
+    assert resp.status_code == 200
+    resp = await app_client.get(f"/collections/{ctx.collection['id']}")
+    assert "cached" in resp.json()["keywords"]
+
+    collection = deepcopy(ctx.collection)
+    collection["id"] = "other-collection"
+    resp = await app_client.post("/collections", json=collection)
+    assert resp.status_code == 200
+    resp = await app_client.get("/collections")
+    assert len(resp.json()["collections"]) == 2
+
+    resp = await app_client.delete(f"/collections/{collection['id']}")
+    assert resp.status_code == 200
+    resp = await app_client.get(f"/collections/{collection['id']}")
+    assert resp.status_code == 404
+
+
+def test_ttl_cache():
+    """Test cache entries expire and the least recently used ones are evicted"""
+    now = [0.0]
+    cache = TTLCache(maxsize=2, ttl=10, timer=lambda: now[0])
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert "b" not in cache
+    assert cache.get("a") == 1
+
+    now[0] = 10
+    assert cache.get("a") is None
+    assert cache.get("c", "expired") == "expired"
+
+    cache.set("d", 4)
+    cache.invalidate()
+    assert len(cache) == 0
+
+
+async def test_delete_collection_items(app_client, ctx, txn_client):
+    """Test deleting a collection removes its items right away"""
+    database = txn_client.database
+    for idx in range(3):
+        item = deepcopy(ctx.item)
+        item["id"] = f"{ctx.item['id']}-{idx}"
+        await database.create_item(item)
+
+    resp = await app_client.delete(f"/collections/{ctx.collection['id']}")
+    assert resp.status_code == 200
+
+    resp = await app_client.get(
+        f"/collections/{ctx.collection['id']}/items/{ctx.item['id']}"
+    )
+    assert resp.status_code == 404
+    resp = await app_client.post("/search", json={"ids": [ctx.item["id"]]})
+    assert resp.json()["features"] == []
+    assert await database.get_items([ctx.item["id"]]) == []
+
+    assert await database.delete_collection_items(ctx.collection["id"]) == 0
+
+
+@pytest.mark.parametrize(
+    "accept_encoding,accepted",
+    [
+        ("gzip", True),
+        ("deflate, GZIP;q=0.5", True),
+        ("gzip;q=0", False),
+        ("gzip; q=0.0, br", False),
+        ("*", True),
+        ("*;q=0", False),
+        ("*, gzip;q=0", False),
+        ("identity", False),
+        ("", False),
+    ],
+)
+def test_accepts_encoding(accept_encoding, accepted):
+    """Test gzip is only accepted with a non-zero q-value"""
+    assert accepts_encoding(accept_encoding, "gzip") == accepted
+
+
+async def test_export_collection_items(app_client, ctx, txn_client):
+    """Test exporting the items of a collection as newline delimited GeoJSON"""
+    database = txn_client.database
+    for idx in range(3):
+        item = deepcopy(ctx.item)
+        item["id"] = f"{ctx.item['id']}-{idx}"
+        await database.create_item(item)
+
+    url = f"/collections/{ctx.collection['id']}/items.ndjson"
+    resp = await app_client.get(url, headers={"Accept-Encoding": "identity"})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "application/x-ndjson"
+    assert "content-encoding" not in resp.headers
+    lines = resp.text.splitlines()
+    features = [json.loads(line) for line in lines]
+    assert len(features) == 4
+    assert {f["collection"] for f in features} == {ctx.collection["id"]}
+    assert all(f["links"] for f in features)
+
+    # compressed once, by the export rather than the middleware
+    async with app_client.stream(
+        "GET", url, headers={"Accept-Encoding": "gzip"}
+    ) as resp:
+        assert resp.status_code == 200
+        assert resp.headers["content-encoding"] == "gzip"
+        assert resp.headers["vary"] == "Accept-Encoding"
+        body = b"".join([chunk async for chunk in resp.aiter_raw()])
+    assert gzip.decompress(body).decode().splitlines() == lines
+
+    resp = await app_client.get(url, headers={"Accept-Encoding": "gzip;q=0"})
+    assert resp.status_code == 200
+    assert "content-encoding" not in resp.headers
+    assert resp.headers["vary"] == "Accept-Encoding"
+    assert resp.text.splitlines() == lines
+
+    resp = await app_client.get("/collections/missing-collection/items.ndjson")
+    assert resp.status_code == 404
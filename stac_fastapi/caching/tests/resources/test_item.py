@@ -1,6 +1,5 @@
 import json
 import os
-import time
 import uuid
 from copy import deepcopy
 from datetime import datetime, timedelta
@@ -11,13 +10,27 @@ import ciso8601
 import pystac
 import pytest
 from geojson_pydantic.geometries import Polygon
+from pyle38.errors import Tile38KeyNotFoundError
 from pystac.utils import datetime_to_str
+from starlette.responses import StreamingResponse
 
 from stac_fastapi.caching.core import CoreClient
-from stac_fastapi.caching.datetime_utils import now_to_rfc3339_str
+from stac_fastapi.caching.database_logic import (
+    ITEM_COLLECTIONS_INDEX,
+    ITEMS_INDEX,
+    DatabaseLogic,
+    mk_items_key,
+    mk_json_path,
+)
+from stac_fastapi.caching.datetime_utils import (
+    now_to_rfc3339_str,
+    rfc3339_str_to_epoch,
+)
+from stac_fastapi.extensions.third_party.bulk_transactions import Items
 from stac_fastapi.types.core import LandingPageMixin
+from stac_fastapi.types.errors import NotFoundError
 
-from ..conftest import create_item
+from ..conftest import MockRequest, create_collection, create_item
 
 
 def rfc3339_str_to_datetime(s: str) -> datetime:
@@ -39,8 +52,6 @@ async def test_create_and_delete_item(app_client, ctx, txn_client, event_loop):
     )
     assert resp.status_code == 200
 
-    time.sleep(1)
-
     # await refresh_indices(txn_client)
 
     resp = await app_client.get(
@@ -60,6 +71,64 @@ async def test_create_item_conflict(app_client, ctx):
     assert resp.status_code == 409
 
 
+async def test_create_item_one_round_trip(ctx, txn_client, monkeypatch):
+    """Test an item, its index entry and the invalidations are written at once"""
+    database = txn_client.database
+    sent = []
+    send_command = DatabaseLogic._send_command
+    send_pipeline = DatabaseLogic._send_pipeline
+
+    async def counted_command(client, name, args):
+        sent.append([name])
+        return await send_command(client, name, args)
+
+    async def counted_pipeline(client, commands):
+        sent.append([name for name, _ in commands])
+        return await send_pipeline(client, commands)
+
+    monkeypatch.setattr(DatabaseLogic, "_send_command", staticmethod(counted_command))
+    monkeypatch.setattr(DatabaseLogic, "_send_pipeline", staticmethod(counted_pipeline))
+    item = deepcopy(ctx.item)
+    item["id"] = "test-item-pipelined"
+    await database.create_item(item)
+    assert len(sent) == 1
+    assert sent[0][:2] == ["SET", "JSET"]
+    index = await database.client.jget(ITEM_COLLECTIONS_INDEX, item["id"])
+    assert json.loads(index.value) == {item["collection"]: True}
+
+
+async def test_create_item_not_indexed(ctx, txn_client, monkeypatch):
+    """Test an item whose index entry fails to be written is deleted again"""
+    database = txn_client.database
+    monkeypatch.setattr(
+        DatabaseLogic,
+        "_index_item_command",
+        staticmethod(lambda item: ["JGET", ["missing-key", item["id"]]]),
+    )
+    item = deepcopy(ctx.item)
+    item["id"] = "test-item-not-indexed"
+    with pytest.raises(Tile38KeyNotFoundError):
+        await database.create_item(item)
+    with pytest.raises(NotFoundError):
+        await database.get_one_item(item["collection"], item["id"])
+
+
+async def test_create_item_not_stored(ctx, txn_client, monkeypatch):
+    """Test the index entry of an item that fails to be stored is deleted again"""
+    database = txn_client.database
+    monkeypatch.setattr(
+        DatabaseLogic,
+        "_set_item_command",
+        staticmethod(lambda item, condition: ["JGET", ["missing-key", item["id"]]]),
+    )
+    item = deepcopy(ctx.item)
+    item["id"] = "test-item-not-stored"
+    with pytest.raises(Tile38KeyNotFoundError):
+        await database.create_item(item)
+    index = await database.client.jget(ITEM_COLLECTIONS_INDEX, item["id"])
+    assert item["collection"] not in json.loads(index.value)
+
+
 async def test_delete_missing_item(app_client, load_test_data):
     """Test deletion of an item which does not exist (transactions extension)"""
     test_item = load_test_data("test_item.json")
@@ -95,6 +164,23 @@ async def test_update_item_already_exists(app_client, ctx):
     )
 
 
+async def test_update_item_removed_field(app_client, ctx):
+    """Test a property removed by an update is no longer queryable (transactions extension)"""
+    params = {"query": {"gsd": {"gt": 10}}}
+    resp = await app_client.post("/search", json=params)
+    assert [f["id"] for f in resp.json()["features"]] == [ctx.item["id"]]
+
+    del ctx.item["properties"]["gsd"]
+    resp = await app_client.put(
+        f"/collections/{ctx.item['collection']}/items", json=ctx.item
+    )
+    assert resp.status_code == 200
+
+    resp = await app_client.post("/search", json=params)
+    assert resp.status_code == 200
+    assert resp.json()["features"] == []
+
+
 async def test_update_new_item(app_client, ctx):
     """Test updating an item which does not exist (transactions extension)"""
     test_item = ctx.item
@@ -191,8 +277,249 @@ async def test_get_item_collection(app_client, ctx, txn_client):
         assert matched == item_count + 1
 
 
-@pytest.mark.skip(reason="Pagination extension not implemented")
-async def test_pagination(app_client, load_test_data):
+async def test_get_item_collection_excludes_other_collections(
+    app_client, ctx, txn_client
+):
+    """Test an item collection only returns items from its own collection"""
+    other_collection = deepcopy(ctx.collection)
+    other_collection["id"] = "other-collection"
+    await create_collection(txn_client, other_collection)
+
+    other_item = deepcopy(ctx.item)
+    other_item["id"] = "other-item"
+    other_item["collection"] = other_collection["id"]
+    await create_item(txn_client, other_item)
+
+    resp = await app_client.get(f"/collections/{ctx.item['collection']}/items")
+    assert resp.status_code == 200
+    assert [feat["id"] for feat in resp.json()["features"]] == [ctx.item["id"]]
+
+    await txn_client.delete_collection(other_collection["id"])
+
+
+async def test_create_item_indexes_fields(ctx, txn_client):
+    """Test numeric item properties are stored as Tile38 FIELDS"""
+    response = (
+        await txn_client.database.client.get(
+            mk_items_key(ctx.item["collection"]), ctx.item["id"]
+        )
+        .withfields()
+        .asObject()
+    )
+    assert response.object["id"] == ctx.item["id"]
+    assert response.fields["gsd"] == ctx.item["properties"]["gsd"]
+    assert response.fields["datetime"] == rfc3339_str_to_epoch(
+        ctx.item["properties"]["datetime"]
+    )
+
+
+async def test_get_items_batched(ctx, txn_client):
+    """Test items are looked up by id through the id->collection index"""
+    database = txn_client.database
+    collection = deepcopy(ctx.collection)
+    collection["id"] = "other.collection"
+    await create_collection(txn_client, collection)
+    other_item = deepcopy(ctx.item)
+    other_item["collection"] = collection["id"]
+    await create_item(txn_client, other_item)
+
+    items = await database.get_items([ctx.item["id"], "missing-item"])
+    assert sorted(item["collection"] for item in items) == sorted(
+        [ctx.item["collection"], collection["id"]]
+    )
+
+    items = await database.get_items([ctx.item["id"]], [collection["id"]])
+    assert [item["collection"] for item in items] == [collection["id"]]
+
+    # ids missing from the index are looked up in every collection
+    await database.client.drop(ITEM_COLLECTIONS_INDEX)
+    items = await database.get_items([ctx.item["id"]])
+    assert len(items) == 2
+
+    assert await database.index_item_collections() == 2
+    index = await database.client.jget(ITEM_COLLECTIONS_INDEX, ctx.item["id"])
+    assert json.loads(index.value) == {
+        ctx.item["collection"]: True,
+        collection["id"]: True,
+    }
+
+
+async def test_delete_item_index_entry(ctx, txn_client):
+    """Test deleting an item removes it from the id->collection index"""
+    database = txn_client.database
+    await database.delete_item(ctx.item["id"], ctx.item["collection"])
+    index = await database.client.jget(ITEM_COLLECTIONS_INDEX, ctx.item["id"])
+    assert json.loads(index.value) == {}
+
+
+@pytest.mark.parametrize(
+    "name,path",
+    [
+        ("collection", "collection"),
+        ("a.b", "a\\.b"),
+        ("a|b#c@d", "a\\|b\\#c\\@d"),
+        ("*?!=<>%,()[]{}", "\\*\\?\\!\\=\\<\\>\\%\\,\\(\\)\\[\\]\\{\\}"),
+        ('a"b\\c', 'a\\"b\\\\c'),
+        ("a_b-c:d", "a_b-c:d"),
+    ],
+)
+def test_mk_json_path(name, path):
+    """Test JSON paths escape every character with a meaning in gjson paths"""
+    assert mk_json_path(name) == path
+
+
+async def test_item_index_special_collection_id(ctx, txn_client):
+    """Test indexing items of a collection whose id holds gjson path syntax"""
+    database = txn_client.database
+    collection = deepcopy(ctx.collection)
+    collection["id"] = 'a.b|c#d@e*f?g!h=i<j>k%l,m(n)o[p]q{r}s"t\\u'
+    await create_collection(txn_client, collection)
+    item = deepcopy(ctx.item)
+    item["collection"] = collection["id"]
+    await create_item(txn_client, item)
+
+    index = await database.client.jget(ITEM_COLLECTIONS_INDEX, item["id"])
+    assert collection["id"] in json.loads(index.value)
+    found = await database.get_items([item["id"]], [collection["id"]])
+    assert [i["id"] for i in found] == [item["id"]]
+
+    await database.delete_item(item["id"], collection["id"])
+    index = await database.client.jget(ITEM_COLLECTIONS_INDEX, item["id"])
+    assert collection["id"] not in json.loads(index.value)
+
+
+async def test_delete_item_twice(app_client, ctx):
+    """Test deleting an item already deleted, whose index entry is gone"""
+    url = f"/collections/{ctx.item['collection']}/items/{ctx.item['id']}"
+    resp = await app_client.delete(url)
+    assert resp.status_code == 200
+    resp = await app_client.delete(url)
+    assert resp.status_code == 404
+
+
+async def test_delete_item_unindexed(app_client, ctx, txn_client):
+    """Test deleting an item written without an id->collection index entry"""
+    database = txn_client.database
+    collection = deepcopy(ctx.collection)
+    collection["id"] = "unindexed-collection"
+    await create_collection(txn_client, collection)
+    item = deepcopy(ctx.item)
+    item["collection"] = collection["id"]
+    # the id is indexed for the collection of ctx.item only
+    await database._command(database._set_item_command(item, "NX"))
+
+    resp = await app_client.delete(
+        f"/collections/{collection['id']}/items/{item['id']}"
+    )
+    assert resp.status_code == 200
+    with pytest.raises(NotFoundError):
+        await database.get_one_item(collection["id"], item["id"])
+    index = await database.client.jget(ITEM_COLLECTIONS_INDEX, item["id"])
+    assert json.loads(index.value) == {ctx.item["collection"]: True}
+
+    await database.delete_collection(collection["id"])
+
+
+async def test_bulk_item_insert(ctx, core_client, bulk_txn_client):
+    """Test bulk insert pipelines items in chunks and reports failures"""
+    items = {}
+    for _ in range(10):
+        _item = deepcopy(ctx.item)
+        _item["id"] = str(uuid.uuid4())
+        items[_item["id"]] = _item
+    items[ctx.item["id"]] = ctx.item
+
+    message = bulk_txn_client.bulk_item_insert(
+        Items(items=items), chunk_size=3, refresh=True
+    )
+    assert message.startswith("Successfully added 10 Items. 1 Items failed:")
+    assert ctx.item["id"] in message
+
+    fc = await core_client.item_collection(
+        ctx.collection["id"], limit=100, request=MockRequest()
+    )
+    assert len(fc["features"]) == 11
+
+    found = await bulk_txn_client.database.get_items(list(items))
+    assert len(found) == 11
+
+
+async def test_bulk_item_insert_missing_collection(ctx, bulk_txn_client):
+    """Test bulk insert into a collection which does not exist"""
+    item = deepcopy(ctx.item)
+    item["collection"] = "missing-collection"
+    with pytest.raises(NotFoundError):
+        bulk_txn_client.bulk_item_insert(Items(items={item["id"]: item}))
+
+
+async def test_feature_collection_insert(ctx, core_client, txn_client):
+    """Test POSTing a FeatureCollection inserts every feature"""
+    features = []
+    for _ in range(10):
+        _item = deepcopy(ctx.item)
+        _item["id"] = str(uuid.uuid4())
+        features.append(_item)
+
+    feature_collection = {"type": "FeatureCollection", "features": features}
+    await create_item(txn_client, feature_collection)
+
+    fc = await core_client.item_collection(
+        ctx.collection["id"], limit=100, request=MockRequest()
+    )
+    assert len(fc["features"]) == 11
+
+
+async def test_migrate_items_key(ctx, core_client, txn_client):
+    """Test items are moved out of the legacy single items key"""
+    legacy_item = deepcopy(ctx.item)
+    legacy_item["id"] = "legacy-item"
+    legacy_id = f"{legacy_item['id']}|{legacy_item['collection']}"
+    client = txn_client.database.client
+    await client.set(ITEMS_INDEX, legacy_id).object(legacy_item["geometry"]).exec()
+    await client.jset(ITEMS_INDEX, legacy_id, "item", json.dumps(legacy_item))
+
+    assert await txn_client.database.migrate_items_key() == 1
+
+    item = await core_client.get_item(
+        legacy_item["id"], legacy_item["collection"], request=MockRequest
+    )
+    assert item["id"] == legacy_item["id"]
+
+
+async def test_migrate_items_key_pipelined(ctx, txn_client, monkeypatch):
+    """Test legacy items are migrated and indexed one pipeline per chunk"""
+    database = txn_client.database
+    client = database.client
+    ids = []
+    for idx in range(5):
+        legacy_item = deepcopy(ctx.item)
+        legacy_item["id"] = f"legacy-item-{idx}"
+        legacy_id = f"{legacy_item['id']}|{legacy_item['collection']}"
+        await client.set(ITEMS_INDEX, legacy_id).object(legacy_item["geometry"]).exec()
+        await client.jset(ITEMS_INDEX, legacy_id, "item", json.dumps(legacy_item))
+        ids.append(legacy_item["id"])
+
+    pipelines = []
+    send_pipeline = DatabaseLogic._send_pipeline
+
+    async def counted_send_pipeline(client, commands):
+        pipelines.append([name for name, _ in commands])
+        return await send_pipeline(client, commands)
+
+    monkeypatch.setattr(
+        DatabaseLogic, "_send_pipeline", staticmethod(counted_send_pipeline)
+    )
+    assert await database.migrate_items_key(chunk_size=2) == 5
+    assert [len(names) for names in pipelines] == [4, 4, 2]
+    assert all(names[::2] == ["SET"] * (len(names) // 2) for names in pipelines)
+
+    items = await database.get_items(ids, [ctx.item["collection"]])
+    assert sorted(item["id"] for item in items) == ids
+    index = await client.jget(ITEM_COLLECTIONS_INDEX, ids[0])
+    assert ctx.item["collection"] in json.loads(index.value)
+
+
+async def test_pagination(app_client, ctx, load_test_data):
     """Test item collection pagination (paging extension)"""
     item_count = 10
     test_item = load_test_data("test_item.json")
@@ -247,7 +574,6 @@ async def test_item_timestamps(app_client, ctx, load_test_data):
     )
 
 
-@pytest.mark.skip(reason="Search for items not implemented")
 async def test_item_search_by_id_post(app_client, ctx, txn_client):
     """Test POST search by item id (core)"""
     ids = ["test1", "test2", "test3"]
@@ -277,7 +603,6 @@ async def test_item_search_spatial_query_post(app_client, ctx):
     assert resp_json["features"][0]["id"] == test_item["id"]
 
 
-@pytest.mark.skip(reason="Date query not implemented")
 async def test_item_search_temporal_query_post(app_client, ctx):
     """Test POST search with single-tailed spatio-temporal query (core)"""
 
@@ -296,7 +621,6 @@ async def test_item_search_temporal_query_post(app_client, ctx):
     assert resp_json["features"][0]["id"] == test_item["id"]
 
 
-@pytest.mark.skip(reason="Date query not implemented")
 async def test_item_search_temporal_window_post(app_client, load_test_data, ctx):
     """Test POST search with two-tailed spatio-temporal query (core)"""
     test_item = ctx.item
@@ -315,7 +639,59 @@ async def test_item_search_temporal_window_post(app_client, load_test_data, ctx)
     assert resp_json["features"][0]["id"] == test_item["id"]
 
 
-@pytest.mark.skip(reason="Date query not implemented")
+async def test_item_search_temporal_window_excludes(app_client, ctx):
+    """Test POST search with a window that ends before the item (core)"""
+    test_item = ctx.item
+    item_date = rfc3339_str_to_datetime(test_item["properties"]["datetime"])
+    item_date_before = item_date - timedelta(seconds=1)
+
+    params = {
+        "collections": [test_item["collection"]],
+        "datetime": f"../{datetime_to_str(item_date_before)}",
+    }
+    resp = await app_client.post("/search", json=params)
+    assert resp.json()["features"] == []
+
+
+async def test_item_search_temporal_range_item(app_client, ctx, txn_client):
+    """Test POST search matches items that only have a datetime range (core)"""
+    range_item = deepcopy(ctx.item)
+    range_item["id"] = "range-item"
+    range_item["properties"]["datetime"] = None
+    range_item["properties"]["start_datetime"] = "2020-01-01T00:00:00Z"
+    range_item["properties"]["end_datetime"] = "2020-12-31T00:00:00Z"
+    await create_item(txn_client, range_item)
+
+    params = {
+        "collections": [range_item["collection"]],
+        "datetime": "2020-06-01T00:00:00Z/2021-06-01T00:00:00Z",
+    }
+    resp = await app_client.post("/search", json=params)
+    assert [feat["id"] for feat in resp.json()["features"]] == [range_item["id"]]
+
+
+async def test_item_search_temporal_undated_item(app_client, ctx, txn_client):
+    """Test POST search leaves items without a datetime out of open windows"""
+    undated_item = deepcopy(ctx.item)
+    undated_item["id"] = "undated-item"
+    undated_item["properties"]["datetime"] = None
+    await create_item(txn_client, undated_item)
+    old_item = deepcopy(ctx.item)
+    old_item["id"] = "old-item"
+    old_item["properties"]["datetime"] = "1969-07-20T20:17:00Z"
+    await create_item(txn_client, old_item)
+
+    for window, ids in (
+        ("../2100-01-01T00:00:00Z", {ctx.item["id"], old_item["id"]}),
+        ("1960-01-01T00:00:00Z/..", {ctx.item["id"], old_item["id"]}),
+        ("1960-01-01T00:00:00Z/1980-01-01T00:00:00Z", {old_item["id"]}),
+        ("../..", {ctx.item["id"], old_item["id"]}),
+    ):
+        params = {"collections": [ctx.item["collection"]], "datetime": window}
+        resp = await app_client.post("/search", json=params)
+        assert {feat["id"] for feat in resp.json()["features"]} == ids, window
+
+
 async def test_item_search_temporal_open_window(app_client, ctx):
     """Test POST search with open spatio-temporal query (core)"""
     test_item = ctx.item
@@ -362,7 +738,6 @@ async def test_item_search_sort_post(app_client, load_test_data):
     )
 
 
-@pytest.mark.skip(reason="Search on multiple ids not yet implemented")
 async def test_item_search_by_id_get(app_client, ctx, txn_client):
     """Test GET search by item id (core)"""
     ids = ["test1", "test2", "test3"]
@@ -378,6 +753,66 @@ async def test_item_search_by_id_get(app_client, ctx, txn_client):
     assert set([feat["id"] for feat in resp_json["features"]]) == set(ids)
 
 
+async def test_item_search_ids_and_bbox(app_client, ctx, txn_client):
+    """Test POST search combining ids with a bbox (core)"""
+    test_item = ctx.item
+    other_item = deepcopy(test_item)
+    other_item["id"] = "other-item"
+    await create_item(txn_client, other_item)
+
+    params = {"ids": [test_item["id"]], "bbox": test_item["bbox"]}
+    resp = await app_client.post("/search", json=params)
+    assert resp.status_code == 200
+    assert [f["id"] for f in resp.json()["features"]] == [test_item["id"]]
+
+    params = {"ids": [test_item["id"]], "bbox": [-10, -10, -9, -9]}
+    resp = await app_client.post("/search", json=params)
+    assert resp.status_code == 200
+    assert len(resp.json()["features"]) == 0
+
+
+async def test_item_search_ids_and_filters(app_client, ctx, txn_client):
+    """Test POST search combining ids with datetime, query and collections (core)"""
+    test_item = ctx.item
+    params = {"ids": [test_item["id"]], "datetime": test_item["properties"]["datetime"]}
+    resp = await app_client.post("/search", json=params)
+    assert [f["id"] for f in resp.json()["features"]] == [test_item["id"]]
+
+    params = {"ids": [test_item["id"]], "datetime": "2000-01-01T00:00:00Z"}
+    resp = await app_client.post("/search", json=params)
+    assert len(resp.json()["features"]) == 0
+
+    params = {"ids": [test_item["id"]], "query": {"gsd": {"gt": 15}}}
+    resp = await app_client.post("/search", json=params)
+    assert len(resp.json()["features"]) == 0
+
+    params = {"ids": [test_item["id"]], "collections": ["other-collection"]}
+    resp = await app_client.post("/search", json=params)
+    assert len(resp.json()["features"]) == 0
+
+
+async def test_item_search_collections_and_bbox(app_client, ctx, txn_client):
+    """Test POST search combining collections with a bbox (core)"""
+    test_item = ctx.item
+    collection = deepcopy(ctx.collection)
+    collection["id"] = "other-collection"
+    await create_collection(txn_client, collection)
+    other_item = deepcopy(test_item)
+    other_item["collection"] = collection["id"]
+    await create_item(txn_client, other_item)
+
+    params = {"collections": [test_item["collection"]], "bbox": test_item["bbox"]}
+    resp = await app_client.post("/search", json=params)
+    features = resp.json()["features"]
+    assert [(f["collection"], f["id"]) for f in features] == [
+        (test_item["collection"], test_item["id"])
+    ]
+
+    params = {"bbox": test_item["bbox"]}
+    resp = await app_client.post("/search", json=params)
+    assert len(resp.json()["features"]) == 2
+
+
 async def test_item_search_bbox_get(app_client, ctx):
     """Test GET search with spatial query (core)"""
     params = {
@@ -400,7 +835,6 @@ async def test_item_search_get_without_collections(app_client, ctx):
     assert resp.status_code == 200
 
 
-@pytest.mark.skip(reason="Date query not implemented")
 async def test_item_search_temporal_window_get(app_client, ctx):
     """Test GET search with spatio-temporal query (core)"""
     test_item = ctx.item
@@ -449,7 +883,6 @@ async def test_item_search_post_without_collection(app_client, ctx):
     assert resp.status_code == 200
 
 
-@pytest.mark.skip(reason="Query not implemented")
 async def test_item_search_properties_es(app_client, ctx):
     """Test POST search with JSONB query (query extension)"""
 
@@ -473,7 +906,98 @@ async def test_item_search_properties_field(app_client):
     assert len(resp_json["features"]) == 0
 
 
-@pytest.mark.skip(reason="Query not implemented")
+async def test_item_search_query_cloud_cover(app_client, ctx):
+    """Test POST search on eo:cloud_cover is answered by Tile38 (query extension)"""
+    test_item = ctx.item
+    cloud_cover = test_item["properties"]["eo:cloud_cover"]
+
+    params = {"query": {"eo:cloud_cover": {"lte": cloud_cover}}}
+    resp = await app_client.post("/search", json=params)
+    assert resp.status_code == 200
+    assert [f["id"] for f in resp.json()["features"]] == [test_item["id"]]
+
+    params = {"query": {"eo:cloud_cover": {"gt": cloud_cover}}}
+    resp = await app_client.post("/search", json=params)
+    assert resp.status_code == 200
+    assert len(resp.json()["features"]) == 0
+
+    params = {"query": {"eo:cloud_cover": {"in": [cloud_cover, 50]}}}
+    resp = await app_client.post("/search", json=params)
+    assert resp.status_code == 200
+    assert len(resp.json()["features"]) == 1
+
+
+async def test_item_search_query_missing_field(app_client, ctx, txn_client):
+    """Test items without a queried field are not matched as 0 (query extension)"""
+    item = deepcopy(ctx.item)
+    item["id"] = "no-gsd"
+    del item["properties"]["gsd"]
+    await create_item(txn_client, item)
+
+    params = {"query": {"gsd": {"lte": 100}}}
+    resp = await app_client.post("/search", json=params)
+    assert resp.status_code == 200
+    assert [f["id"] for f in resp.json()["features"]] == [ctx.item["id"]]
+
+    params = {"query": {"gsd": {"ne": 15}}}
+    resp = await app_client.post("/search", json=params)
+    assert resp.status_code == 200
+    assert [f["id"] for f in resp.json()["features"]] == [item["id"]]
+
+
+async def test_item_search_query_datetime_range(app_client, ctx, txn_client):
+    """Test start_datetime queries only match items with the property (query extension)"""
+    undated_item = deepcopy(ctx.item)
+    undated_item["id"] = "undated-item"
+    undated_item["properties"]["datetime"] = None
+    await create_item(txn_client, undated_item)
+    range_item = deepcopy(ctx.item)
+    range_item["id"] = "range-item"
+    range_item["properties"]["datetime"] = None
+    range_item["properties"]["start_datetime"] = "2020-01-01T00:00:00Z"
+    range_item["properties"]["end_datetime"] = "2020-12-31T00:00:00Z"
+    await create_item(txn_client, range_item)
+
+    # ctx.item only has a datetime
+    for query in (
+        {"start_datetime": {"gte": "2000-01-01T00:00:00Z"}},
+        {"end_datetime": {"lte": "2100-01-01T00:00:00Z"}},
+    ):
+        resp = await app_client.post("/search", json={"query": query})
+        assert resp.status_code == 200
+        assert [f["id"] for f in resp.json()["features"]] == [range_item["id"]]
+
+
+async def test_item_search_query_post_filter_pagination(app_client, ctx, txn_client):
+    """Test pages are filled past items rejected by a post-filter (query extension)"""
+    ids = []
+    for idx in range(6):
+        item = deepcopy(ctx.item)
+        item["id"] = str(idx)
+        item["properties"]["platform"] = "sentinel-2a" if idx % 2 else "landsat-8"
+        await create_item(txn_client, item)
+        if idx % 2:
+            ids.append(item["id"])
+
+    params = {"query": {"platform": {"eq": "sentinel-2a"}}, "limit": 2}
+    resp = await app_client.post("/search", json=params)
+    resp_json = resp.json()
+    found = [f["id"] for f in resp_json["features"]]
+    assert len(found) == 2
+
+    next_link = [link for link in resp_json["links"] if link["rel"] == "next"]
+    resp = await app_client.post("/search", json=next_link[0]["body"])
+    found += [f["id"] for f in resp.json()["features"]]
+    assert sorted(found) == sorted(ids)
+
+
+async def test_item_search_query_invalid_operator(app_client):
+    """Test POST search with an unsupported query operator"""
+    params = {"query": {"eo:cloud_cover": {"startsWith": "1"}}}
+    resp = await app_client.post("/search", json=params)
+    assert resp.status_code == 400
+
+
 async def test_item_search_get_query_extension(app_client, ctx):
     """Test GET search with JSONB query (query extension)"""
 
@@ -506,7 +1030,6 @@ async def test_get_missing_item_collection(app_client):
     assert resp.status_code == 200
 
 
-@pytest.mark.skip(reason="Pagination extension not implemented")
 async def test_pagination_item_collection(app_client, ctx, txn_client):
     """Test item collection pagination links (paging extension)"""
     ids = [ctx.item["id"]]
@@ -543,7 +1066,6 @@ async def test_pagination_item_collection(app_client, ctx, txn_client):
     assert not set(item_ids) - set(ids)
 
 
-@pytest.mark.skip(reason="Pagination extension not implemented")
 async def test_pagination_post(app_client, ctx, txn_client):
     """Test POST pagination (paging extension)"""
     ids = [ctx.item["id"]]
@@ -551,8 +1073,8 @@ async def test_pagination_post(app_client, ctx, txn_client):
     # Ingest 5 items
     for _ in range(5):
         ctx.item["id"] = str(uuid.uuid4())
-    await create_item(txn_client, ctx.item)
-    ids.append(ctx.item["id"])
+        await create_item(txn_client, ctx.item)
+        ids.append(ctx.item["id"])
 
     # Paginate through all 5 items with a limit of 1 (expecting 5 requests)
     request_body = {"ids": ids, "limit": 1}
@@ -562,24 +1084,45 @@ async def test_pagination_post(app_client, ctx, txn_client):
     for _ in range(100):
         idx += 1
         page_data = page.json()
+        item_ids.extend(feature["id"] for feature in page_data["features"])
         next_link = list(filter(lambda l: l["rel"] == "next", page_data["links"]))
         if not next_link:
             break
 
-        item_ids.append(page_data["features"][0]["id"])
-
         # Merge request bodies
         request_body.update(next_link[0]["body"])
         page = await app_client.post("/search", json=request_body)
 
-    # Our limit is 1, so we expect len(ids) number of requests before we run out of pages
-    assert idx == len(ids) + 1
+    # Our limit is 1, and the last page comes without a next link
+    assert idx == len(ids)
 
     # Confirm we have paginated through all items
-    assert not set(item_ids) - set(ids)
+    assert sorted(item_ids) == sorted(ids)
+
+
+async def test_pagination_exact_limit(app_client, ctx):
+    """Test a page holding the last of the results has no next link"""
+    resp = await app_client.post("/search", json={"ids": [ctx.item["id"]], "limit": 1})
+    assert resp.status_code == 200
+    resp_json = resp.json()
+    assert len(resp_json["features"]) == 1
+    assert not [link for link in resp_json["links"] if link["rel"] == "next"]
+
+
+async def test_pagination_token_other_query(app_client, ctx):
+    """Test a pagination token is rejected by a different query"""
+    resp = await app_client.get(
+        f"/collections/{ctx.item['collection']}/items", params={"limit": 1}
+    )
+    next_link = list(filter(lambda l: l["rel"] == "next", resp.json()["links"]))
+    token = parse_qs(urlparse(next_link[0]["href"]).query)["token"][0]
+
+    resp = await app_client.get(
+        "/search", params={"collections": ctx.item["collection"], "token": token}
+    )
+    assert resp.status_code == 400
 
 
-@pytest.mark.skip(reason="Pagination extension not implemented")
 async def test_pagination_token_idempotent(app_client, ctx, txn_client):
     """Test that pagination tokens are idempotent (paging extension)"""
     ids = [ctx.item["id"]]
@@ -587,8 +1130,8 @@ async def test_pagination_token_idempotent(app_client, ctx, txn_client):
     # Ingest 5 items
     for _ in range(5):
         ctx.item["id"] = str(uuid.uuid4())
-    await create_item(txn_client, ctx.item)
-    ids.append(ctx.item["id"])
+        await create_item(txn_client, ctx.item)
+        ids.append(ctx.item["id"])
 
     page = await app_client.get("/search", params={"ids": ",".join(ids), "limit": 3})
     page_data = page.json()
@@ -776,3 +1319,38 @@ async def test_search_datetime_validation_errors(app_client):
 
         resp = await app_client.get("/search?datetime={}".format(dt))
         assert resp.status_code == 400
+
+
+async def test_item_collection_streamed(ctx, core_client, txn_client):
+    """Test large pages are streamed as the same FeatureCollection"""
+    for idx in range(4):
+        item = deepcopy(ctx.item)
+        item["id"] = f"{ctx.item['id']}-{idx}"
+        await create_item(txn_client, item)
+    expected = await core_client.item_collection(
+        ctx.collection["id"], limit=3, request=MockRequest()
+    )
+    assert expected["links"]
+
+    core_client.stream_min_limit = 3
+    core_client.stream_chunk_size = 2
+    resp = await core_client.item_collection(
+        ctx.collection["id"], limit=3, request=MockRequest()
+    )
+    assert isinstance(resp, StreamingResponse)
+    body = "".join([chunk async for chunk in resp.body_iterator])
+    assert json.loads(body) == json.loads(json.dumps(expected))
+
+
+async def test_search_streamed(app_client, ctx):
+    """Test searches at a streamed limit return a FeatureCollection"""
+    resp = await app_client.post("/search", json={"limit": 1000})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "application/geo+json"
+    resp_json = resp.json()
+    assert [f["id"] for f in resp_json["features"]] == [ctx.item["id"]]
+    assert resp_json["context"] == {"returned": 1, "limit": 1000}
+    assert resp_json["links"] == []
+
+    resp = await app_client.post("/search", json={"limit": 1000, "token": "invalid"})
+    assert resp.status_code == 400